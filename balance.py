@@ -0,0 +1,353 @@
+"""
+Monte Carlo balance analyzer of Game 1.
+Plays many sessions per parameter set and policy in a process pool and reports
+how many moves a win takes and which scores the sessions end with:
+    python balance.py --games 100000 --max-value 20 50 100 --cap half full
+"""
+
+import argparse
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from card_batch import BatchGame1Engine, greedy_policy, random_policy
+from card_engine import Game1Engine, apply_operator, clamp_score
+from card_hint import HintSearch
+from card_source import OPERATIONS, CardSource, default_value_ranges
+
+POLICIES = ('random', 'greedy', 'optimal')
+
+# The transposition table of the optimal policy is cleared when it gets this big
+MAX_TABLE_SIZE = 1_000_000
+
+# Value range caps of multiplication and division, see default_value_ranges()
+CAPS = ('half', 'full')
+
+
+def get_value_ranges(min_value: int, max_value: int, cap: str) -> dict:
+    value_ranges = default_value_ranges(min_value, max_value)
+    if cap == 'full':
+        value_ranges['multiplication'] = (min_value, max_value)
+        value_ranges['division'] = (min_value, max_value)
+    return value_ranges
+
+
+def get_source(config: dict, seed: int) -> CardSource:
+    return CardSource(
+        seed,
+        weights=config['weights'],
+        value_ranges=get_value_ranges(
+            config['min_value'], config['max_value'], config['cap']
+        ),
+        min_value=config['min_value'],
+        max_value=config['max_value'],
+    )
+
+
+def play_batch(
+    config: dict, policy: str, games: int, seed: int, max_moves: int
+) -> tuple:
+    """Plays games with BatchGame1Engine, returns (moves, scores) arrays"""
+    engine = BatchGame1Engine(
+        games,
+        config['starting_score'],
+        config['target_score'],
+        config['max_highscore'],
+        seed=seed,
+        source=get_source(config, seed),
+    )
+    moves = engine.run(
+        random_policy if policy == 'random' else greedy_policy, max_moves
+    )
+    return moves, engine.highscore.copy()
+
+
+def play_optimal(
+    config: dict, games: int, seed: int, max_moves: int, max_depth: int
+) -> tuple:
+    """
+    Plays games one by one with Game1Engine. Every move plays the first card of the
+    shortest winning sequence of the visible cards when cards can be reused,
+    and the card closest to target_score when there is none within max_depth.
+    The next cards are unknown, so this is the best play for the visible cards only
+    """
+    engine = Game1Engine(
+        config['starting_score'],
+        config['target_score'],
+        config['max_highscore'],
+        source=get_source(config, seed),
+    )
+    # One table for all games, the keys only depend on the score and the hand
+    search = HintSearch(
+        config['target_score'],
+        config['starting_score'],
+        reuse_cards=True,
+        max_depth=max_depth,
+        time_budget=None,
+    )
+    moves = np.full(games, -1, np.int32)
+    scores = np.empty(games, np.int32)
+    for game in range(games):
+        engine.reset()
+        if len(search.table) > MAX_TABLE_SIZE:
+            search.table.clear()
+        while engine.moves < max_moves:
+            sequence = search.search(engine.current_score, engine.get_hand())
+            if sequence:
+                card_index = sequence[0]
+            else:
+                card_index = closest_card(engine)
+            if engine.play(card_index):
+                moves[game] = engine.moves
+                break
+        scores[game] = engine.current_highscore
+    return moves, scores
+
+
+def closest_card(engine: Game1Engine) -> int:
+    """Returns the index of the card that gets closest to target_score, like greedy_policy"""
+    distances = [
+        abs(
+            clamp_score(
+                apply_operator(engine.current_score, card.operator, card.value),
+                engine.starting_score,
+            )
+            - engine.target_score
+        )
+        for card in engine.cards
+    ]
+    return distances.index(min(distances))
+
+
+def play_chunk(task: tuple) -> tuple:
+    """Runs in a worker process, task is (config, policy, games, seed, max_moves, max_depth)"""
+    config, policy, games, seed, max_moves, max_depth = task
+    if policy == 'optimal':
+        return play_optimal(config, games, seed, max_moves, max_depth)
+    return play_batch(config, policy, games, seed, max_moves)
+
+
+def summarize(moves: np.ndarray, scores: np.ndarray) -> dict:
+    won = moves[moves >= 0]
+    summary = {
+        'games': len(moves),
+        'win_rate': float(len(won) / len(moves)) if len(moves) else 0.0,
+        'moves': None,
+        'score': {
+            'mean': float(scores.mean()),
+            'p10': float(np.percentile(scores, 10)),
+            'p50': float(np.percentile(scores, 50)),
+            'p90': float(np.percentile(scores, 90)),
+        },
+    }
+    if len(won):
+        summary['moves'] = {
+            'mean': float(won.mean()),
+            'p50': float(np.percentile(won, 50)),
+            'p90': float(np.percentile(won, 90)),
+            'p99': float(np.percentile(won, 99)),
+            'max': int(won.max()),
+            # Wins by moves needed, the last bin counts longer wins
+            'histogram': np.bincount(np.minimum(won, 20), minlength=21)[1:].tolist(),
+        }
+    return summary
+
+
+def get_configs(args) -> list:
+    configs = []
+    for (
+        min_value,
+        max_value,
+        weights,
+        cap,
+        starting_score,
+        max_highscore,
+    ) in itertools.product(
+        args.min_value,
+        args.max_value,
+        args.weights,
+        args.cap,
+        args.starting_score,
+        args.max_highscore,
+    ):
+        configs.append(
+            {
+                'min_value': min_value,
+                'max_value': max_value,
+                'weights': weights,
+                'cap': cap,
+                'starting_score': starting_score,
+                'target_score': args.target_score,
+                'max_highscore': max_highscore,
+            }
+        )
+    return configs
+
+
+def parse_weights(text: str) -> dict:
+    """'multiplication=2,division=0.5' -> {'multiplication': 2.0, 'division': 0.5}"""
+    weights = {}
+    for item in filter(None, text.split(',')):
+        operation, weight = item.split('=')
+        if operation not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f'Unknown operation: {operation}')
+        weights[operation] = float(weight)
+    return weights
+
+
+def parse_min_value(text: str) -> int:
+    """Card values divide the score, so they have to be at least 1"""
+    value = int(text)
+    if value < 1:
+        raise argparse.ArgumentTypeError(f'Minimum value has to be at least 1: {value}')
+    return value
+
+
+def analyze(
+    configs: list,
+    policies,
+    games: int,
+    chunk_size: int,
+    seed: int,
+    max_moves=1000,
+    max_depth=6,
+    workers=None,
+) -> list:
+    """
+    Plays games sessions of every config with every policy in a process pool.
+    Every chunk of chunk_size games has its own seed, so the results do not depend
+    on the number of workers. Returns one summary per config and policy
+    """
+    tasks = []
+    keys = []
+    for config_index, config in enumerate(configs):
+        for policy in policies:
+            for start in range(0, games, chunk_size):
+                chunk_seed = seed + len(tasks)
+                chunk_games = min(chunk_size, games - start)
+                tasks.append(
+                    (config, policy, chunk_games, chunk_seed, max_moves, max_depth)
+                )
+                keys.append((config_index, policy))
+
+    results: dict = {}
+    with ProcessPoolExecutor(workers) as executor:
+        for key, (moves, scores) in zip(keys, executor.map(play_chunk, tasks)):
+            results.setdefault(key, []).append((moves, scores))
+
+    summaries = []
+    for (config_index, policy), chunks in results.items():
+        moves = np.concatenate([moves for moves, _ in chunks])
+        scores = np.concatenate([scores for _, scores in chunks])
+        summaries.append(
+            {
+                'config': configs[config_index],
+                'policy': policy,
+                **summarize(moves, scores),
+            }
+        )
+    return summaries
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        '--games', type=int, default=10000, help='sessions per config and policy'
+    )
+    parser.add_argument('--policy', nargs='+', choices=POLICIES, default=list(POLICIES))
+    parser.add_argument('--min-value', nargs='+', type=parse_min_value, default=[1])
+    parser.add_argument('--max-value', nargs='+', type=int, default=[50])
+    parser.add_argument(
+        '--weights',
+        nargs='+',
+        type=parse_weights,
+        default=[{}],
+        help="operation mixes, e.g. 'multiplication=2,round_up=0.5', missing operations get 1",
+    )
+    parser.add_argument(
+        '--cap',
+        nargs='+',
+        choices=CAPS,
+        default=['half'],
+        help='multiplication and division values up to max_value // 2 (half) or max_value (full)',
+    )
+    parser.add_argument('--starting-score', nargs='+', type=int, default=[100])
+    parser.add_argument('--max-highscore', nargs='+', type=int, default=[100])
+    parser.add_argument('--target-score', type=int, default=0)
+    parser.add_argument(
+        '--max-moves', type=int, default=1000, help='sessions longer than this are lost'
+    )
+    parser.add_argument(
+        '--max-depth', type=int, default=6, help='search depth of the optimal policy'
+    )
+    parser.add_argument(
+        '--chunk-size', type=int, default=2000, help='sessions per task'
+    )
+    parser.add_argument(
+        '--workers', type=int, default=None, help='processes, default all cores'
+    )
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    args = parser.parse_args()
+    for min_value, max_value, cap in itertools.product(
+        args.min_value, args.max_value, args.cap
+    ):
+        value_ranges = get_value_ranges(min_value, max_value, cap).values()
+        if any(high < low for low, high in value_ranges):
+            parser.error(
+                f'--max-value {max_value} with --cap {cap} allows no values'
+                f' of at least --min-value {min_value}'
+            )
+
+    configs = get_configs(args)
+    started = time.perf_counter()
+    summaries = analyze(
+        configs,
+        args.policy,
+        args.games,
+        args.chunk_size,
+        args.seed,
+        args.max_moves,
+        args.max_depth,
+        args.workers,
+    )
+    elapsed = time.perf_counter() - started
+
+    if args.json:
+        print(json.dumps(summaries, indent=2))
+        return
+    total = args.games * len(configs) * len(args.policy)
+    workers = args.workers or os.cpu_count()
+    print(
+        f'{total} sessions in {elapsed:.1f}s on {workers} workers ({total / elapsed:,.0f}/s)'
+    )
+    for summary in summaries:
+        config = summary['config']
+        weights = ','.join(
+            f'{op}={weight:g}' for op, weight in config['weights'].items()
+        )
+        print(
+            f'\nvalues {config["min_value"]}..{config["max_value"]} cap={config["cap"]}'
+            f' weights={weights or "equal"} start={config["starting_score"]}'
+            f' max_highscore={config["max_highscore"]} policy={summary["policy"]}'
+        )
+        print(f'  win rate {summary["win_rate"]:.1%}')
+        moves = summary['moves']
+        if moves is not None:
+            print(
+                f'  moves to win  mean {moves["mean"]:.1f}  p50 {moves["p50"]:.0f}'
+                f'  p90 {moves["p90"]:.0f}  p99 {moves["p99"]:.0f}  max {moves["max"]}'
+            )
+        score = summary['score']
+        print(
+            f'  score         mean {score["mean"]:.1f}  p10 {score["p10"]:.0f}'
+            f'  p50 {score["p50"]:.0f}  p90 {score["p90"]:.0f}'
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""
+Card refresh benchmark of Game 1.
+Times one CardButton refresh on a real ttkbootstrap button:
+- padded: the card text is padded on every refresh and bootstyle is configured,
+  so ttkbootstrap resolves the style again (CardButton.update_text before CardFaces)
+- cached: the face is looked up in CardFaces and the ttk style name resolved once
+  is configured straight on the ttk widget (CardButton.update_text)
+Needs a display, on a headless box run with xvfb-run:
+    xvfb-run python benchmarks/bench_card_refresh.py
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ttkbootstrap as tb  # type: ignore
+
+from card_engine import Card
+from card_faces import CardFaces, get_card_style, pad_card_text
+from card_source import CardSource
+from game import configure_ttk, get_ttk_style
+
+HEIGHT = 5
+
+
+def get_cards(count: int) -> list:
+    source = CardSource(0)
+    cards = [Card('addition', 0, source=source) for _ in range(count)]
+    for card in cards:
+        card.reinit_card()
+    return cards
+
+
+def refresh_padded(button, cards: list) -> int:
+    start = time.perf_counter_ns()
+    for card in cards:
+        text = pad_card_text(card.get_card_text(), HEIGHT)
+        button.configure(text=text, bootstyle=get_card_style(card.card_type))
+    return time.perf_counter_ns() - start
+
+
+def refresh_cached(button, cards: list, faces: CardFaces) -> int:
+    start = time.perf_counter_ns()
+    for card in cards:
+        style = get_ttk_style(button, get_card_style(card.card_type))
+        configure_ttk(button, text=faces.get_face(card), style=style)
+    return time.perf_counter_ns() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--ops', type=int, default=2000, help='refreshes per run')
+    parser.add_argument(
+        '--repeats', type=int, default=5, help='runs per case, the fastest counts'
+    )
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    args = parser.parse_args()
+
+    app = tb.Window(themename='darkly')
+    button = tb.Button(app, width=8, bootstyle=get_card_style('addition'))
+    button.grid()
+    app.update_idletasks()
+    cards = get_cards(args.ops)
+    faces = CardFaces(HEIGHT)
+    cases = {
+        'card.refresh_padded': lambda: refresh_padded(button, cards),
+        'card.refresh_cached': lambda: refresh_cached(button, cards, faces),
+    }
+    results = {}
+    for name, case in cases.items():
+        case()
+        times = sorted(case() / args.ops for _ in range(args.repeats))
+        results[name] = {
+            'ns_per_op': times[0],
+            'median_ns_per_op': times[len(times) // 2],
+        }
+    app.destroy()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f'{args.ops} refreshes x {args.repeats} runs, fastest run')
+    for name, result in results.items():
+        print(f'  {name:<20} {result["ns_per_op"]:>10.0f} ns/op')
+    speedup = (
+        results['card.refresh_padded']['ns_per_op']
+        / results['card.refresh_cached']['ns_per_op']
+    )
+    print(f'  cached is {speedup:.1f}x faster')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,260 @@
+"""
+Load generator of the game server.
+Starts game_server.py in a new process, or connects to a running one, keeps sessions
+worm games running over a few connections with random WASD turns and reports the
+server CPU use, the Game 2 sessions one core can host and the tick jitter:
+    python benchmarks/bench_game_server.py --sessions 1000 --duration 20
+    python benchmarks/bench_game_server.py --connect 127.0.0.1:8765
+Finished games are replaced with new ones so the number of sessions stays the same.
+Sessions per core is sessions divided by the share of one core the server used,
+measured while all sessions run.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from metrics import Histogram
+
+
+class Client:
+    def __init__(
+        self, reader, writer, rng: random.Random, watch: bool, board: list
+    ) -> None:
+        """One connection with its sessions, replies are matched to requests by id"""
+        self.reader = reader
+        self.writer = writer
+        self.rng = rng
+        self.watch = watch
+        self.board = board
+        self.next_id = 0
+        self.waiting: dict = {}
+        self.sessions: set = set()
+        self.events = 0
+        self.games = 0
+        self.round_trips = Histogram(1 << 16)
+
+    async def request(self, message: dict) -> dict:
+        self.next_id += 1
+        message['id'] = self.next_id
+        future = asyncio.get_running_loop().create_future()
+        self.waiting[self.next_id] = (future, time.perf_counter())
+        self.writer.write(json.dumps(message).encode() + b'\n')
+        await self.writer.drain()
+        reply = await future
+        if not reply['ok']:
+            raise RuntimeError(reply['error'])
+        return reply
+
+    async def read(self) -> None:
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                return
+            message = json.loads(line)
+            if 'event' in message:
+                self.events += 1
+                if message['event'] == 'game_over':
+                    self.games += 1
+                    asyncio.create_task(self.replace(message['session']))
+                continue
+            future, sent = self.waiting.pop(message['id'])
+            self.round_trips.observe(time.perf_counter() - sent)
+            future.set_result(message)
+
+    async def start_session(self) -> None:
+        reply = await self.request(
+            {
+                'op': 'new',
+                'game': 'game2',
+                'seed': self.rng.randrange(2**32),
+                'board': self.board,
+                'watch': self.watch,
+            }
+        )
+        self.sessions.add(reply['session'])
+
+    async def replace(self, session: int) -> None:
+        self.sessions.discard(session)
+        await self.request({'op': 'close', 'session': session})
+        await self.start_session()
+
+    async def steer(self, interval: float) -> None:
+        """Turns a random session every interval / sessions seconds"""
+        while True:
+            await asyncio.sleep(interval / max(len(self.sessions), 1))
+            if self.sessions:
+                session = self.rng.choice(tuple(self.sessions))
+                try:
+                    await self.request(
+                        {
+                            'op': 'turn',
+                            'session': session,
+                            'key': self.rng.choice('wasd'),
+                        }
+                    )
+                except RuntimeError:
+                    # The game ended before the turn arrived
+                    pass
+
+
+async def get_stats(host: str, port: int, reset=False) -> dict:
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(json.dumps({'op': 'stats', 'reset': reset}).encode() + b'\n')
+    stats = json.loads(await reader.readline())
+    writer.close()
+    return stats
+
+
+async def run(args, host: str, port: int) -> dict:
+    rng = random.Random(args.seed)
+    clients = []
+    tasks = []
+    for _ in range(args.connections):
+        reader, writer = await asyncio.open_connection(host, port, limit=1 << 20)
+        client = Client(
+            reader, writer, random.Random(rng.random()), args.watch, args.board
+        )
+        clients.append(client)
+        tasks.append(asyncio.create_task(client.read()))
+    for index in range(args.sessions):
+        await clients[index % len(clients)].start_session()
+    tasks += [
+        asyncio.create_task(client.steer(args.turn_interval)) for client in clients
+    ]
+
+    await asyncio.sleep(args.warmup)
+    before = await get_stats(host, port, reset=True)
+    await asyncio.sleep(args.duration)
+    after = await get_stats(host, port)
+
+    for task in tasks:
+        task.cancel()
+    for client in clients:
+        client.writer.close()
+
+    wall = after['time'] - before['time']
+    cpu = after['cpu_time'] - before['cpu_time']
+    ticks = after['metrics']['counters'].get('server.ticks', 0) - before['metrics'][
+        'counters'
+    ].get('server.ticks', 0)
+    lateness = after['metrics']['histograms'].get('server.tick_lateness', {})
+    round_trips = Histogram(1 << 16)
+    for client in clients:
+        for sample in client.round_trips.samples:
+            round_trips.observe(sample)
+    round_trips = round_trips.summary()
+    utilization = cpu / wall
+    return {
+        'sessions': after['game2_sessions'],
+        'seconds': wall,
+        'ticks_per_second': ticks / wall,
+        'server_cpu': utilization,
+        'sessions_per_core': after['game2_sessions'] / utilization
+        if utilization
+        else 0.0,
+        'cpu_us_per_tick': cpu / ticks * 1e6 if ticks else 0.0,
+        'games_finished': sum(client.games for client in clients),
+        'events': sum(client.events for client in clients),
+        'dropped_events': after['metrics']['counters'].get('server.dropped_events', 0),
+        'tick_jitter_ms': {
+            key: lateness.get(key, 0.0) * 1000 for key in ('mean', 'p50', 'p99', 'max')
+        },
+        'round_trip_ms': {
+            key: round_trips[key] * 1000 for key in ('mean', 'p50', 'p99', 'max')
+        },
+    }
+
+
+def start_server() -> tuple:
+    """Starts game_server.py on a free port, returns (process, port)"""
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, 'game_server.py'), '--port', '0'],
+        cwd=ROOT,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    for line in process.stderr:
+        match = re.search(r'listening on .*:(\d+)', line)
+        if match:
+            return process, int(match.group(1))
+    raise RuntimeError('Game server did not start')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        '--sessions', type=int, default=1000, help='concurrent worm games'
+    )
+    parser.add_argument('--connections', type=int, default=10)
+    parser.add_argument(
+        '--board', nargs=2, type=int, default=[10, 10], metavar=('WIDTH', 'HEIGHT')
+    )
+    parser.add_argument('--duration', type=float, default=20.0, help='seconds measured')
+    parser.add_argument(
+        '--warmup', type=float, default=5.0, help='seconds before measuring'
+    )
+    parser.add_argument(
+        '--turn-interval',
+        type=float,
+        default=1.0,
+        help='seconds between turns of a session',
+    )
+    parser.add_argument(
+        '--watch', action='store_true', help='get a tick event of every session'
+    )
+    parser.add_argument('--connect', metavar='HOST:PORT', help='use a running server')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    args = parser.parse_args()
+
+    process = None
+    if args.connect:
+        host, port = args.connect.rsplit(':', 1)
+        port = int(port)
+    else:
+        host = '127.0.0.1'
+        process, port = start_server()
+    try:
+        results = asyncio.run(run(args, host, port))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    jitter = results['tick_jitter_ms']
+    round_trip = results['round_trip_ms']
+    print(
+        f'{results["sessions"]} worm games for {results["seconds"]:.1f}s, '
+        f'{results["games_finished"]} finished and replaced'
+    )
+    print(f'  ticks/s            {results["ticks_per_second"]:10.0f}')
+    print(f'  server cpu         {results["server_cpu"]:10.1%}')
+    print(f'  sessions per core  {results["sessions_per_core"]:10.0f}')
+    print(f'  cpu per tick       {results["cpu_us_per_tick"]:10.1f} us')
+    print(
+        f'  tick jitter        mean {jitter["mean"]:.2f}  p50 {jitter["p50"]:.2f}'
+        f'  p99 {jitter["p99"]:.2f}  max {jitter["max"]:.2f} ms'
+    )
+    print(
+        f'  turn round trip    mean {round_trip["mean"]:.2f}  p50 {round_trip["p50"]:.2f}'
+        f'  p99 {round_trip["p99"]:.2f}  max {round_trip["max"]:.2f} ms'
+    )
+    if results['dropped_events']:
+        print(f'  dropped events     {results["dropped_events"]:10d}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,261 @@
+"""
+Microbenchmarks of the hot paths of both games.
+Runs headless against the engines that the Tk windows call, so no display is needed:
+- card.reinit_card: Card.reinit_card()
+- card.get_face: CardFaces.get_face() of CardButton.update_text, see bench_card_refresh.py for Tk
+- game1.on_click_card: Game1Engine.play() and the replay record of Game1.on_click_card
+- game2.update_position: WormEngine.move() of Game2.Worm.update_position
+- game2.game_over: the collision move that ends the game in Game2.game_over
+- game2.spawn_food: WormEngine.spawn_food()
+- game2.food_eaten: eating move and the next WormEngine.spawn_food()
+Worm game cases run for worm lengths 1 to 10k on boards from 10x10 to 1000x1000.
+Results can be saved as a JSON baseline and later runs compared against it:
+    python benchmarks/bench_hot_paths.py --save baseline.json
+    python benchmarks/bench_hot_paths.py --compare baseline.json --threshold 0.2
+The comparison exits with status 1 when a case is slower than the baseline by more
+than the threshold.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from card_engine import Card, Game1Engine
+from card_faces import CardFaces
+from card_source import CardSource
+from replay import GAME1, ReplayWriter
+from worm_engine import NO_CELL, WormEngine
+
+BOARD_SIZES = (10, 100, 1000)
+WORM_LENGTHS = (1, 10, 100, 1000, 10000)
+
+
+class WormPath:
+    def __init__(self, board_size: int, length: int, seed=0) -> None:
+        """
+        Worm of length on a square board_size board that moves forever without colliding.
+        Every row is crossed with board_size - 1 moves right followed by one move down,
+        so the worm only comes back to a cell after board_size ** 2 moves
+        """
+        self.board_size = board_size
+        self.engine = WormEngine(board_size, board_size, seed=seed)
+        self.engine.food = NO_CELL
+        self.step = 0
+        self.engine.grow(length - 1)
+        for _ in range(length - 1):
+            self.move()
+
+    def next_direction(self) -> str:
+        return 'DOWN' if self.step % self.board_size == self.board_size - 1 else 'RIGHT'
+
+    def move(self) -> tuple:
+        result = self.engine.move(self.next_direction())
+        self.step += 1
+        return result
+
+
+def get_lengths(board_size: int) -> list:
+    cells = board_size * board_size
+    lengths = {length for length in WORM_LENGTHS if length < cells}
+    if cells - 1 <= max(WORM_LENGTHS):
+        lengths.add(cells - 1)
+    return sorted(lengths)
+
+
+def bench_reinit_card(ops: int) -> None:
+    card = Card('addition', 0, source=CardSource(0))
+    for _ in range(ops):
+        card.reinit_card()
+
+
+def bench_get_face(ops: int) -> int:
+    faces = CardFaces()
+    source = CardSource(0)
+    cards = [Card('addition', 0, source=source) for _ in range(1000)]
+    for card in cards:
+        card.reinit_card()
+    start = time.perf_counter_ns()
+    for index in range(ops):
+        faces.get_face(cards[index % 1000])
+    return time.perf_counter_ns() - start
+
+
+def bench_on_click_card(ops: int) -> None:
+    engine = Game1Engine(source=CardSource(0))
+    engine.new_game(0)
+    writer = ReplayWriter(os.devnull, GAME1, 0, (100, 0, 100))
+    for move in range(ops):
+        card_index = move % 4
+        writer.record_card(engine.moves, card_index)
+        if engine.play(card_index):
+            engine.reset()
+    writer.close()
+
+
+def worm_cases(board_size: int, length: int) -> dict:
+    """
+    Returns the worm benchmarks of one board size and worm length by name.
+    They time themselves, building the worm is not counted
+    """
+
+    def update_position(ops: int) -> int:
+        path = WormPath(board_size, length)
+        start = time.perf_counter_ns()
+        for _ in range(ops):
+            path.move()
+        return time.perf_counter_ns() - start
+
+    def game_over(ops: int) -> int:
+        path = WormPath(board_size, max(length, 3))
+        engine = path.engine
+        # Turning back into the second cell of the body collides
+        direction = 'LEFT' if path.next_direction() == 'RIGHT' else 'UP'
+        start = time.perf_counter_ns()
+        for _ in range(ops):
+            engine.move(direction)
+            if not engine.alive:
+                engine.alive = True
+        return time.perf_counter_ns() - start
+
+    def spawn_food(ops: int) -> int:
+        engine = WormPath(board_size, length).engine
+        start = time.perf_counter_ns()
+        for _ in range(ops):
+            engine.spawn_food()
+        return time.perf_counter_ns() - start
+
+    def food_eaten(ops: int) -> int:
+        path = WormPath(board_size, length)
+        engine = path.engine
+        start = time.perf_counter_ns()
+        for _ in range(ops):
+            engine.food = engine.next_cell(path.next_direction())
+            path.move()
+            engine.spawn_food()
+            # Keeps the length of the case, growth would end the game on small boards
+            engine.pending_growth = 0
+        return time.perf_counter_ns() - start
+
+    suffix = f'[{board_size}x{board_size},len={length}]'
+    return {
+        f'game2.update_position{suffix}': update_position,
+        f'game2.game_over{suffix}': game_over,
+        f'game2.spawn_food{suffix}': spawn_food,
+        f'game2.food_eaten{suffix}': food_eaten,
+    }
+
+
+def timed(function):
+    """Wraps a benchmark that does not time itself, returns the nanoseconds of the run"""
+
+    def run(ops: int) -> int:
+        start = time.perf_counter_ns()
+        function(ops)
+        return time.perf_counter_ns() - start
+
+    return run
+
+
+def get_cases() -> dict:
+    cases = {
+        'card.reinit_card': timed(bench_reinit_card),
+        'card.get_face': bench_get_face,
+        'game1.on_click_card': timed(bench_on_click_card),
+    }
+    for board_size in BOARD_SIZES:
+        for length in get_lengths(board_size):
+            cases.update(worm_cases(board_size, length))
+    return cases
+
+
+def run_case(case, ops: int, repeats: int) -> dict:
+    """Returns the min and median nanoseconds per operation of repeats runs"""
+    times = sorted(case(ops) / ops for _ in range(repeats))
+    return {'ns_per_op': times[0], 'median_ns_per_op': times[len(times) // 2]}
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """Returns the names of the cases that are slower than baseline by more than threshold"""
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        ratio = result['ns_per_op'] / baseline[name]['ns_per_op']
+        result['baseline_ns_per_op'] = baseline[name]['ns_per_op']
+        result['ratio'] = ratio
+        if ratio > 1.0 + threshold:
+            regressions.append(name)
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--ops', type=int, default=2000, help='operations per run')
+    parser.add_argument(
+        '--repeats', type=int, default=5, help='runs per case, the fastest counts'
+    )
+    parser.add_argument(
+        '--filter', default='', help='only run cases that contain this text'
+    )
+    parser.add_argument(
+        '--save', metavar='PATH', help='save the results as a JSON baseline'
+    )
+    parser.add_argument(
+        '--compare', metavar='PATH', help='compare against a JSON baseline'
+    )
+    parser.add_argument(
+        '--threshold', type=float, default=0.2, help='allowed slowdown, 0.2 is 20%%'
+    )
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    args = parser.parse_args()
+
+    results = {}
+    for name, case in get_cases().items():
+        if args.filter in name:
+            results[name] = run_case(case, args.ops, args.repeats)
+
+    regressions = []
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.threshold)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(
+                {
+                    'python': platform.python_version(),
+                    'machine': platform.machine(),
+                    'ops': args.ops,
+                    'repeats': args.repeats,
+                    'results': results,
+                },
+                f,
+                indent=2,
+            )
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f'{args.ops} operations x {args.repeats} runs, fastest run')
+        for name, result in results.items():
+            line = f'  {name:<52} {result["ns_per_op"]:>10.0f} ns/op'
+            if 'ratio' in result:
+                flag = '  REGRESSION' if name in regressions else ''
+                line += f'  {result["ratio"]:5.2f}x baseline{flag}'
+            print(line)
+
+    if regressions:
+        print(
+            f'{len(regressions)} regressions over {args.threshold:.0%}', file=sys.stderr
+        )
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
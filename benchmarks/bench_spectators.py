@@ -0,0 +1,161 @@
+"""
+Spectator feed benchmark.
+Plays a worm game with the greedy tournament policy, publishes every tick to a
+SpectatorFeed with hundreds of connected spectators and reports the time publish_tick
+adds to Game2.update_frame, the bytes per tick and the frames dropped for spectators
+that never read. Spectators that read check that their view matches the game:
+    python benchmarks/bench_spectators.py --spectators 300 --slow 10
+"""
+
+import argparse
+import json
+import os
+import selectors
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from metrics import Histogram
+from spectator import SpectatorFeed, SpectatorView
+from worm_engine import WormEngine
+from worm_tournament import greedy_policy
+
+
+def read_spectators(sockets: list, views: list, stop: threading.Event) -> None:
+    selector = selectors.DefaultSelector()
+    for sock, view in zip(sockets, views):
+        sock.setblocking(False)
+        selector.register(sock, selectors.EVENT_READ, view)
+    while not stop.is_set():
+        for key, _ in selector.select(0.1):
+            try:
+                data = key.fileobj.recv(65536)
+            except BlockingIOError:
+                continue
+            if data:
+                key.data.feed(data)
+    selector.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        '--spectators', type=int, default=300, help='spectators that read'
+    )
+    parser.add_argument(
+        '--slow', type=int, default=10, help='spectators that never read'
+    )
+    parser.add_argument('--ticks', type=int, default=5000)
+    parser.add_argument(
+        '--tick-rate', type=float, default=200.0, help='ticks per second'
+    )
+    parser.add_argument(
+        '--board', nargs=2, type=int, default=[30, 30], metavar=('WIDTH', 'HEIGHT')
+    )
+    parser.add_argument('--keyframe-interval', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    args = parser.parse_args()
+
+    feed = SpectatorFeed(0, keyframe_interval=args.keyframe_interval)
+    feed.start()
+    readers = [
+        socket.create_connection(('127.0.0.1', feed.port))
+        for _ in range(args.spectators)
+    ]
+    slow = [
+        socket.create_connection(('127.0.0.1', feed.port)) for _ in range(args.slow)
+    ]
+    for sock in slow:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+    views = [SpectatorView() for _ in readers]
+    stop = threading.Event()
+    reader_thread = threading.Thread(
+        target=read_spectators, args=(readers, views, stop)
+    )
+    reader_thread.start()
+    while feed.spectators < len(readers) + len(slow):
+        time.sleep(0.01)
+
+    engine = WormEngine(*args.board)
+    publish = Histogram(args.ticks)
+    interval = 1 / args.tick_rate
+    game = 0
+    tick = 0
+    score = 0
+    direction = 'RIGHT'
+    decide = None
+    byte_count = 0
+    next_tick = time.monotonic()
+    for _ in range(args.ticks):
+        if decide is None or not engine.alive:
+            engine.new_game(args.seed + game)
+            engine.spawn_food()
+            decide = greedy_policy(engine, args.seed + game)
+            game += 1
+            tick = 0
+            score = 0
+        direction = decide(direction)
+        tick += 1
+        head, tail, ate = engine.move(direction)
+        if ate:
+            score += 1
+            engine.spawn_food()
+        queued = len(feed.queue)
+        started = time.perf_counter()
+        feed.publish_tick(tick, engine, head, tail, score, int(ate))
+        publish.observe(time.perf_counter() - started)
+        if len(feed.queue) > queued:
+            byte_count += len(feed.queue[-1])
+        next_tick += interval
+        time.sleep(max(0.0, next_tick - time.monotonic()))
+
+    # Lets the feed send the last frames
+    time.sleep(0.5)
+    stop.set()
+    reader_thread.join()
+    in_sync = sum(
+        view.tick == tick
+        and list(view.body) == list(engine.body)
+        and view.score == score
+        for view in views
+    )
+    summary = publish.summary()
+    results = {
+        'spectators': args.spectators,
+        'slow_spectators': args.slow,
+        'ticks': args.ticks,
+        'games': game,
+        'publish_us': {
+            key: summary[key] * 1e6 for key in ('mean', 'p50', 'p99', 'max')
+        },
+        'bytes_per_tick': byte_count / args.ticks,
+        'in_sync': in_sync,
+        'dropped': feed.dropped,
+    }
+    for sock in readers + slow:
+        sock.close()
+    feed.stop()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    publish_us = results['publish_us']
+    print(
+        f'{args.ticks} ticks at {args.tick_rate:.0f}/s, {args.spectators} spectators '
+        f'and {args.slow} that never read'
+    )
+    print(
+        f'  publish_tick     mean {publish_us["mean"]:.1f}  p50 {publish_us["p50"]:.1f}'
+        f'  p99 {publish_us["p99"]:.1f}  max {publish_us["max"]:.1f} us'
+    )
+    print(f'  bytes per tick   {results["bytes_per_tick"]:.1f}')
+    print(f'  in sync          {in_sync} of {args.spectators}')
+    print(f'  dropped          {results["dropped"]} times')
+
+
+if __name__ == '__main__':
+    main()
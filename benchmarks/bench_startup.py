@@ -0,0 +1,80 @@
+"""
+Startup benchmark of the arcade menu.
+Starts the app in a new process and reports the time from process start to the first
+drawn frame of the menu. Needs a display, on a headless box run with xvfb-run:
+    xvfb-run python benchmarks/bench_startup.py
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in the child process, prints seconds since the start of the interpreter
+CHILD = """
+import time
+started = time.perf_counter()
+import game
+imported = time.perf_counter()
+app = game.App(title='Startup benchmark', size=(600, 650))
+built = time.perf_counter()
+
+def first_frame():
+    app.update_idletasks()
+    drawn = time.perf_counter()
+    print(f'{imported - started} {built - started} {drawn - started}', flush=True)
+    app.destroy()
+
+app.after_idle(first_frame)
+app.mainloop()
+"""
+
+
+def run_once() -> dict:
+    process_started = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, '-c', CHILD],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    process_ended = time.perf_counter()
+    imported, built, drawn = (float(value) for value in output.split()[-3:])
+    return {
+        'import': imported,
+        'build': built,
+        'first_frame': drawn,
+        'process': process_ended - process_started,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    args = parser.parse_args()
+
+    runs = [run_once() for _ in range(args.runs)]
+    results = {
+        key: {
+            'median': statistics.median(run[key] for run in runs),
+            'min': min(run[key] for run in runs),
+        }
+        for key in runs[0]
+    }
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f'{args.runs} runs, seconds since interpreter start (median / min)')
+    for key, result in results.items():
+        print(f'  {key:<12} {result["median"]:.4f} / {result["min"]:.4f}')
+
+
+if __name__ == '__main__':
+    main()
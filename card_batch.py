@@ -0,0 +1,171 @@
+import numpy as np
+
+from card_engine import STARTING_HAND, TENTHS, divide_tenths
+from card_source import OPERATIONS, SIGNED_OPERATIONS, CardSource
+
+# Operation codes used in the arrays, index into OPERATIONS
+ADDITION, SUBTRACTION, MULTIPLICATION, DIVISION, ROUND_UP, ROUND_DOWN = range(6)
+
+_STARTING_CODES = np.array([OPERATIONS.index(op) for op in STARTING_HAND], np.int8)
+
+
+def apply_operators(
+    score: np.ndarray, operators: np.ndarray, values: np.ndarray, starting_score: int
+) -> np.ndarray:
+    """
+    Returns the clamped scores after playing cards with operators and values.
+    Same whole tenths arithmetic as card_engine.apply_operator, the arrays broadcast
+    """
+    tenths = np.rint(score * TENTHS).astype(np.int64)
+    values = values.astype(np.int64)
+    # Division by the placeholder 0 of other cards is never selected
+    safe_values = np.where(operators == DIVISION, values, 1)
+    new_tenths = np.select(
+        [
+            operators == ADDITION,
+            operators == SUBTRACTION,
+            operators == MULTIPLICATION,
+            operators == DIVISION,
+            operators == ROUND_UP,
+        ],
+        [
+            tenths + values * TENTHS,
+            tenths - values * TENTHS,
+            tenths * values,
+            divide_tenths(tenths, safe_values),
+            -(-tenths // TENTHS) * TENTHS,
+        ],
+        tenths // TENTHS * TENTHS,
+    )
+    limit = starting_score * TENTHS
+    np.clip(new_tenths, -limit, limit, out=new_tenths)
+    return new_tenths / TENTHS
+
+
+class BatchGame1Engine:
+    def __init__(
+        self,
+        games: int,
+        starting_score=100,
+        target_score=0,
+        max_highscore=100,
+        min_value=1,
+        max_value=50,
+        seed=None,
+        source=None,
+    ) -> None:
+        """
+        # Batched Game 1 rules
+        Runs many independent card games at once as NumPy arrays.
+        Uses the same rules as Game1Engine, one row per game
+        ### Arrays:
+        - score: (games,) current score
+        - operators: (games, 4) operation code of each card, see OPERATIONS
+        - values: (games, 4) value of each card, 0 for the round cards
+        - highscore: (games,) current highscore, lowered by one every move
+        - moves: (games,) played moves
+        - done: (games,) True when the game has reached target_score
+        ### Parameters:
+        - seed: seed of the NumPy generator
+        - source: CardSource whose operation weights and value ranges are used,
+          default is a CardSource with min_value and max_value
+        """
+        self.games = games
+        self.starting_score = starting_score
+        self.target_score = target_score
+        self.max_highscore = max_highscore
+        if source is None:
+            source = CardSource(min_value=min_value, max_value=max_value)
+        self.source = source
+        self.rng = np.random.default_rng(seed)
+        self.probability = np.array(source.probability)
+        self.alias = np.array(source.alias, np.int8)
+        ranges = [source.value_ranges[operation] for operation in OPERATIONS]
+        self.low = np.array([low for low, _ in ranges])
+        self.high = np.array([high for _, high in ranges])
+        self.signed = np.array([op in SIGNED_OPERATIONS for op in OPERATIONS])
+        self._rows = np.arange(games)
+
+        self.score = np.empty(games, np.float64)
+        self.operators = np.empty((games, 4), np.int8)
+        self.values = np.empty((games, 4), np.float64)
+        self.highscore = np.empty(games, np.int32)
+        self.moves = np.empty(games, np.int32)
+        self.done = np.empty(games, np.bool_)
+        self.reset()
+
+    def reset(self, mask=None) -> None:
+        """Resets all games, or only the games where mask is True"""
+        rows = self._rows if mask is None else np.flatnonzero(mask)
+        self.score[rows] = self.starting_score
+        self.highscore[rows] = self.max_highscore
+        self.moves[rows] = 0
+        self.done[rows] = False
+        operators = np.broadcast_to(_STARTING_CODES, (len(rows), 4))
+        self.operators[rows] = operators
+        self.values[rows] = self.draw_values(operators)
+
+    def draw_operators(self, count: int) -> np.ndarray:
+        """Draws operation codes with the weights of the source, alias method"""
+        column = self.rng.integers(0, len(OPERATIONS), count)
+        keep = self.rng.random(count) < self.probability[column]
+        return np.where(keep, column, self.alias[column]).astype(np.int8)
+
+    def draw_values(self, operators: np.ndarray) -> np.ndarray:
+        """Draws card values for the operation codes, same ranges as CardSource"""
+        values = self.rng.integers(
+            self.low[operators], self.high[operators], endpoint=True
+        )
+        sign = np.where(self.rng.random(operators.shape) < 0.5, -1, 1)
+        values = np.where(self.signed[operators], values * sign, values)
+        return np.where(operators >= ROUND_UP, 0, values).astype(np.float64)
+
+    def step(self, card_indices: np.ndarray) -> np.ndarray:
+        """
+        Plays card_indices[i] in game i. Finished games are left untouched.
+        Returns the done array
+        """
+        rows = np.flatnonzero(~self.done)
+        if len(rows) == 0:
+            return self.done
+        cards = np.asarray(card_indices)[rows]
+        operators = self.operators[rows, cards]
+        values = self.values[rows, cards]
+        new_score = apply_operators(
+            self.score[rows], operators, values, self.starting_score
+        )
+        self.score[rows] = new_score
+
+        new_operators = self.draw_operators(len(rows))
+        self.operators[rows, cards] = new_operators
+        self.values[rows, cards] = self.draw_values(new_operators)
+
+        self.highscore[rows] = np.maximum(self.highscore[rows] - 1, 0)
+        self.moves[rows] += 1
+        self.done[rows] = new_score == self.target_score
+        return self.done
+
+    def run(self, policy, max_moves=1000) -> np.ndarray:
+        """
+        Plays every game until it is won or max_moves is reached.
+        policy(engine) returns the card index to play for every game.
+        Returns the moves needed per game, -1 for games that were not won
+        """
+        for _ in range(max_moves):
+            if self.done.all():
+                break
+            self.step(policy(self))
+        return np.where(self.done, self.moves, -1)
+
+
+def random_policy(engine: BatchGame1Engine) -> np.ndarray:
+    """Plays a random card in every game"""
+    return engine.rng.integers(0, 4, engine.games)
+
+
+def greedy_policy(engine: BatchGame1Engine) -> np.ndarray:
+    """Plays the card that gets closest to target_score in every game"""
+    outcome = apply_operators(
+        engine.score[:, None], engine.operators, engine.values, engine.starting_score
+    )
+    return np.abs(outcome - engine.target_score).argmin(axis=1)
@@ -0,0 +1,225 @@
+import math
+from logging import debug
+
+from card_source import CardSource
+
+OPERATORS = {
+    'addition': '+',
+    'subtraction': '-',
+    'multiplication': '*',
+    'division': '/',
+    'round_up': 'round_up',
+    'round_down': 'round_down',
+}
+
+# Cards that are dealt when a game starts, one per card slot
+STARTING_HAND = ('addition', 'subtraction', 'multiplication', 'division')
+
+
+# Scores are multiples of 0.1, the rules work on whole tenths so no float rounding is needed
+TENTHS = 10
+
+
+def divide_tenths(tenths, value):
+    """
+    Returns tenths / value rounded to whole tenths, halves away from zero.
+    Only uses integer operators, so it works the same on ints and on NumPy integer arrays
+    """
+    quotient = (2 * abs(tenths) + abs(value)) // (2 * abs(value))
+    negative = (tenths < 0) != (value < 0)
+    return quotient - 2 * quotient * negative
+
+
+def to_tenths(score) -> int:
+    return round(score * TENTHS)
+
+
+def from_tenths(tenths: int):
+    """Whole scores are ints, so they are shown without the decimal"""
+    if tenths % TENTHS == 0:
+        return tenths // TENTHS
+    return tenths / TENTHS
+
+
+def apply_operator(score, operator: str, value):
+    """
+    Returns the score after playing a card with operator and value,
+    rounded to one decimal with divide_tenths().
+    Does not clamp the result, see clamp_score()
+    """
+    tenths = to_tenths(score)
+    if operator == '+':
+        return from_tenths(tenths + value * TENTHS)
+    elif operator == '-':
+        return from_tenths(tenths - value * TENTHS)
+    elif operator == '*':
+        return from_tenths(tenths * value)
+    elif operator == '/':
+        return from_tenths(divide_tenths(tenths, value))
+    elif operator == 'round_up':
+        return math.ceil(score)
+    elif operator == 'round_down':
+        return math.floor(score)
+    debug(f'Invalid operator: {operator}')
+    return score
+
+
+def clamp_score(value, starting_score: int):
+    """Keeps the score between -starting_score and starting_score"""
+    if value > starting_score:
+        return starting_score
+    elif value < starting_score * -1:
+        return starting_score * -1
+    return value
+
+
+class Card:
+    def __init__(
+        self, card_type: str, index: int, min_value=1, max_value=50, source=None
+    ):
+        """
+        # Card
+        Has stored operation type, value and index. Used in CardButton
+        ### Parameters:
+        - card_type: 'addition', 'subtraction', 'multiplication', 'division', 'round_up', 'round_down'
+        - index: Required identifier for updating this card, has to be number 0-3
+        - min_value: minimum value that this card's value can get, default=1
+        - max_value: maximum value that this card's value can get, default=50
+        - source: CardSource that deals the values, default is a new unseeded CardSource
+        """
+        if source is None:
+            source = CardSource(min_value=min_value, max_value=max_value)
+        self.source = source
+        self.index = index
+        self.operator = None
+        self.min_value = min_value
+        self.max_value = max_value
+
+        self.set_card(card_type, self.source.draw_value(card_type))
+
+    def get_card_text(self):
+        if len(self.operator) > 1:
+            return self.value
+        return f'{self.operator}{self.value}'
+
+    def set_card(self, card_type: str, value: int) -> None:
+        self.card_type = card_type
+        self.value = value
+        self.init_value_and_operator()
+
+    def init_value_and_operator(self):
+        if self.card_type == 'addition':
+            self.operator = '+'
+        elif self.card_type == 'subtraction':
+            self.operator = '-'
+        elif self.card_type == 'multiplication':
+            self.operator = '*'
+        elif self.card_type == 'division':
+            self.operator = '/'
+        elif self.card_type == 'round_up':
+            self.value = 'Round\nup'
+            self.operator = 'round_up'
+        elif self.card_type == 'round_down':
+            self.value = 'Round\ndown'
+            self.operator = 'round_down'
+        else:
+            debug('Invalid card_type:', self.card_type)
+
+    def get_card(self) -> dict:
+        return {'value': self.value, 'index': self.index, 'operator': self.operator}
+
+    def reinit_card(self, operation=None):
+        if operation:
+            self.set_card(operation, self.source.draw_value(operation))
+        else:
+            self.set_card(*self.source.draw())
+
+
+class Game1Engine:
+    def __init__(
+        self,
+        starting_score=100,
+        target_score=0,
+        max_highscore=100,
+        min_value=1,
+        max_value=50,
+        source=None,
+    ) -> None:
+        """
+        # Game 1 rules
+        Display-free version of the card game. Game1 only mirrors this state to widgets
+        ### Parameters:
+        - starting_score: score at the start of the game, also the upper and lower limit
+        - target_score: score that ends the game
+        - max_highscore: score at the start of the game, every move removes one point
+        - min_value, max_value: value range of the cards, see Card
+        - source: CardSource that deals the cards, default is a new unseeded CardSource.
+          Pass a seeded source to replay the same game
+        """
+        self.starting_score = starting_score
+        self.target_score = target_score
+        self.max_highscore = max_highscore
+        self.current_score = starting_score
+        self.current_highscore = max_highscore
+        self.moves = 0
+        if source is None:
+            source = CardSource(min_value=min_value, max_value=max_value)
+        self.source = source
+        self.cards = [
+            Card(card_type, index, min_value, max_value, source)
+            for index, card_type in enumerate(STARTING_HAND)
+        ]
+
+    def get_hand(self) -> tuple:
+        """Returns the visible cards as ((operator, value), ...)"""
+        return tuple((card.operator, card.value) for card in self.cards)
+
+    def game_over(self) -> bool:
+        return self.target_score == self.current_score
+
+    def reset(self) -> None:
+        self.current_score = self.starting_score
+        self.current_highscore = self.max_highscore
+        self.moves = 0
+        for card, card_type in zip(self.cards, STARTING_HAND):
+            card.reinit_card(card_type)
+
+    def new_game(self, seed=None) -> None:
+        """Resets the game and reseeds the card source, same seed deals the same game"""
+        if seed is not None:
+            self.source.reseed(seed)
+        self.reset()
+
+    def snapshot(self) -> tuple:
+        """Returns the state of the game, restore() brings it back"""
+        return (
+            self.current_score,
+            self.current_highscore,
+            self.moves,
+            tuple((card.card_type, card.value) for card in self.cards),
+            self.source.snapshot(),
+        )
+
+    def restore(self, snapshot: tuple) -> None:
+        self.current_score, self.current_highscore, self.moves, cards, source = snapshot
+        for card, (card_type, value) in zip(self.cards, cards):
+            card.set_card(card_type, value)
+        self.source.restore(source)
+
+    def set_current_score(self, value) -> None:
+        self.current_score = clamp_score(value, self.starting_score)
+
+    def play(self, card_index: int) -> bool:
+        """
+        Plays the card in card_index, deals a new card to its place and
+        returns True if the game is over after the move
+        """
+        card = self.cards[card_index]
+        self.set_current_score(
+            apply_operator(self.current_score, card.operator, card.value)
+        )
+        card.reinit_card()
+        if self.current_highscore > 0:
+            self.current_highscore -= 1
+        self.moves += 1
+        return self.game_over()
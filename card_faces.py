@@ -0,0 +1,59 @@
+from card_engine import Card
+from card_source import SIGNED_OPERATIONS, CardSource, default_value_ranges
+
+# Bootstyles of the cards by operation
+CARD_STYLES = {
+    'addition': 'custom.Primary.TButton',
+    'subtraction': 'custom.Primary.TButton',
+    'multiplication': 'custom.Success.TButton',
+    'division': 'custom.Success.TButton',
+    'round_up': 'custom.Info.TButton',
+    'round_down': 'custom.Info.TButton',
+}
+
+
+def get_card_style(card_type: str) -> str:
+    return CARD_STYLES.get(card_type, 'custom.Primary.TButton')
+
+
+def pad_card_text(text: str, height: int) -> str:
+    """Centers the text of a card vertically on a button that is height lines high"""
+    break_count = text.count('\n')
+    padding = '\n' * ((height - break_count) // 2)
+    text = padding + text + padding
+    if break_count > 0:
+        text = text[:-1]
+    return text
+
+
+class CardFaces:
+    def __init__(self, height=5, value_ranges=None) -> None:
+        """
+        # Card faces
+        Padded texts of every card that value_ranges can deal, built once so
+        refreshing a CardButton is a dictionary lookup.
+        Cards outside of value_ranges are padded when first seen and kept.
+        ### Parameters:
+        - height: lines of the CardButton
+        - value_ranges: {'operation': (min, max)} of the CardSource, default default_value_ranges()
+        """
+        self.height = height
+        self.faces: dict = {}
+        if value_ranges is None:
+            value_ranges = default_value_ranges()
+        card = Card('addition', 0, source=CardSource(0))
+        for operation, (low, high) in value_ranges.items():
+            values = list(range(low, high + 1))
+            if operation in SIGNED_OPERATIONS:
+                values += [-value for value in values]
+            for value in values:
+                card.set_card(operation, value)
+                text = card.get_card_text()
+                self.faces[text] = pad_card_text(text, height)
+
+    def get_face(self, card: Card) -> str:
+        text = card.get_card_text()
+        face = self.faces.get(text)
+        if face is None:
+            face = self.faces[text] = pad_card_text(text, self.height)
+        return face
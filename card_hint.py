@@ -0,0 +1,148 @@
+import time
+
+from card_engine import apply_operator, clamp_score
+
+# How many nodes are searched between clock checks
+CLOCK_CHECK_INTERVAL = 256
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+class HintSearch:
+    def __init__(
+        self,
+        target_score=0,
+        starting_score=100,
+        reuse_cards=False,
+        max_depth=12,
+        time_budget=0.02,
+    ) -> None:
+        """
+        # Hint search
+        Iterative deepening search for the shortest sequence of card plays
+        that gets from a score to target_score.
+        ### Parameters:
+        - target_score, starting_score: same as in Game1Engine
+        - reuse_cards: False plays every visible card at most once, since the cards
+          dealt after a play are unknown. True allows playing the same card again,
+          which gives a lower bound on the moves a hand needs
+        - max_depth: longest sequence that is searched
+        - time_budget: seconds before the search gives up, None searches until max_depth
+        """
+        self.target_score = target_score
+        self.starting_score = starting_score
+        self.reuse_cards = reuse_cards
+        self.max_depth = max_depth
+        self.time_budget = time_budget
+        # (score, hand) -> deepest remaining depth that is known to not reach target
+        self.table: dict = {}
+        self.nodes = 0
+        self.deadline = None
+
+    def search(self, score, hand) -> list | None:
+        """
+        Returns the card indices to play in order, [] if score already is the target
+        and None if no sequence was found within max_depth or the time budget.
+        - hand: ((operator, value), ...) as returned by Game1Engine.get_hand()
+        """
+        self.nodes = 0
+        if self.time_budget is None:
+            self.deadline = None
+        else:
+            self.deadline = time.perf_counter() + self.time_budget
+        cards = tuple(
+            (index, operator, value) for index, (operator, value) in enumerate(hand)
+        )
+        max_depth = (
+            self.max_depth if self.reuse_cards else min(self.max_depth, len(cards))
+        )
+        try:
+            for depth in range(max_depth + 1):
+                moves = self._search(score, cards, depth)
+                if moves is not None:
+                    moves.reverse()
+                    return moves
+        except SearchTimeout:
+            return None
+        return None
+
+    def _search(self, score, cards, depth) -> list | None:
+        if score == self.target_score:
+            return []
+        if depth == 0:
+            return None
+        key = (score, cards)
+        if self.table.get(key, -1) >= depth:
+            return None
+
+        self.nodes += 1
+        if (
+            self.deadline is not None
+            and self.nodes % CLOCK_CHECK_INTERVAL == 0
+            and time.perf_counter() > self.deadline
+        ):
+            raise SearchTimeout
+
+        for position, (index, operator, value) in enumerate(cards):
+            new_score = clamp_score(
+                apply_operator(score, operator, value), self.starting_score
+            )
+            if self.reuse_cards:
+                if new_score == score:
+                    continue
+                new_cards = cards
+            else:
+                new_cards = cards[:position] + cards[position + 1 :]
+            moves = self._search(new_score, new_cards, depth - 1)
+            if moves is not None:
+                moves.append(index)
+                return moves
+
+        self.table[key] = depth
+        return None
+
+
+def find_hint(engine, time_budget=0.02) -> list | None:
+    """
+    Returns the shortest sequence of visible cards that wins the game of a Game1Engine.
+    Falls back to reusing cards when the visible cards can't win on their own,
+    then only the first card of the sequence is certain
+    """
+    deadline = time.perf_counter() + time_budget
+    hand = engine.get_hand()
+    for reuse_cards in (False, True):
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            break
+        moves = HintSearch(
+            engine.target_score,
+            engine.starting_score,
+            reuse_cards=reuse_cards,
+            time_budget=remaining,
+        ).search(engine.current_score, hand)
+        if moves is not None:
+            return moves
+    return None
+
+
+def min_moves(
+    score, hand, target_score=0, starting_score=100, max_depth=12, search=None
+):
+    """
+    Offline version of the hint, no time budget.
+    Returns the minimum number of moves hand needs from score when cards can be reused,
+    None if it takes more than max_depth moves.
+    Pass the same HintSearch as search to share the transposition table between hands
+    """
+    if search is None:
+        search = HintSearch(
+            target_score,
+            starting_score,
+            reuse_cards=True,
+            max_depth=max_depth,
+            time_budget=None,
+        )
+    moves = search.search(score, hand)
+    return None if moves is None else len(moves)
@@ -0,0 +1,149 @@
+import random
+
+OPERATIONS = (
+    'addition',
+    'subtraction',
+    'multiplication',
+    'division',
+    'round_up',
+    'round_down',
+)
+
+# Operations whose value gets a random sign
+SIGNED_OPERATIONS = ('multiplication', 'division')
+
+
+def default_value_ranges(min_value=1, max_value=50) -> dict:
+    """Value ranges used by Card, multiplication and division are capped at max_value // 2"""
+    return {
+        'addition': (min_value, max_value),
+        'subtraction': (min_value, max_value),
+        'multiplication': (min_value, max_value // 2),
+        'division': (min_value, max_value // 2),
+        'round_up': (0, 0),
+        'round_down': (0, 0),
+    }
+
+
+def build_alias_table(weights: list) -> tuple:
+    """
+    Vose's alias method. Returns (probability, alias) lists that
+    allow sampling an index with the given weights in O(1)
+    """
+    count = len(weights)
+    total = sum(weights)
+    if total <= 0:
+        raise ValueError('At least one operation weight has to be positive')
+    scaled = [weight * count / total for weight in weights]
+    probability = [0.0] * count
+    alias = [0] * count
+    small = [index for index, weight in enumerate(scaled) if weight < 1]
+    large = [index for index, weight in enumerate(scaled) if weight >= 1]
+    while small and large:
+        less = small.pop()
+        more = large.pop()
+        probability[less] = scaled[less]
+        alias[less] = more
+        scaled[more] += scaled[less] - 1
+        if scaled[more] < 1:
+            small.append(more)
+        else:
+            large.append(more)
+    for index in small + large:
+        probability[index] = 1.0
+        alias[index] = index
+    return probability, alias
+
+
+class CardSource:
+    def __init__(
+        self,
+        seed=None,
+        weights=None,
+        value_ranges=None,
+        min_value=1,
+        max_value=50,
+        block_size=1024,
+    ) -> None:
+        """
+        # Card source
+        Per-session random source for cards. Same seed deals the same cards.
+        Draws are generated block_size at a time and handed out one by one.
+        ### Parameters:
+        - seed: seed of the random generator, None picks a random seed that is stored in self.seed
+        - weights: {'operation': weight}, missing operations get weight 1. Default all equally likely
+        - value_ranges: {'operation': (min, max)}, missing operations use default_value_ranges().
+          Multiplication and division values get a random sign
+        - min_value, max_value: used for the default value ranges
+        - block_size: how many cards are drawn at once
+        """
+        if seed is None:
+            seed = random.randrange(2**32)
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.block_size = block_size
+
+        self.weights = [1.0] * len(OPERATIONS)
+        for operation, weight in (weights or {}).items():
+            self.weights[OPERATIONS.index(operation)] = weight
+        self.probability, self.alias = build_alias_table(self.weights)
+
+        self.value_ranges = default_value_ranges(min_value, max_value)
+        if value_ranges is not None:
+            self.value_ranges.update(value_ranges)
+        self._ranges = [self.value_ranges[operation] for operation in OPERATIONS]
+        self._signed = [operation in SIGNED_OPERATIONS for operation in OPERATIONS]
+
+        self._block: list = []
+
+    def reseed(self, seed) -> None:
+        """Starts the same sequence of cards as a new CardSource(seed)"""
+        self.seed = seed
+        self.rng.seed(seed)
+        self._block.clear()
+
+    def snapshot(self) -> tuple:
+        return self.seed, self.rng.getstate(), tuple(self._block)
+
+    def restore(self, snapshot: tuple) -> None:
+        self.seed, rng_state, block = snapshot
+        self.rng.setstate(rng_state)
+        self._block = list(block)
+
+    def draw_value(self, operation: str) -> int:
+        """Draws a value for a card with a fixed operation"""
+        low, high = self.value_ranges[operation]
+        value = self.rng.randint(low, high)
+        if operation in SIGNED_OPERATIONS:
+            value *= self.rng.choice((-1, 1))
+        return value
+
+    def draw(self) -> tuple:
+        """Returns a random (operation, value)"""
+        if not self._block:
+            self._refill()
+        return self._block.pop()
+
+    def _refill(self) -> None:
+        count = len(OPERATIONS)
+        rand = self.rng.random
+        randint = self.rng.randint
+        probability = self.probability
+        alias = self.alias
+        ranges = self._ranges
+        signed = self._signed
+        block = []
+        for _ in range(self.block_size):
+            # One uniform number picks both the column and the coin flip of the alias table
+            column = rand() * count
+            index = int(column)
+            if column - index >= probability[index]:
+                index = alias[index]
+            low, high = ranges[index]
+            value = randint(low, high)
+            if signed[index]:
+                value = -value if rand() < 0.5 else value
+            block.append((OPERATIONS[index], value))
+        # Drawn with pop() from the end
+        block.reverse()
+        self._block = block
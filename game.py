@@ -1,14 +1,45 @@
-from ast import List
-import ttkbootstrap as tb  # type: ignore
-from ttkbootstrap.constants import DISABLED, ACTIVE, CENTER, NW, NE, N  # type: ignore
-from random import randint, choice
-import math
+import argparse
 import logging
-from logging import debug, info, error
-import threading
-import json
-from typing import Callable
 import os
+import time
+import tkinter as tk
+from collections import deque
+from logging import debug, error, info
+from random import randrange
+from tkinter import ttk
+from typing import Callable
+
+import ttkbootstrap as tb  # type: ignore
+from ttkbootstrap.constants import ACTIVE, CENTER, DISABLED, NE, NW, N  # type: ignore
+from ttkbootstrap.style import Bootstyle  # type: ignore
+
+from card_engine import Card, Game1Engine
+from card_faces import CARD_STYLES, CardFaces, get_card_style
+from card_hint import find_hint
+from card_source import CardSource
+from metrics import METRICS, MetricsServer
+from replay import (
+    GAME1,
+    GAME2,
+    MAX_REPLAYS,
+    ReplayReader,
+    ReplayWriter,
+    prune_replays,
+)
+from savegame import (
+    pack_game1,
+    pack_game2,
+    read_save,
+    restore_game1,
+    restore_game2,
+    unpack_game1,
+    unpack_game2,
+    write_save,
+)
+from scheduler import TickLoop
+from ui_updates import UPDATES
+from worm_autopilot import Autopilot
+from worm_engine import ACTIONS, NO_CELL, WormEngine
 
 
 class App(tb.Window):
@@ -18,6 +49,11 @@ class App(tb.Window):
         size: tuple,
         theme='darkly',
         logging_level=logging.INFO,
+        metrics_port=None,
+        show_overlay=False,
+        spectator_port=None,
+        game_options=None,
+        max_replays=MAX_REPLAYS,
     ) -> None:
         """
         # Main window
@@ -33,6 +69,17 @@ class App(tb.Window):
                   'darkly', 'superhero', 'solar',\n
                   'cyborg', 'vapor', 'simplex', 'cerculean'
         - logging_level: 'DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'
+        - metrics_port: serves a JSON snapshot of METRICS on 127.0.0.1:metrics_port,
+          0 picks a free port. Not served when None
+        - show_overlay: shows the performance overlay at start, F3 toggles it
+        - spectator_port: broadcasts Game 2 ticks to spectators on 127.0.0.1:spectator_port,
+          see spectator.py. Not broadcast when None
+        - game_options: {'window': {keyword arguments}} passed to the games of GAMES,
+          e.g. {'game2': {'board_width': 100, 'renderer': 'viewport'}}
+        - max_replays: replays kept in replays/ per game, the oldest are deleted
+
+        Only the menu is built here, games in GAMES are built when they are opened first time.
+        Start the app with mainloop()
         """
         super().__init__(themename=theme)
         logging.basicConfig(
@@ -43,66 +90,127 @@ class App(tb.Window):
         self.title(title)
         self.geometry(f'{size[0]}x{size[1]}')
         self.minsize(size[0], size[1])
-        self.highscore_path = self.get_highscore_path()
-        self.highscores = self.get_highscores()
+        self.highscore_store = None
+        self.game_options = game_options or {}
+        self.max_replays = max_replays
 
         self.style.configure('TButton', font=('Helvetica', 18))
-        self.main = Main(self)
-        self.game1 = Game1(self)
-        self.game2 = Game2(self)
-        self.mainloop()
+        self.windows: dict = {}
+        self.get_window('main')
+
+        self.overlay = PerformanceOverlay(self, METRICS)
+        self.bind('<F3>', self.overlay.toggle)
+        # Quick save and quick load of the open game
+        self.current_window = 'main'
+        self.bind('<F5>', lambda event: self.save_game())
+        self.bind('<F9>', lambda event: self.load_game())
+        if show_overlay:
+            self.overlay.show()
+        self.metrics_server = None
+        if metrics_port is not None:
+            self.metrics_server = MetricsServer(METRICS, metrics_port)
+            self.metrics_server.start()
+        self.spectator_feed = None
+        if spectator_port is not None:
+            # Imported only when the feed is enabled
+            from spectator import SpectatorFeed
+
+            self.spectator_feed = SpectatorFeed(spectator_port)
+            self.spectator_feed.start()
+        self.protocol('WM_DELETE_WINDOW', self.close)
+
+    def close(self) -> None:
+        """Stops the worker processes and servers of the app, then closes the window"""
+        for window in self.windows.values():
+            if hasattr(window, 'close'):
+                window.close()
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+        if self.spectator_feed is not None:
+            self.spectator_feed.stop()
+        self.destroy()
+
+    def get_window(self, window: str):
+        """Returns the window, builds it from GAMES the first time"""
+        if window not in self.windows:
+            debug(f'Building window: {window}')
+            self.windows[window] = GAMES[window](
+                self, **self.game_options.get(window, {})
+            )
+        return self.windows[window]
 
+    def get_data_path(self, filename: str) -> str:
+        return os.path.join(os.path.dirname(os.path.abspath(__file__)), filename)
+
+    # Highscores were stored here before highscores.db, only read for the migration
     def get_highscore_path(self) -> str:
-        path_arr = os.path.abspath(__file__).split('\\')[:-1]
-        folder_path = '/'.join(path_arr)
-        file_path = folder_path + '/highscores.json'
-        print(file_path)
-        return file_path
-
-    def get_highscores(self) -> dict:
-        print(self.highscore_path)
+        return self.get_data_path('highscores.json')
+
+    def get_replay_path(self, game: str, seed: int) -> str:
+        """Returns the path of a new replay, makes room for it in replays/"""
+        folder_path = self.get_data_path('replays')
+        prune_replays(folder_path, f'{game}-', self.max_replays - 1)
+        timestamp = time.strftime('%Y%m%d-%H%M%S')
+        return os.path.join(folder_path, f'{game}-{timestamp}-{seed}.replay')
+
+    def get_save_path(self, game: str) -> str:
+        return os.path.join(self.get_data_path('saves'), f'{game}.save')
+
+    def save_game(self) -> None:
+        window = self.windows.get(self.current_window)
+        if not hasattr(window, 'save_state'):
+            return
+        path = self.get_save_path(self.current_window)
         try:
-            with open(self.highscore_path, 'r') as f:
-                highscores = json.load(f)
-                print(highscores)
-                return highscores
-        except Exception as e:
+            write_save(path, window.save_state())
+        except OSError as e:
             error(e)
-            return {'game1': 0}
+            return
+        info(f'Saved {path}')
+
+    def load_game(self) -> None:
+        window = self.windows.get(self.current_window)
+        if not hasattr(window, 'restore_state'):
+            return
+        path = self.get_save_path(self.current_window)
+        try:
+            window.restore_state(read_save(path))
+        except (OSError, ValueError) as e:
+            error(e)
+            return
+        info(f'Loaded {path}')
+
+    # sqlite3 is imported when a game asks for highscores first time
+    def get_highscore_store(self):
+        if self.highscore_store is None:
+            from highscore_store import HighscoreStore
+
+            self.highscore_store = HighscoreStore(
+                self.get_data_path('highscores.db'), json_path=self.get_highscore_path()
+            )
+        return self.highscore_store
 
     def get_highscore(self, game: str) -> int:
-        if self.highscores.get(game):
-            return self.highscores[game]
-        else:
-            error(f"Invalid game name; '{game}' while getting highscore")
-            return 0
+        return self.get_highscore_store().get_highscore(game)
 
-    def get_current_highscore(self) -> int:
-        return self.current_highscore
+    def get_leaderboard(self, game: str, count=10) -> list:
+        return self.get_highscore_store().get_top(game, count)
 
-    # Writes to file
-    def set_highscore(self, game: str, value: int) -> None:
+    # Stores a finished run, the highscore is the best stored run
+    def add_run(self, game: str, score: int, duration: float, moves: int) -> None:
         try:
-            self.highscores[game] = value
-            with open(self.highscore_path, 'w') as f:
-                debug(f'Writing to json: {self.highscores}')
-                json.dump(self.highscores, f)
+            self.get_highscore_store().add_run(game, score, duration, moves)
         except Exception as e:
             error(e)
-            pass
 
     def change_window(self, window: str) -> None:
-        self.main.hide()
-        self.game1.hide()
-        self.game2.hide()
-        if window == 'game1':
-            self.game1.show()
-        elif window == 'game2':
-            self.game2.show()
-        elif window == 'main':
-            self.main.show()
-        else:
-            self.main.show()
+        for opened_window in self.windows.values():
+            opened_window.hide()
+        if window not in GAMES:
+            error(f"Invalid window name; '{window}'")
+            window = 'main'
+        self.current_window = window
+        self.get_window(window).show()
 
 
 class Main(tb.Frame):
@@ -151,17 +259,15 @@ class Main(tb.Frame):
     def hide(self) -> None:
         debug('Hide main window')
         self.frame.grid_remove()
-        self.header.grid_remove()
 
     def show(self) -> None:
         debug('Show main window')
         self.frame.grid(column=0, row=0)
-        self.header.grid(column=0, row=0)
 
 
 class Game1(tb.Frame):
     def __init__(
-        self, parent, starting_score=100, target_score=0, max_highscore=100
+        self, parent, starting_score=100, target_score=0, max_highscore=100, seed=None
     ) -> None:
         """
         # Game 1 window
@@ -170,15 +276,19 @@ class Game1(tb.Frame):
         'Goal', 'Current Score' and 'You win' labels are on first row.
         'Try again' button appears when game is over.
         Buttons 1-4 are on second row in a form of a card.
+        Rules are in Game1Engine, this class only updates the widgets.
+        - seed: seed of the CardSource, same seed deals the same cards
         """
         self.parent = parent
 
+        self.card_source = CardSource(seed)
+        self.engine = Game1Engine(
+            starting_score, target_score, max_highscore, source=self.card_source
+        )
         self.target_score = target_score
         self.starting_score = starting_score
-        self.current_score = starting_score
         self.highscore = self.parent.get_highscore('game1')
         self.max_highscore = max_highscore
-        self.current_highscore = self.max_highscore
 
         self.frame_top_left = tb.Frame(self.parent, padding=0, width=0)
         self.frame_top_right = tb.Frame(self.parent, padding=0, width=0)
@@ -189,11 +299,30 @@ class Game1(tb.Frame):
             self.frame_top_left, text='Quit', command=lambda: self.quit_game()
         )
         self.back_button.grid(row=0, column=0)
+        self.hint_button = tb.Button(
+            self.frame_top_left, text='Hint', command=self.show_hint
+        )
+        self.hint_button.grid(row=0, column=2, padx=10)
+        self.hint_time_budget = 0.02
+        self.hint_shown = False
+        self.replay_button = tb.Button(
+            self.frame_top_left, text='Replay', command=self.replay_last
+        )
+        self.replay_button.grid(row=0, column=3)
+        self.recorder = None
+        # Restored sessions are not recorded, their cards don't start from a seed
+        self.recording = True
+        self.last_replay = None
+        self.replay_reader = None
+        self.replay_position = 0
+        self.replay_after_id = None
+        # Milliseconds between the moves of a replay
+        self.replay_interval = 500
 
         self.current_highscore_label = Label(
             self.frame_top_left,
             (0, 1),
-            f'Current score: {self.current_highscore}',
+            f'Current score: {self.engine.current_highscore}',
             {'font': ('Arial', 14)},
         )
         self.highscore_label = Label(
@@ -209,34 +338,38 @@ class Game1(tb.Frame):
             self.frame, text='Play again', command=self.play_again
         )
         self.current_score_label = Label(
-            self.frame, (2, 1), f'Current: {self.current_score}'
+            self.frame, (2, 1), f'Current: {self.engine.current_score}'
         )
-        self.card1 = self.init_card(self.frame_cards, 3, 0, 'addition', 0)
-        self.card2 = self.init_card(self.frame_cards, 3, 1, 'subtraction', 1)
-        self.card3 = self.init_card(self.frame_cards, 3, 2, 'multiplication', 2)
-        self.card4 = self.init_card(self.frame_cards, 3, 3, 'division', 3)
+        self.card_faces = CardFaces(value_ranges=self.card_source.value_ranges)
+        self.card1 = self.init_card(self.frame_cards, 3, 0, 0)
+        self.card2 = self.init_card(self.frame_cards, 3, 1, 1)
+        self.card3 = self.init_card(self.frame_cards, 3, 2, 2)
+        self.card4 = self.init_card(self.frame_cards, 3, 3, 3)
+        # A new CardSource(seed) deals the same cards as new_game(seed),
+        # so the first session can be replayed from self.card_source.seed
+        self.cards = [self.card1, self.card2, self.card3, self.card4]
+        for style in set(CARD_STYLES.values()):
+            get_ttk_style(self.card1.button, style)
+        self.session_started = time.monotonic()
 
     def get_card_style(self, card_type: str) -> str:
-        if card_type == 'multiplication' or card_type == 'division':
-            return 'custom.Success.TButton'
-        elif card_type == 'round_up' or card_type == 'round_down':
-            return 'custom.Info.TButton'
-        else:
-            return 'custom.Primary.TButton'
+        return get_card_style(card_type)
 
-    def init_card(self, frame, row=0, column=0, card_type='addition', card_index=0):
+    def init_card(self, frame, row=0, column=0, card_index=0):
+        card = self.engine.cards[card_index]
         return CardButton(
             frame,
             (row, column),
-            Card(card_type, card_index),
+            card,
             customizations={
                 'on_click': self.on_click_card,
-                'style': self.get_card_style(card_type),
+                'style': self.get_card_style(card.card_type),
+                'faces': self.card_faces,
             },
         )
 
     def game_over(self) -> bool:
-        return self.target_score == self.current_score
+        return self.engine.game_over()
 
     def quit_game(self) -> None:
         self.reset_game()
@@ -244,18 +377,15 @@ class Game1(tb.Frame):
 
     def reset_game(self) -> None:
         info('Reset game')
-        self.current_highscore = self.max_highscore
-        self.current_score = self.starting_score
-        self.reinit_card(self.card1, 'addition')
-        self.reinit_card(self.card2, 'subtraction')
-        self.reinit_card(self.card3, 'multiplication')
-        self.reinit_card(self.card4, 'division')
+        self.stop_replay()
+        self.new_session()
+        self.update_cards()
 
         self.try_again_button.grid_remove()
         self.win_label.change_label('')
         self.enable_cards()
-        self.current_highscore_label.change_label(self.current_highscore)
-        self.current_score_label.change_label(self.current_score)
+        self.current_highscore_label.change_label(self.engine.current_highscore)
+        self.current_score_label.change_label(self.engine.current_score)
 
     def hide(self) -> None:
         self.frame.grid_remove()
@@ -273,152 +403,227 @@ class Game1(tb.Frame):
         info('Play again button pressed')
         self.try_again_button.grid_remove()
         self.win_label.change_label('')
-        self.set_current_score(self.starting_score)
-        self.reset_current_highscore()
-        self.current_highscore_label.change_label(self.current_highscore)
-        self.current_score_label.change_label(self.current_score)
-        self.reinit_card(self.card1, 'addition')
-        self.reinit_card(self.card2, 'subtraction')
-        self.reinit_card(self.card3, 'multiplication')
-        self.reinit_card(self.card4, 'division')
+        self.new_session()
+        self.current_highscore_label.change_label(self.engine.current_highscore)
+        self.current_score_label.change_label(self.engine.current_score)
+        self.update_cards()
         self.enable_cards()
 
     def set_current_highscore(self) -> None:
-        if self.current_highscore > self.highscore:
-            self.highscore = self.current_highscore
-            self.parent.set_highscore('game1', self.highscore)
-
-    def reset_current_highscore(self) -> None:
-        self.current_highscore = self.max_highscore
+        self.highscore = max(self.highscore, self.engine.current_highscore)
+
+    # Every session is dealt from its own seed, so it can be replayed
+    def new_session(self, seed=None) -> None:
+        self.stop_recording()
+        if seed is None:
+            seed = randrange(2**32)
+        self.engine.new_game(seed)
+        self.recording = True
+        self.session_started = time.monotonic()
+
+    def save_state(self) -> bytes:
+        return pack_game1(self.engine, randrange(2**32))
+
+    # Only the engine and the texts of the existing widgets change
+    def restore_state(self, data: bytes) -> None:
+        state = unpack_game1(data)
+        self.stop_replay()
+        self.stop_recording()
+        restore_game1(self.engine, state)
+        self.recording = False
+        self.session_started = time.monotonic()
+        self.update_cards()
+        self.win_label.change_label('')
+        self.hint_shown = False
+        self.current_highscore_label.change_label(
+            f'Score: {self.engine.current_highscore}'
+        )
+        self.current_score_label.change_label(self.engine.current_score)
+        if self.engine.game_over():
+            self.disable_cards()
+            self.try_again_button.grid(row=0, column=4)
+        else:
+            self.enable_cards()
+            self.try_again_button.grid_remove()
+
+    def stop_recording(self) -> None:
+        if self.recorder is not None:
+            self.recorder.close()
+            self.last_replay = self.recorder.path
+            self.recorder = None
+
+    def replay_last(self) -> None:
+        self.stop_recording()
+        if self.last_replay is None:
+            info('Nothing to replay')
+            return
+        self.start_replay(self.last_replay)
+
+    def start_replay(self, path: str) -> None:
+        self.stop_replay()
+        self.stop_recording()
+        reader = ReplayReader(path)
+        if reader.game != GAME1:
+            error(f"Not a Game 1 replay: '{path}'")
+            reader.close()
+            return
+        info(f'Replaying {path}')
+        self.replay_reader = reader
+        self.replay_position = 0
+        self.engine.new_game(reader.seed)
+        self.update_cards()
+        self.disable_cards()
+        self.try_again_button.grid_remove()
+        self.win_label.change_label('Replay')
+        self.current_highscore_label.change_label(self.engine.current_highscore)
+        self.current_score_label.change_label(self.engine.current_score)
+        self.replay_after_id = self.parent.after(self.replay_interval, self.replay_step)
+
+    def replay_step(self) -> None:
+        reader = self.replay_reader
+        if self.replay_position >= len(reader):
+            self.stop_replay()
+            if not self.engine.game_over():
+                self.win_label.change_label('Replay ended')
+            self.try_again_button.grid(row=0, column=4)
+            return
+        _, _, card_index = reader[self.replay_position]
+        self.replay_position += 1
+        self.play_card(card_index)
+        self.replay_after_id = self.parent.after(self.replay_interval, self.replay_step)
+
+    def stop_replay(self) -> None:
+        if self.replay_after_id is not None:
+            self.parent.after_cancel(self.replay_after_id)
+            self.replay_after_id = None
+        if self.replay_reader is not None:
+            self.replay_reader.close()
+            self.replay_reader = None
 
     def disable_cards(self) -> None:
         info('All cards disabled')
-        self.card1.disable()
-        self.card2.disable()
-        self.card3.disable()
-        self.card4.disable()
+        for card in self.cards:
+            card.disable()
 
     def enable_cards(self) -> None:
         info('All cards enabled')
-        self.card1.enable()
-        self.card2.enable()
-        self.card3.enable()
-        self.card4.enable()
-
-    def set_current_score(self, value: int) -> None:
-        starting_score = self.starting_score
-        if value > starting_score:
-            self.current_score = starting_score
-        elif value < starting_score * -1:
-            self.current_score = starting_score * -1
-        else:
-            self.current_score = value
+        for card in self.cards:
+            card.enable()
+
+    def update_cards(self) -> None:
+        for card in self.cards:
+            self.update_card(card)
 
-    def reinit_card(self, card, operation=None) -> None:
-        info('Reiniting card')
+    def update_card(self, card) -> None:
         card_class = card.get_card()
-        debug(f'Reiniting card: {card_class}')
-        card_class.reinit_card(operation)
+        debug(f'Updating card: {card_class.get_card()}')
         card.update_text(self.get_card_style(card_class.card_type))
 
-    def update_current_highscore(self) -> None:
-        if self.current_highscore > 0:
-            self.current_highscore -= 1
+    def show_hint(self) -> None:
+        if self.engine.game_over():
+            return
+        moves = find_hint(self.engine, self.hint_time_budget)
+        debug(f'Hint: {moves}')
+        if moves is None:
+            self.win_label.change_label('No hint found')
+        else:
+            cards = ' -> '.join(f'card {index + 1}' for index in moves)
+            self.win_label.change_label(f'Hint: {cards}')
+        self.hint_shown = True
 
     def on_click_card(self, card) -> None:
         info('Clicked card')
         debug(f'Clicked: {card.get_card_text()}')
-        current_score = self.current_score
-        card_obj = card.get_card()
-        card_value = card_obj['value']
-        card_index = card_obj['index']
-        if card.operator == '+':
-            debug(
-                f'Addition -> round(current_score+card_value, 1) = {
-                    round(current_score+card_value, 1)}'
-            )
-            self.set_current_score(round(current_score + card_value, 1))
-        elif card.operator == '-':
-            debug(
-                f'Subtraction -> round(current_score+card_value, 1) = {
-                    round(current_score-card_value, 1)}'
-            )
-            self.set_current_score(round(current_score - card_value, 1))
-        elif card.operator == '*':
-            debug(
-                f'Multiplication -> round(current_score*card_value, 1) = {
-                    round(current_score*card_value, 1)}'
-            )
-            self.set_current_score(round(current_score * card_value, 1))
-        elif card.operator == '/':
-            debug(
-                f'Division -> round(current_score/card_value, 1) = {
-                    round(current_score/card_value, 1)}'
-            )
-            self.set_current_score(round(current_score / card_value, 1))
-        elif card.operator == 'round_up':
-            debug(f'Round up -> math.ceil(current_score) = {math.ceil(current_score)}')
-            self.set_current_score(math.ceil(current_score))
-        elif card.operator == 'round_down':
-            debug(
-                f'Round down -> math.floor(current_score) = {
-                    math.floor(current_score)}'
+        if self.replay_reader is not None:
+            return
+        with METRICS.timer('game1.on_click_card'):
+            requests = METRICS.get_counter('ui.requests')
+            if self.recorder is None and self.recording:
+                seed = self.engine.source.seed
+                self.recorder = ReplayWriter(
+                    self.parent.get_replay_path('game1', seed),
+                    GAME1,
+                    seed,
+                    (self.starting_score, self.target_score, self.max_highscore),
+                )
+            if self.recorder is not None:
+                self.recorder.record_card(self.engine.moves, card.index)
+            self.play_card(card.index)
+            # Applied on the next idle callback, see ui.tk_calls_per_flush
+            METRICS.observe(
+                'game1.ui_requests_per_move',
+                METRICS.get_counter('ui.requests') - requests,
             )
-            self.set_current_score(math.floor(current_score))
-
-        if card_index == 0:
-            self.reinit_card(self.card1)
-            debug(f'Card 1 is now: {self.card1.get_card().get_card_text()}')
-        elif card_index == 1:
-            self.reinit_card(self.card2)
-            debug(f'Card 2 is now: {self.card2.get_card().get_card_text()}')
-        elif card_index == 2:
-            self.reinit_card(self.card3)
-            debug(f'Card 3 is now: {self.card3.get_card().get_card_text()}')
-        elif card_index == 3:
-            self.reinit_card(self.card4)
-            debug(f'Card 4 is now: {self.card4.get_card().get_card_text()}')
 
-        self.update_current_highscore()
-        self.current_score_label.change_label(text=self.current_score)
+    def play_card(self, card_index: int) -> None:
+        game_over = self.engine.play(card_index)
+
+        self.update_card(self.cards[card_index])
+        self.current_score_label.change_label(text=self.engine.current_score)
         self.current_highscore_label.change_label(
-            text=f'Score: {self.current_highscore}'
+            text=f'Score: {self.engine.current_highscore}'
         )
-        debug(f'Current score is now: {self.current_score}')
+        debug(f'Current score is now: {self.engine.current_score}')
+        if self.hint_shown:
+            self.win_label.change_label('')
+            self.hint_shown = False
 
-        if self.game_over():
+        if game_over:
             info('Game ended')
             self.win_label.change_label('You win!')
             self.disable_cards()
+            if self.replay_reader is not None:
+                return
+            self.stop_recording()
+            self.parent.add_run(
+                'game1',
+                self.engine.current_highscore,
+                time.monotonic() - self.session_started,
+                self.engine.moves,
+            )
             self.try_again_button.grid(row=0, column=4)
-            if self.current_highscore > self.highscore:
-                self.parent.set_highscore('game1', self.current_highscore)
-                self.highscore_label.change_label(
-                    f'Highscore: {self.current_highscore}'
-                )
+            if self.engine.current_highscore > self.highscore:
+                self.set_current_highscore()
+                self.highscore_label.change_label(f'Highscore: {self.highscore}')
 
 
 class Game2(tb.Frame):
-    def __init__(self, parent) -> None:
+    def __init__(
+        self,
+        parent,
+        board_width=10,
+        board_height=10,
+        renderer='labels',
+        viewport=(31, 31),
+        autopilot='astar',
+    ) -> None:
         """
         # Game 2 window
         Window is hidden by default. Can be initialized by using show() and hidden by using hide()
         ## Description
         Simple worm game where the player moves using buttons or 'WASD' eating the * and growing size.
         Game ends when player collides with itself
+        ### Parameters:
+        - board_width, board_height: size of the board in cells
+        - renderer: 'labels' draws every cell as a Label, 'canvas' draws the board
+          on one Canvas and is meant for big boards and fast game speeds,
+          'viewport' shows only viewport cells around the head for very large boards
+        - viewport: (columns, rows) of visible cells when renderer is 'viewport'
+        - autopilot: 'astar' steers with the A* Autopilot, 'mcts' plans with Monte Carlo
+          tree search on all cores within the tick interval (MCTSPlanner)
         """
         self.parent = parent
         self.highscore = self.parent.get_highscore('game2')
-        self.starting_game_speed = 0.7 # Update rate - Lower is faster
-        self.game_speed = self.starting_game_speed 
+        self.starting_game_speed = 0.7  # Update rate - Lower is faster
+        self.game_speed = self.starting_game_speed
         # How fast game speeds up over time - Lower is faster
         self.game_speed_multiplier = 0.99
         self.max_game_speed = 0.05
 
         self.current_highscore = 0
 
-        self.board_height = 10
-        self.board_width = 10
+        self.board_height = board_height
+        self.board_width = board_width
 
         self.keyinputs = KeyInputs(self.parent, self.on_wasd, wasd=True)
 
@@ -432,8 +637,22 @@ class Game2(tb.Frame):
         self.back_button.grid(row=0, column=0)
 
         self.play_again_button = tb.Button(
-        self.frame_top_left, text='Play again', command=self.play_again
+            self.frame_top_left, text='Play again', command=self.play_again
         )
+        self.replay_button = tb.Button(
+            self.frame_top_left, text='Replay', command=self.replay_last
+        )
+        self.autopilot_button = tb.Button(
+            self.frame_top_left,
+            text='Autopilot',
+            bootstyle='outline',
+            command=self.toggle_autopilot,
+        )
+        self.autopilot_button.grid(row=0, column=1, padx=10)
+        # Autopilot of the engine, built when it is turned on first time
+        self.autopilot_type = autopilot
+        self.autopilot = None
+        self.autopilot_enabled = False
 
         self.instructions_label = Label(
             self.frame_top_left,
@@ -495,30 +714,36 @@ class Game2(tb.Frame):
         self.current_movement_dir = 'RIGHT'
         self.previous_movement_dir = 'RIGHT'
         self.passed_time = 0.0
-        self.t = None  # type: ignore
+        self.loop = TickLoop(
+            self.parent,
+            self.update_frame,
+            lambda: self.game_speed,
+            lateness=METRICS.histogram('game2.tick_lateness'),
+        )
         self.food_position = (0, 8)
-        self.worm_moved_since_previous_update = False
-
-        self.board = self.init_board()
-
-        self.worm = self.Worm(self, self.frame)
+        # (direction, time pressed) of turns waiting for a tick, one is applied per tick
+        self.input_queue: deque = deque()
+        self.max_queued_inputs = 3
+        self.tick = 0
+        self.session_started = time.monotonic()
+        self.recorder = None
+        self.last_replay = None
+        self.replay_reader = None
+
+        self.engine = WormEngine(self.board_width, self.board_height)
+        if renderer == 'canvas':
+            self.board = CanvasBoard(self.frame, self.engine, self.parent.style.colors)
+        elif renderer == 'viewport':
+            self.board = ViewportBoard(
+                self.frame, self.engine, self.parent.style.colors, viewport
+            )
+        else:
+            self.board = LabelBoard(self.frame, self.engine)
 
-    def init_board(self) -> List:
-        board = []
-        for row in range(self.board_width):
-            for column in range(self.board_height):
-                column_label = Label(
-                    self.frame,
-                    row_and_column=(row, column),
-                    text='_',
-                    customizations={'padding': '1 -4'},
-                )
-                board.append(column_label)
-        return board
+        self.worm = self.Worm(self, self.board)
 
     def reset_board(self) -> None:
-        for label in self.board:
-            label.change_label('_')
+        self.board.reset()
 
     def on_wasd(self, key):
         debug(f"Pressed key: '{key}'")
@@ -535,84 +760,159 @@ class Game2(tb.Frame):
     def spawn_food(self, test=False) -> None:
         if test:
             debug('Test spawn enabled, spawning to 5,0')
-            for child in self.board:
-                row, col = child.get_row_and_column()
-
-                if row == 5 and col == 0:
-                    child.change_label('*')
-                    self.food_position = [5, 0]
-                    break
+            self.place_food(self.engine.cell(5, 0))
             return
-        free_spots = []
-
-        occupied_spots = []
-        for worm in self.worm.get_worm():
-            occupied_spots.append(worm.get_position())
-
-        for child in self.board:
-            row, col = child.get_row_and_column()
-            if [row, col] not in occupied_spots:
-                free_spots.append((row, col))
-
-        choose_spot = choice(free_spots)
-
-        for child in self.board:
-            row, col = child.get_row_and_column()
-
-            if row == choose_spot[0] and col == choose_spot[1]:
-                debug(
-                    'Spawning food: ',
-                )
-                child.change_label('*')
-                self.food_position = [choose_spot[0], choose_spot[1]]
-                break
 
+        cell = self.engine.spawn_food()
+        if cell == NO_CELL:
+            info('No free cells left for food')
+            return
+        self.place_food(cell)
         debug(f'FOOD POS:{self.food_position}')
 
+    def place_food(self, cell: int) -> None:
+        self.board.set_food(cell)
+        self.engine.food = cell
+        self.food_position = self.engine.position(cell)
+
+    # Turns are validated against the last queued turn, so quick turns
+    # pressed within one tick (e.g. up then left) are applied on the next ticks
     def set_movement_direction(self, direction: str) -> None:
-        is_valid_movement = self.check_valid_movement(direction)
-        if not is_valid_movement or not self.worm_moved_since_previous_update:
-            debug(f'Invalid movement:{
-                  self.current_movement_dir} -> {direction}')
-        if (
-            self.current_movement_dir != direction
-            and is_valid_movement
-            and self.worm_moved_since_previous_update
-        ):
-            debug('MOVEMENT REGISTERED')
-            self.previous_movement_dir = self.current_movement_dir
-            self.current_movement_dir = direction
-            self.worm_moved_since_previous_update = False
+        if self.input_queue:
+            last_direction = self.input_queue[-1][0]
+        else:
+            last_direction = self.current_movement_dir
+        if direction == last_direction:
+            return
+        if not self.check_valid_movement(direction, last_direction):
+            debug(f'Invalid movement:{last_direction} -> {direction}')
+            return
+        if len(self.input_queue) >= self.max_queued_inputs:
+            debug(f'Input queue full, dropped: {direction}')
+            METRICS.increment('game2.dropped_inputs')
+            return
+        debug('MOVEMENT REGISTERED')
+        self.input_queue.append((direction, time.monotonic()))
 
-    def check_valid_movement(self, direction: str) -> bool:
-        if direction == 'LEFT' and self.current_movement_dir == 'RIGHT':
+    def apply_queued_input(self) -> None:
+        if not self.input_queue:
+            return
+        direction, pressed = self.input_queue.popleft()
+        self.previous_movement_dir = self.current_movement_dir
+        self.current_movement_dir = direction
+        # The worm moves to the new direction on this tick. Latency in ticks
+        # shows if turns keep up as game_speed gets close to max_game_speed
+        latency = time.monotonic() - pressed
+        METRICS.observe('game2.input_latency', latency)
+        METRICS.observe('game2.input_latency_ticks', latency / self.game_speed)
+
+    def toggle_autopilot(self) -> None:
+        self.set_autopilot(not self.autopilot_enabled)
+
+    def set_autopilot(self, enabled: bool) -> None:
+        if enabled == self.autopilot_enabled:
+            return
+        self.autopilot_enabled = enabled
+        if enabled:
+            if self.autopilot_type == 'mcts':
+                # Imported only when used, the worker processes start with the first search
+                from worm_mcts import MCTSPlanner
+
+                self.autopilot = MCTSPlanner(self.engine)
+            else:
+                self.autopilot = Autopilot(self.engine)
+            # The first move is searched ahead too, see update_frame()
+            if self.loop.running and self.engine.alive and self.replay_reader is None:
+                self.autopilot.prepare(self.current_movement_dir, self.game_speed)
+        else:
+            self.close_autopilot()
+        self.input_queue.clear()
+        self.autopilot_button.configure(
+            bootstyle='success' if self.autopilot_enabled else 'outline'
+        )
+        info(f'Autopilot {"on" if self.autopilot_enabled else "off"}')
+
+    # Stops the worker processes of MCTSPlanner, a new autopilot is built when turned on
+    def close_autopilot(self) -> None:
+        if self.autopilot is not None:
+            self.autopilot.close()
+            self.autopilot = None
+
+    def steer_autopilot(self) -> None:
+        direction = self.autopilot.decide(self.current_movement_dir)
+        METRICS.observe('game2.autopilot_decision', self.autopilot.last_decision_time)
+        self.input_queue.clear()
+        self.previous_movement_dir = self.current_movement_dir
+        self.current_movement_dir = direction
+
+    def check_valid_movement(self, direction: str, current_direction=None) -> bool:
+        if current_direction is None:
+            current_direction = self.current_movement_dir
+        if direction == 'LEFT' and current_direction == 'RIGHT':
             return False
-        elif direction == 'RIGHT' and self.current_movement_dir == 'LEFT':
+        elif direction == 'RIGHT' and current_direction == 'LEFT':
             return False
-        elif direction == 'UP' and self.current_movement_dir == 'DOWN':
+        elif direction == 'UP' and current_direction == 'DOWN':
             return False
-        elif direction == 'DOWN' and self.current_movement_dir == 'UP':
+        elif direction == 'DOWN' and current_direction == 'UP':
             return False
         else:
             return True
-    
+
     # Exponential since update_frame also increases
     # Need to have another timer for linear increase or math out from current game_speed
     def increase_game_speed(self) -> None:
         if self.game_speed > self.max_game_speed:
             self.game_speed *= self.game_speed_multiplier
 
+    # Called by self.loop once per tick on the mainloop
     def update_frame(self) -> None:
-        self.t = threading.Timer(self.game_speed, self.update_frame)  # type: ignore
-        self.t.start()  # type: ignore
-        self.passed_time += self.game_speed
-        info(f'Frame updated, passed time: {self.passed_time}s')
-        self.worm.update_position(self.current_movement_dir, self.previous_movement_dir)
-        self.game_over()
-        self.increase_game_speed()
+        if self.replay_reader is not None:
+            if self.tick >= len(self.replay_reader):
+                self.stop_replay()
+                return
+            self.current_movement_dir = ACTIONS[self.replay_reader[self.tick][2]]
+        else:
+            if self.autopilot_enabled:
+                self.steer_autopilot()
+            else:
+                self.apply_queued_input()
+            if self.recorder is not None:
+                self.recorder.record_direction(self.tick, self.current_movement_dir)
+        with METRICS.timer('game2.update_frame'):
+            updates = METRICS.get_counter('tk.widget_updates')
+            self.tick += 1
+            self.passed_time += self.game_speed
+            debug(f'Frame updated, passed time: {self.passed_time}s')
+            head, tail, ate = self.worm.update_position(
+                self.current_movement_dir, self.previous_movement_dir
+            )
+            if self.parent.spectator_feed is not None:
+                self.parent.spectator_feed.publish_tick(
+                    self.tick, self.engine, head, tail, self.current_highscore, int(ate)
+                )
+            self.game_over()
+            self.increase_game_speed()
+            METRICS.increment('game2.ticks')
+            METRICS.observe(
+                'game2.widget_updates_per_frame',
+                METRICS.get_counter('tk.widget_updates') - updates,
+            )
+        if self.autopilot_enabled and self.engine.alive and self.replay_reader is None:
+            # Planning of the next move runs while the loop waits for the next tick
+            self.autopilot.prepare(self.current_movement_dir, self.game_speed)
+
+    # Called by App.close() when the app is closed
+    def close(self) -> None:
+        self.loop.stop()
+        self.close_autopilot()
+        self.stop_recording()
 
     def quit_game(self) -> None:
-        self.t.cancel()  # type: ignore
+        self.loop.stop()
+        self.set_autopilot(False)
+        self.stop_recording()
+        self.stop_replay()
         self.reset_board()
         self.worm.reset_worm()
         self.current_highscore_score = 0
@@ -624,6 +924,7 @@ class Game2(tb.Frame):
         self.frame_top_right.grid_remove()
         self.instructions_label.hidden()
         self.play_again_button.grid_remove()
+        self.replay_button.grid_remove()
         self.current_score_header_label.hidden()
         self.reset_current_highscore()
         self.current_score_label.hidden()
@@ -639,23 +940,140 @@ class Game2(tb.Frame):
         self.current_score_label.visible()
         self.highscore_header_label.visible()
         self.highscore_label.visible()
-        self.update_frame()
+        self.start_session()
+        self.loop.start()
         self.spawn_food(test=False)
 
     def play_again(self) -> None:
+        self.stop_replay()
         self.play_again_button.grid_remove()
+        self.replay_button.grid_remove()
         self.reset_board()
         self.worm.reset_worm()
         self.reset_current_highscore()
         self.game_speed = self.starting_game_speed
-        self.update_frame()
+        self.start_session()
+        self.loop.start()
         self.spawn_food(test=False)
         info('Play again button pressed')
 
+    # Every session places the food from its own seed, so it can be replayed
+    def start_session(self) -> None:
+        self.stop_recording()
+        self.tick = 0
+        self.input_queue.clear()
+        if self.autopilot is not None:
+            self.autopilot.reset()
+        self.session_started = time.monotonic()
+        seed = randrange(2**32)
+        self.engine.rng.seed(seed)
+        self.recorder = ReplayWriter(
+            self.parent.get_replay_path('game2', seed),
+            GAME2,
+            seed,
+            (self.board_width, self.board_height, *self.engine.start),
+        )
+
+    def stop_recording(self) -> None:
+        if self.recorder is not None:
+            self.recorder.close()
+            self.last_replay = self.recorder.path
+            self.recorder = None
+
+    def save_state(self) -> bytes:
+        return pack_game2(
+            self.engine,
+            self.current_movement_dir,
+            self.game_speed,
+            self.passed_time,
+            self.current_highscore,
+            self.tick,
+            randrange(2**32),
+        )
+
+    # The worm widgets of the board are moved to the restored cells, not built again.
+    # Restored sessions are not recorded, their food doesn't start from a seed
+    def restore_state(self, data: bytes) -> None:
+        state = unpack_game2(data)
+        old_body = tuple(self.engine.body)
+        # Raises before anything changes when the save is for another board size
+        restore_game2(self.engine, state)
+        self.loop.stop()
+        self.stop_replay()
+        self.stop_recording()
+        self.board.reset()
+        self.board.worm_restored(old_body)
+        if self.engine.food != NO_CELL:
+            self.place_food(self.engine.food)
+        direction, _, _, self.game_speed, self.passed_time, score, self.tick = state[
+            2:9
+        ]
+        self.current_movement_dir = direction
+        self.previous_movement_dir = direction
+        self.input_queue.clear()
+        if self.autopilot is not None:
+            self.autopilot.reset()
+        self.current_highscore = score
+        self.current_score_label.change_label(self.current_highscore)
+        self.play_again_button.grid_remove()
+        self.replay_button.grid_remove()
+        self.session_started = time.monotonic()
+        # Spectators would apply the next deltas to the worm from before the restore
+        if self.parent.spectator_feed is not None:
+            self.parent.spectator_feed.publish_keyframe(
+                self.tick, self.engine, self.current_highscore
+            )
+        if self.engine.alive:
+            self.loop.start()
+        else:
+            self.play_again_button.grid(row=1, column=0, pady=5)
+
+    def replay_last(self) -> None:
+        self.stop_recording()
+        if self.last_replay is None:
+            info('Nothing to replay')
+            return
+        self.start_replay(self.last_replay)
+
+    def start_replay(self, path: str) -> None:
+        self.stop_replay()
+        self.stop_recording()
+        reader = ReplayReader(path)
+        if reader.game != GAME2 or reader.params[:2] != (
+            self.board_width,
+            self.board_height,
+        ):
+            error(f"Not a Game 2 replay of this board size: '{path}'")
+            reader.close()
+            return
+        info(f'Replaying {path}')
+        self.loop.stop()
+        self.play_again_button.grid_remove()
+        self.replay_button.grid_remove()
+        self.reset_board()
+        self.worm.reset_worm()
+        self.reset_current_highscore()
+        self.game_speed = self.starting_game_speed
+        self.tick = 0
+        self.input_queue.clear()
+        if self.autopilot is not None:
+            self.autopilot.reset()
+        self.engine.rng.seed(reader.seed)
+        self.replay_reader = reader
+        self.loop.start()
+        self.spawn_food(test=False)
+
+    def stop_replay(self) -> None:
+        if self.replay_reader is None:
+            return
+        self.replay_reader.close()
+        self.replay_reader = None
+        self.loop.stop()
+        self.play_again_button.grid(row=1, column=0, pady=5)
+        self.replay_button.grid(row=1, column=1, pady=5)
+
     def set_current_highscore(self) -> None:
-        if self.current_highscore > self.highscore:
-            self.highscore = self.current_highscore
-            self.parent.set_highscore('game2', self.highscore)
+        self.highscore = max(self.highscore, self.current_highscore)
 
     def reset_current_highscore(self) -> None:
         self.current_highscore = 0
@@ -666,249 +1084,439 @@ class Game2(tb.Frame):
         self.current_score_label.change_label(self.current_highscore)
 
     def game_over(self) -> None:
-        worms = self.worm.get_worm()
-        first_worm = worms[0]
-        first_worm_pos = first_worm.get_position()
-        for worm in worms[1:]:
-            if worm.get_position() == first_worm_pos:
-                if self.current_highscore > self.highscore:
-                    self.set_current_highscore()
-                    self.highscore = self.current_highscore
-                    self.highscore_label.change_label(self.highscore)
-                self.play_again_button.grid(row=1, column=0, pady=5)
-                info('Game Over')
-                self.t.cancel()
+        if not self.engine.alive:
+            if self.replay_reader is not None:
+                self.stop_replay()
+                return
+            self.stop_recording()
+            self.parent.add_run(
+                'game2',
+                self.current_highscore,
+                time.monotonic() - self.session_started,
+                self.tick,
+            )
+            if self.current_highscore > self.highscore:
+                self.set_current_highscore()
+                self.highscore = self.current_highscore
+                self.highscore_label.change_label(self.highscore)
+            self.play_again_button.grid(row=1, column=0, pady=5)
+            self.replay_button.grid(row=1, column=1, pady=5)
+            info('Game Over')
+            self.loop.stop()
 
     def food_eaten(self) -> None:
         self.update_current_highscore()
-        for child in self.board:
-            if child.get_text() == '*':
-                debug('removing food ')
-                child.change_label('_')
-                break
+        debug('removing food ')
+        self.board.clear_food(self.engine.head())
         self.spawn_food()
 
     class Worm(tb.Frame):
-        def __init__(self, root, parent, char='O') -> None:
+        def __init__(self, root, board) -> None:
+            """
+            Positions and rules of the worm are in root.engine (WormEngine),
+            board is only told which cell the head entered and which cell the tail left
+            """
             self.root = root
-            self.char = char
-            self.position = [0, 1]
-            self.parent = parent
-            self.worm = []
-            self.init_worm()
+            self.engine = root.engine
+            self.board = board
+            self.board.draw_worm()
 
-        def get_worm(self) -> list:
-            return self.worm
+        def get_worm(self) -> deque:
+            return self.engine.body
 
         def reset_worm(self) -> None:
-            for worm in self.worm:
-                worm.remove()
-                del worm
-            self.init_worm()
-
-        def init_worm(self) -> None:
-            self.worm.clear()
-            self.position = [0, 1]
-            self.worm.append(
-                self.WormChild(
-                    self.parent,
-                    [0, 1],
-                    char=self.char,
-                    current_movement_dir=self.root.current_movement_dir,
-                )
-            )
+            self.board.clear_worm()
+            self.engine.reset()
+            self.board.draw_worm()
+
+        def update_position(self, direction: str, previous_direction: str) -> tuple:
+            """Moves the worm, returns (head, tail, ate) of WormEngine.move()"""
+            debug(f'Moved: {direction}, prev: {previous_direction}')
+            head, tail, ate = self.engine.move(direction)
+            if head == NO_CELL:
+                return head, tail, ate
 
-        def eat_food(self) -> None:
-            food_pos = self.root.food_position
-            first_worm = self.worm[0]
-            first_worm_pos = first_worm.get_position()
-            if food_pos == first_worm_pos:
+            self.board.worm_moved(head, tail)
+            debug(f'Head: {self.engine.position(head)}')
+
+            if ate:
                 debug('EAT FOOD')
-                self.grow_worm()
                 self.root.food_eaten()
+            return head, tail, ate
 
-        def grow_worm(self) -> None:
-            last_worm = self.worm[-1]
-            current_dir = last_worm.get_movement_direction()
-
-            row_diff = 0
-            col_diff = 0
-            if current_dir == 'RIGHT':
-                col_diff -= 1
-            elif current_dir == 'LEFT':
-                col_diff += 1
-            elif current_dir == 'UP':
-                row_diff += 1
-            elif current_dir == 'DOWN':
-                row_diff -= 1
-
-            last_worm_pos = last_worm.get_position()
-            row = row_diff + last_worm_pos[0]
-            col = col_diff + last_worm_pos[1]
-            new_worm = self.WormChild(self.parent, [row, col], 'O', current_dir)
-            self.worm.append(new_worm)
-
-        def update_position(self, direction: str, previous_direction: str) -> None:
-            debug(f'Moved: {direction}, prev: {previous_direction}')
 
-            first_worm = True
-            prev_pos = [0, 1]
-            for worm in self.worm:
-                curr_pos = worm.get_position().copy()
-                debug(f'CURR_POS: {curr_pos}')
-
-                if first_worm:
-                    prev_pos = worm.get_position()
-                    if direction == 'LEFT':
-                        if curr_pos[1] > 0:
-                            curr_pos[1] -= 1
-                        else:
-                            curr_pos[1] = self.root.board_width - 1
-                    if direction == 'RIGHT':
-                        if curr_pos[1] < self.root.board_width - 1:
-                            curr_pos[1] += 1
-                        else:
-                            curr_pos[1] = 0
-                    if direction == 'UP':
-                        if curr_pos[0] > 0:
-                            curr_pos[0] -= 1
-                        else:
-                            curr_pos[0] = self.root.board_height - 1
-                    if direction == 'DOWN':
-                        if curr_pos[0] < self.root.board_height - 1:
-                            curr_pos[0] += 1
-                        else:
-                            curr_pos[0] = 0
-                else:
-                    curr_pos = prev_pos
-                    prev_pos = worm.get_position()
-
-                worm.change_position(curr_pos)
-                self.root.worm_moved_since_previous_update = True
-
-                first_worm = False
-
-                debug(f'Pos {worm}: {curr_pos}')
-
-            self.eat_food()
-
-        class WormChild:
-            def __init__(
-                self,
-                parent,
-                position: list,
-                char: str,
-                current_movement_dir: str,
-            ) -> None:
-                self.char = char
-                self.position = position
-                self.parent = parent
-                self.worm_label = tb.Label(self.parent, text=self.char)
-                self.worm_label.grid(row=position[0], column=position[1])
-                self.movement_direction = current_movement_dir
-
-            def remove(self):
-                self.worm_label.grid_remove()
-
-            def change_position(self, position: list) -> None:
-                self.set_movement_direction(position)
-                self.position = position
-                self.worm_label.grid_configure(row=position[0], column=position[1])
-
-            def get_position(self) -> list:
-                return self.position
-
-            def get_movement_direction(self) -> str:
-                return self.movement_direction
-
-            def set_movement_direction(self, position: list) -> None:
-                print('Positions: ', position, self.position)
-                if position[0] != self.position[0]:
-                    if (position[0] - self.position[0]) > 0:
-                        self.movement_direction = 'DOWN'
-                    else:
-                        self.movement_direction = 'UP'
-                else:
-                    if (position[1] - self.position[1]) > 0:
-                        self.movement_direction = 'RIGHT'
-                    else:
-                        self.movement_direction = 'LEFT'
-
-                print('UPDATED WORM DIRECTION: ', self.movement_direction)
-
-
-class Card:
-    def __init__(self, card_type: str, index: int, min_value=1, max_value=50):
+class LabelBoard:
+    def __init__(self, parent, engine, char='O') -> None:
         """
-        # Card
-        Has stored operation type, value and index. Used in CardButton
-        ### Parameters:
-        - card_type: 'addition', 'subtraction', 'multiplication', 'division', 'round_up', 'round_down'
-        - index: Required identifier for updating this card, has to be number 0-3
-        - min_value: minimum value that this card's value can get, default=1
-        - max_value: maximum value that this card's value can get, default=50
+        # Label board
+        Worm game board where every cell is a Label and every worm segment is a WormChild.
+        Cells are in the same order as the cells of the engine (WormEngine).
+        Segments that are not shown are kept in a pool and shown again when the worm
+        grows, so a session builds only as many segment labels as its longest worm
         """
-        self.card_type = card_type
-        if self.card_type == 'multiplication' or self.card_type == 'division':
-            self.value = randint(min_value, max_value // 2)
-        else:
-            self.value = randint(min_value, max_value)
-        self.index = index
-        self.operator = None
-        self.min_value = min_value
-        self.max_value = max_value
-
-        self.init_value_and_operator()
-
-    def get_card_text(self):
-        if len(self.operator) > 1:
-            return self.value
-        return f'{self.operator}{self.value}'
-
-    def init_value_and_operator(self):
-        if self.card_type == 'addition':
-            self.operator = '+'
-        elif self.card_type == 'subtraction':
-            self.operator = '-'
-        elif self.card_type == 'multiplication':
-            self.value *= choice([-1, 1])
-            self.operator = '*'
-        elif self.card_type == 'division':
-            self.value *= choice([-1, 1])
-            self.operator = '/'
-        elif self.card_type == 'round_up':
-            self.value = 'Round\nup'
-            self.operator = 'round_up'
-        elif self.card_type == 'round_down':
-            self.value = 'Round\ndown'
-            self.operator = 'round_down'
+        self.parent = parent
+        self.engine = engine
+        self.char = char
+        self.food_cell = NO_CELL
+        self.worm: deque = deque()
+        # Hidden WormChild labels
+        self.pool: list = []
+        self.board = []
+        for row in range(engine.board_height):
+            for column in range(engine.board_width):
+                column_label = Label(
+                    self.parent,
+                    row_and_column=(row, column),
+                    text='_',
+                    customizations={'padding': '1 -4'},
+                )
+                self.board.append(column_label)
+
+    def reset(self) -> None:
+        self.clear_food(self.food_cell)
+
+    def set_food(self, cell: int) -> None:
+        self.board[cell].change_label('*')
+        self.food_cell = cell
+
+    def clear_food(self, cell: int) -> None:
+        if cell != NO_CELL and cell == self.food_cell:
+            self.board[cell].change_label('_')
+            self.food_cell = NO_CELL
+
+    def draw_worm(self) -> None:
+        for cell in reversed(self.engine.body):
+            self.grow_worm(self.engine.position(cell))
+
+    def clear_worm(self) -> None:
+        for worm in self.worm:
+            worm.remove()
+        self.pool.extend(self.worm)
+        self.worm.clear()
+
+    # The labels of the worm are moved to the cells of the engine, one per cell
+    def worm_restored(self, old_body: tuple) -> None:
+        positions = [self.engine.position(cell) for cell in self.engine.body]
+        while len(self.worm) > len(positions):
+            worm = self.worm.pop()
+            worm.remove()
+            self.pool.append(worm)
+        for worm, position in zip(self.worm, positions):
+            worm.change_position(position)
+        for position in positions[len(self.worm) :]:
+            self.worm.append(self.get_worm_child(position))
+
+    def grow_worm(self, position: tuple) -> None:
+        self.worm.appendleft(self.get_worm_child(position))
+
+    def get_worm_child(self, position: tuple):
+        """Shows a label of the pool at position, builds a new one when the pool is empty"""
+        if self.pool:
+            worm = self.pool.pop()
+            worm.change_position(position)
+            return worm
+        METRICS.increment('game2.worm_labels')
+        METRICS.increment('tk.widget_updates')
+        return self.WormChild(self.parent, position, self.char)
+
+    # The label of the tail is moved to the head, so only one label moves per tick
+    def worm_moved(self, head: int, tail: int) -> None:
+        position = self.engine.position(head)
+        if tail == NO_CELL:
+            self.grow_worm(position)
         else:
-            debug('Invalid card_type:', self.card_type)
+            worm = self.worm.pop()
+            worm.change_position(position)
+            self.worm.appendleft(worm)
 
-    def get_card(self) -> dict:
-        return {'value': self.value, 'index': self.index, 'operator': self.operator}
+    class WormChild:
+        __slots__ = ('char', 'parent', 'position', 'worm_label')
 
-    def reinit_card(self, operation=None):
-        if operation:
-            self.card_type = operation
-        else:
-            self.card_type = choice(
-                [
-                    'addition',
-                    'subtraction',
-                    'multiplication',
-                    'division',
-                    'round_up',
-                    'round_down',
-                ]
-            )
-        if self.card_type == 'multiplication' or self.card_type == 'division':
-            self.value = randint(self.min_value, self.max_value // 2)
-        else:
-            self.value = randint(self.min_value, self.max_value)
-        self.init_value_and_operator()
-        info('Card has been updated')
-        debug(f'Card updated {self.get_card()}')
+        def __init__(self, parent, position: tuple, char: str) -> None:
+            self.char = char
+            self.position = position
+            self.parent = parent
+            self.worm_label = tb.Label(self.parent, text=self.char)
+            self.worm_label.grid(row=position[0], column=position[1])
+
+        def remove(self):
+            self.worm_label.grid_remove()
+
+        def change_position(self, position: tuple) -> None:
+            self.position = position
+            self.worm_label.grid_configure(row=position[0], column=position[1])
+            METRICS.increment('tk.widget_updates')
+
+        def get_position(self) -> tuple:
+            return self.position
+
+
+class CanvasBoard:
+    EMPTY = 0
+    WORM = 1
+    FOOD = 2
+
+    def __init__(self, parent, engine, colors, cell_size=None) -> None:
+        """
+        # Canvas board
+        Worm game board drawn on one Canvas. Every cell is a rectangle that is created once,
+        a tick only recolors the cells that changed (new head, old tail and food)
+        ### Parameters:
+        - engine: WormEngine of the game, cells are in the same order
+        - colors: theme colors, for example App.style.colors
+        - cell_size: size of a cell in pixels, default fits the board to about 500 pixels
+        """
+        self.parent = parent
+        self.engine = engine
+        width = engine.board_width
+        height = engine.board_height
+        if cell_size is None:
+            cell_size = max(2, min(30, 500 // max(width, height)))
+        self.cell_size = cell_size
+        self.colors = {
+            self.EMPTY: colors.inputbg,
+            self.WORM: colors.success,
+            self.FOOD: colors.danger,
+        }
+        self.food_cell = NO_CELL
+        self.cell_states = bytearray(width * height)
+
+        self.canvas = tk.Canvas(
+            self.parent,
+            width=width * cell_size,
+            height=height * cell_size,
+            background=colors.bg,
+            highlightthickness=0,
+        )
+        self.canvas.grid(row=0, column=0)
+        gap = 1 if cell_size > 3 else 0
+        empty = self.colors[self.EMPTY]
+        self.items = []
+        for row in range(height):
+            for column in range(width):
+                x = column * cell_size
+                y = row * cell_size
+                self.items.append(
+                    self.canvas.create_rectangle(
+                        x,
+                        y,
+                        x + cell_size - gap,
+                        y + cell_size - gap,
+                        fill=empty,
+                        width=0,
+                    )
+                )
+
+    def set_cell(self, cell: int, state: int) -> None:
+        if self.cell_states[cell] != state:
+            self.cell_states[cell] = state
+            self.canvas.itemconfigure(self.items[cell], fill=self.colors[state])
+            METRICS.increment('tk.widget_updates')
+
+    def reset(self) -> None:
+        self.clear_food(self.food_cell)
+
+    def set_food(self, cell: int) -> None:
+        self.set_cell(cell, self.FOOD)
+        self.food_cell = cell
+
+    def clear_food(self, cell: int) -> None:
+        if cell != NO_CELL and cell == self.food_cell:
+            if self.cell_states[cell] == self.FOOD:
+                self.set_cell(cell, self.EMPTY)
+            self.food_cell = NO_CELL
+
+    def draw_worm(self) -> None:
+        for cell in self.engine.body:
+            self.set_cell(cell, self.WORM)
+
+    def clear_worm(self) -> None:
+        for cell in self.engine.body:
+            self.set_cell(cell, self.EMPTY)
+
+    def worm_restored(self, old_body: tuple) -> None:
+        occupied = self.engine.occupied
+        for cell in old_body:
+            if not occupied[cell]:
+                self.set_cell(cell, self.EMPTY)
+        self.draw_worm()
+
+    def worm_moved(self, head: int, tail: int) -> None:
+        if tail != NO_CELL:
+            self.set_cell(tail, self.EMPTY)
+        self.set_cell(head, self.WORM)
+
+
+class ViewportBoard:
+    EMPTY = 0
+    WORM = 1
+    FOOD = 2
+
+    def __init__(
+        self, parent, engine, colors, viewport=(31, 31), cell_size=16, margin=None
+    ) -> None:
+        """
+        # Viewport board
+        Canvas that shows only the part of the board around the head of the worm.
+        Only the visible cells exist as canvas items, so the startup time and memory
+        of the widgets do not depend on the board size.
+        ### Parameters:
+        - engine: WormEngine of the game
+        - colors: theme colors, for example App.style.colors
+        - viewport: (columns, rows) of visible cells, at most the size of the board
+        - cell_size: size of a cell in pixels
+        - margin: the view is centered on the head again when the head gets this many cells
+          close to an edge of the view. Default is a quarter of the view
+        """
+        self.parent = parent
+        self.engine = engine
+        self.view_width = min(viewport[0], engine.board_width)
+        self.view_height = min(viewport[1], engine.board_height)
+        if margin is None:
+            margin = min(self.view_width, self.view_height) // 4
+        self.margin = margin
+        self.colors = {
+            self.EMPTY: colors.inputbg,
+            self.WORM: colors.success,
+            self.FOOD: colors.danger,
+        }
+        # Board row and column of the top left visible cell
+        self.top = 0
+        self.left = 0
+        self.food_cell = NO_CELL
+        self.view_states = bytearray(self.view_width * self.view_height)
+
+        self.canvas = tk.Canvas(
+            self.parent,
+            width=self.view_width * cell_size,
+            height=self.view_height * cell_size,
+            background=colors.bg,
+            highlightthickness=0,
+        )
+        self.canvas.grid(row=0, column=0)
+        empty = self.colors[self.EMPTY]
+        self.items = []
+        for row in range(self.view_height):
+            for column in range(self.view_width):
+                x = column * cell_size
+                y = row * cell_size
+                self.items.append(
+                    self.canvas.create_rectangle(
+                        x,
+                        y,
+                        x + cell_size - 1,
+                        y + cell_size - 1,
+                        fill=empty,
+                        width=0,
+                    )
+                )
+
+    def get_state(self, cell: int) -> int:
+        if self.engine.occupied[cell]:
+            return self.WORM
+        elif cell == self.food_cell:
+            return self.FOOD
+        return self.EMPTY
+
+    # Index of the visible cell that shows cell, -1 when cell is outside of the view
+    def get_view_cell(self, cell: int) -> int:
+        row, column = divmod(cell, self.engine.board_width)
+        view_row = (row - self.top) % self.engine.board_height
+        view_column = (column - self.left) % self.engine.board_width
+        if view_row < self.view_height and view_column < self.view_width:
+            return view_row * self.view_width + view_column
+        return -1
+
+    def set_view_cell(self, view_cell: int, state: int) -> None:
+        if self.view_states[view_cell] != state:
+            self.view_states[view_cell] = state
+            self.canvas.itemconfigure(self.items[view_cell], fill=self.colors[state])
+            METRICS.increment('tk.widget_updates')
+
+    def update_cell(self, cell: int) -> None:
+        view_cell = self.get_view_cell(cell)
+        if view_cell >= 0:
+            self.set_view_cell(view_cell, self.get_state(cell))
+
+    def follow(self, cell: int) -> bool:
+        """Moves the view when cell is too close to an edge, returns True if the view moved"""
+        engine = self.engine
+        row, column = divmod(cell, engine.board_width)
+        view_row = (row - self.top) % engine.board_height
+        view_column = (column - self.left) % engine.board_width
+        moved = False
+        if self.view_height < engine.board_height and not (
+            self.margin <= view_row < self.view_height - self.margin
+        ):
+            self.top = (row - self.view_height // 2) % engine.board_height
+            moved = True
+        if self.view_width < engine.board_width and not (
+            self.margin <= view_column < self.view_width - self.margin
+        ):
+            self.left = (column - self.view_width // 2) % engine.board_width
+            moved = True
+        return moved
+
+    def redraw(self) -> None:
+        width = self.engine.board_width
+        height = self.engine.board_height
+        view_cell = 0
+        for view_row in range(self.view_height):
+            row_start = ((self.top + view_row) % height) * width
+            for view_column in range(self.view_width):
+                cell = row_start + (self.left + view_column) % width
+                self.set_view_cell(view_cell, self.get_state(cell))
+                view_cell += 1
+
+    def reset(self) -> None:
+        self.clear_food(self.food_cell)
+
+    def set_food(self, cell: int) -> None:
+        self.food_cell = cell
+        self.update_cell(cell)
+
+    def clear_food(self, cell: int) -> None:
+        if cell != NO_CELL and cell == self.food_cell:
+            self.food_cell = NO_CELL
+            self.update_cell(cell)
+
+    def draw_worm(self) -> None:
+        self.follow(self.engine.head())
+        self.redraw()
+
+    # draw_worm() redraws the whole view after the engine has been reset
+    def clear_worm(self) -> None:
+        pass
+
+    def worm_restored(self, old_body: tuple) -> None:
+        self.draw_worm()
+
+    def worm_moved(self, head: int, tail: int) -> None:
+        if self.follow(head):
+            self.redraw()
+            return
+        if tail != NO_CELL:
+            self.update_cell(tail)
+        self.update_cell(head)
+
+
+# Ttk style names of card bootstyles, resolved once
+TTK_STYLES: dict = {}
+
+
+def get_ttk_style(widget, bootstyle: str) -> str:
+    """Returns the ttk style name of bootstyle, builds the style the first time"""
+    ttk_style = TTK_STYLES.get(bootstyle)
+    if ttk_style is None:
+        ttk_style = TTK_STYLES[bootstyle] = Bootstyle.update_ttk_widget_style(
+            widget, bootstyle
+        )
+    return ttk_style
+
+
+def configure_ttk(widget, **options) -> None:
+    """Configures a ttk widget without resolving its bootstyle again"""
+    ttk.Widget.configure(widget, **options)
 
 
 class CardButton(tb.Frame):
@@ -924,7 +1532,8 @@ class CardButton(tb.Frame):
         - card: Instance of a Card class
         - customizations: default={'width': 12, 'height': 5, 'padx': 5,
                           'style': 'TButton',
-                          'on_click': self.on_click, }
+                          'on_click': self.on_click,
+                          'faces': CardFaces(height), }
         """
         self.parent = parent
 
@@ -935,6 +1544,7 @@ class CardButton(tb.Frame):
             'pady': 10,
             'style': 'TButton',
             'on_click': self.on_click,
+            'faces': None,
         }
         if customizations is not None:
             for key, value in customizations.items():
@@ -947,14 +1557,10 @@ class CardButton(tb.Frame):
         padx = default_customizations['padx']
         pady = default_customizations['pady']
         style = default_customizations['style']
+        self.faces = default_customizations['faces'] or CardFaces(self.height)
 
         self.card = card
-        text = self.card.get_card_text()
-        break_count = text.count('\n')
-
-        for i in range((self.height - break_count) // 2):
-            text += '\n'
-            text = '\n' + text
+        text = self.faces.get_face(self.card)
 
         self.button = tb.Button(
             self.parent,
@@ -963,6 +1569,11 @@ class CardButton(tb.Frame):
             bootstyle=style,
             command=self.on_click,
         )
+        # Styles are resolved once, refreshing a card only sets its text and style
+        UPDATES.remember(
+            self.button, text=text, style=get_ttk_style(self.button, style)
+        )
+        UPDATES.set_configure(self.button, configure_ttk)
         self.button.grid(row=row, column=col, padx=padx, pady=pady)
 
     def get_card(self) -> Card:
@@ -972,29 +1583,20 @@ class CardButton(tb.Frame):
         self.binded_command(self.card)
 
     def disable(self) -> None:
-        self.button.configure(state=DISABLED)
+        UPDATES.configure(self.button, state=DISABLED)
 
     def enable(self) -> None:
-        self.button.configure(state=ACTIVE)
+        UPDATES.configure(self.button, state=ACTIVE)
 
     def update_text(self, style: str) -> None:
-        text = self.card.get_card_text()
-        break_count = text.count('\n')
-
-        debug(f'breakcount: {break_count}')
-
-        for i in range((self.height - break_count) // 2):
-            text += '\n'
-            text = '\n' + text
-
-        if break_count > 0:
-            text = text[:-1]
-
-        self.button.configure(text=text, bootstyle=style)
+        text = self.faces.get_face(self.card)
+        UPDATES.configure(
+            self.button, text=text, style=get_ttk_style(self.button, style)
+        )
         debug(f'Card style is now: {style}')
 
 
-class Label(tb.Frame):
+class Label:
     def __init__(
         self, parent, row_and_column: tuple, text: str, customizations=None
     ) -> None:
@@ -1005,7 +1607,6 @@ class Label(tb.Frame):
         - text: What is shown in the label
         - customizations: {'sticky': None, 'columnspan': 1, 'justify': 'left', 'font': ('Arial', 20), 'padding': 0, 'visible': True}
         """
-        super().__init__(parent)
 
         default_customizations = {
             'sticky': None,
@@ -1032,6 +1633,7 @@ class Label(tb.Frame):
         self.label = tb.Label(
             parent, text=text, justify=justify, font=font, padding=padding
         )
+        UPDATES.remember(self.label, text=text)
 
         if visible:
             self.label.grid(
@@ -1042,13 +1644,13 @@ class Label(tb.Frame):
             )
 
     def get_text(self) -> str:
-        return self.label.cget('text')
+        return UPDATES.get(self.label, 'text')
 
     def get_row_and_column(self) -> tuple:
         return (self.row, self.col)
 
     def change_label(self, text: str) -> None:
-        self.label.configure(text=text)
+        UPDATES.configure(self.label, text=text)
 
     def visible(self) -> None:
         self.label.grid(
@@ -1077,9 +1679,180 @@ class KeyInputs:
             self.callback(event.char.lower())
 
 
-App(
-    title='Game Arcade v0.5',
-    theme='superhero',
-    size=(600, 650),
-    logging_level=logging.INFO,
-)
+class PerformanceOverlay:
+    def __init__(self, parent, metrics, refresh_interval=500) -> None:
+        """
+        # Performance overlay
+        Label in the bottom right corner of the app with the tick rate, tick lateness,
+        time spent in update_frame and on_click_card, input latency, Tk widget updates per frame
+        and the number of threads. Hidden by default, toggle() shows and hides it
+        ### Parameters:
+        - metrics: Metrics that are shown, usually METRICS
+        - refresh_interval: milliseconds between refreshes while visible
+        """
+        self.parent = parent
+        self.metrics = metrics
+        self.refresh_interval = refresh_interval
+        self.after_id = None
+        self.shown = False
+        self.previous_ticks = 0
+        self.previous_time = time.monotonic()
+        self.label = tb.Label(
+            parent,
+            text='',
+            font=('Courier', 10),
+            justify='left',
+            bootstyle='inverse-dark',
+            padding=5,
+        )
+
+    def toggle(self, event=None) -> None:
+        if self.shown:
+            self.hide()
+        else:
+            self.show()
+
+    def show(self) -> None:
+        self.shown = True
+        self.previous_ticks = self.metrics.get_counter('game2.ticks')
+        self.previous_time = time.monotonic()
+        self.label.place(relx=1.0, rely=1.0, anchor='se')
+        self.label.lift()
+        self.refresh()
+
+    def hide(self) -> None:
+        self.shown = False
+        if self.after_id is not None:
+            self.parent.after_cancel(self.after_id)
+            self.after_id = None
+        self.label.place_forget()
+
+    def refresh(self) -> None:
+        # Configured directly, the overlay is not counted in the ui metrics
+        self.label.configure(text=self.get_text())
+        self.after_id = self.parent.after(self.refresh_interval, self.refresh)
+
+    def get_text(self) -> str:
+        snapshot = self.metrics.snapshot()
+        histograms = snapshot['histograms']
+        empty = {'p50': 0.0, 'p99': 0.0, 'max': 0.0}
+
+        now = time.monotonic()
+        ticks = snapshot['counters'].get('game2.ticks', 0)
+        tick_rate = (ticks - self.previous_ticks) / max(now - self.previous_time, 1e-9)
+        self.previous_ticks = ticks
+        self.previous_time = now
+
+        def milliseconds(name: str) -> str:
+            summary = histograms.get(name, empty)
+            return (
+                f'p50 {summary["p50"] * 1000:6.2f}  p99 {summary["p99"] * 1000:6.2f} ms'
+            )
+
+        frame_updates = histograms.get('game2.widget_updates_per_frame', empty)
+        requests = histograms.get('ui.requests_per_flush', empty)
+        tk_calls = histograms.get('ui.tk_calls_per_flush', empty)
+        return '\n'.join(
+            [
+                f'ticks/s       {tick_rate:6.1f}',
+                f'lateness      {milliseconds("game2.tick_lateness")}',
+                f'update_frame  {milliseconds("game2.update_frame")}',
+                f'on_click_card {milliseconds("game1.on_click_card")}',
+                f'input latency {milliseconds("game2.input_latency")}',
+                f'autopilot     {milliseconds("game2.autopilot_decision")}',
+                f'updates/frame p50 {frame_updates["p50"]:4.0f}  max {frame_updates["max"]:4.0f}',
+                f'ui/flush      p50 {requests["p50"]:4.0f} -> {tk_calls["p50"]:4.0f} Tk calls',
+                f'threads       {snapshot["threads"]}',
+            ]
+        )
+
+
+# Windows of the app by name, built by App.get_window() when opened first time
+GAMES = {
+    'main': Main,
+    'game1': Game1,
+    'game2': Game2,
+}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Game Arcade')
+    parser.add_argument(
+        '--metrics-port',
+        type=int,
+        default=None,
+        help='serve a JSON snapshot of the metrics on 127.0.0.1:PORT',
+    )
+    parser.add_argument(
+        '--overlay', action='store_true', help='show the performance overlay (F3)'
+    )
+    parser.add_argument(
+        '--spectator-port',
+        type=int,
+        default=None,
+        help='broadcast Game 2 to spectators on 127.0.0.1:PORT',
+    )
+    parser.add_argument(
+        '--board',
+        nargs=2,
+        type=int,
+        default=[10, 10],
+        metavar=('WIDTH', 'HEIGHT'),
+        help='Game 2 board size in cells',
+    )
+    parser.add_argument(
+        '--renderer',
+        choices=('labels', 'canvas', 'viewport'),
+        default='labels',
+        help='Game 2 board drawing, canvas and viewport are meant for big boards',
+    )
+    parser.add_argument(
+        '--viewport',
+        nargs=2,
+        type=int,
+        default=[31, 31],
+        metavar=('COLUMNS', 'ROWS'),
+        help='visible Game 2 cells around the head with --renderer viewport',
+    )
+    parser.add_argument(
+        '--autopilot',
+        choices=('astar', 'mcts'),
+        default='astar',
+        help='Game 2 autopilot, mcts searches on all cores',
+    )
+    parser.add_argument(
+        '--max-replays',
+        type=int,
+        default=MAX_REPLAYS,
+        help='replays kept per game, the oldest are deleted',
+    )
+    args = parser.parse_args()
+    if args.max_replays < 1:
+        parser.error('--max-replays has to be at least 1')
+    if min(args.board) < 3:
+        parser.error('--board has to be at least 3 3')
+    if min(args.viewport) < 1:
+        parser.error('--viewport has to be at least 1 1')
+    App(
+        title='Game Arcade v0.5',
+        theme='superhero',
+        size=(600, 650),
+        logging_level=logging.INFO,
+        metrics_port=args.metrics_port,
+        show_overlay=args.overlay,
+        spectator_port=args.spectator_port,
+        max_replays=args.max_replays,
+        game_options={
+            'game2': {
+                'board_width': args.board[0],
+                'board_height': args.board[1],
+                'renderer': args.renderer,
+                'viewport': tuple(args.viewport),
+                'autopilot': args.autopilot,
+            }
+        },
+    ).mainloop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,393 @@
+"""
+Multi-session game server.
+Runs Game 1 and Game 2 sessions on the headless engines in one asyncio event loop:
+    python game_server.py --port 8765
+Clients send one JSON object per line and get one JSON object per line back.
+Every request has an "op", an optional "id" is copied to the reply:
+- {"op": "new", "game": "game1", "seed": 1}
+- {"op": "new", "game": "game2", "seed": 1, "board": [10, 10], "watch": true}
+- {"op": "play", "session": 1, "card": 0}: plays a Game 1 card
+- {"op": "turn", "session": 1, "key": "w"}: turns a Game 2 worm, "direction": "UP" also works
+- {"op": "state", "session": 1}
+- {"op": "close", "session": 1}
+- {"op": "stats", "reset": false}: METRICS snapshot, session counts and process CPU time
+Every Game 2 session ticks on its own TickLoop. Sessions started with "watch" get a
+{"event": "tick", ...} line every tick, all sessions get {"event": "game_over", ...}.
+Sessions are closed when their connection closes.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+from logging import debug, info
+
+from card_engine import Game1Engine
+from card_source import CardSource
+from metrics import METRICS
+from scheduler import TickLoop
+from worm_engine import NO_CELL, OPPOSITE_DIRECTIONS, WormEngine
+
+# Turns by WASD key, see KeyInputs in game.py
+KEYS = {'w': 'UP', 'a': 'LEFT', 's': 'DOWN', 'd': 'RIGHT'}
+
+# Tick events are dropped for a client whose unsent output is bigger than this
+MAX_WRITE_BUFFER = 1 << 20
+
+# Lateness samples kept for the percentiles of all sessions together
+LATENESS_HISTORY = 1 << 16
+
+
+class RequestError(Exception):
+    pass
+
+
+class LoopTimer:
+    def __init__(self, loop: asyncio.AbstractEventLoop) -> None:
+        """after() and after_cancel() of a Tk widget on an asyncio loop, so TickLoop runs on it"""
+        self.loop = loop
+
+    def after(self, milliseconds: int, callback) -> asyncio.TimerHandle:
+        return self.loop.call_later(milliseconds / 1000, callback)
+
+    def after_cancel(self, handle: asyncio.TimerHandle) -> None:
+        handle.cancel()
+
+
+class Connection:
+    def __init__(self, writer: asyncio.StreamWriter) -> None:
+        self.writer = writer
+        self.sessions: set = set()
+        self.closed = False
+
+    def send(self, message: dict) -> None:
+        if self.closed:
+            return
+        self.writer.write(json.dumps(message, separators=(',', ':')).encode() + b'\n')
+
+    def send_event(self, message: dict) -> None:
+        """Sends message unless the client is not reading its output"""
+        if self.writer.transport.get_write_buffer_size() > MAX_WRITE_BUFFER:
+            METRICS.increment('server.dropped_events')
+            return
+        self.send(message)
+
+
+class Game1Session:
+    def __init__(
+        self,
+        session_id: int,
+        seed=None,
+        starting_score=100,
+        target_score=0,
+        max_highscore=100,
+    ) -> None:
+        """Card game session, rules are in Game1Engine"""
+        self.session_id = session_id
+        self.engine = Game1Engine(
+            starting_score, target_score, max_highscore, source=CardSource(seed)
+        )
+        self.engine.new_game(seed)
+
+    def play(self, card_index: int) -> dict:
+        if self.engine.game_over():
+            raise RequestError('Game is over')
+        if not 0 <= card_index < len(self.engine.cards):
+            raise RequestError(f'No card {card_index}')
+        self.engine.play(card_index)
+        METRICS.increment('server.game1_moves')
+        return self.get_state()
+
+    def turn(self, direction: str) -> dict:
+        raise RequestError('Game 1 has no worm to turn')
+
+    def get_state(self) -> dict:
+        engine = self.engine
+        return {
+            'game': 'game1',
+            'session': self.session_id,
+            'score': engine.current_score,
+            'highscore': engine.current_highscore,
+            'moves': engine.moves,
+            'cards': [card.get_card_text() for card in engine.cards],
+            'game_over': engine.game_over(),
+        }
+
+    def close(self) -> None:
+        pass
+
+
+class Game2Session:
+    # Same speed curve as Game2
+    starting_game_speed = 0.7
+    game_speed_multiplier = 0.99
+    max_game_speed = 0.05
+    max_queued_inputs = 3
+
+    def __init__(
+        self,
+        session_id: int,
+        connection: Connection,
+        timer: LoopTimer,
+        seed=None,
+        board_width=10,
+        board_height=10,
+        watch=False,
+    ) -> None:
+        """
+        # Worm game session
+        Ticks on its own TickLoop with the rules and the order of Game2.update_frame:
+        one queued turn is applied per tick, turning back is ignored and the speed
+        increases every tick. Tick lateness of all sessions goes to server.tick_lateness
+        """
+        self.session_id = session_id
+        self.connection = connection
+        self.watch = watch
+        self.engine = WormEngine(board_width, board_height, seed=seed)
+        self.direction = 'RIGHT'
+        self.input_queue: deque = deque()
+        self.game_speed = self.starting_game_speed
+        self.score = 0
+        self.tick = 0
+        self.engine.spawn_food()
+        self.loop = TickLoop(
+            timer,
+            self.update_frame,
+            lambda: self.game_speed,
+            lateness=METRICS.histogram('server.tick_lateness', LATENESS_HISTORY),
+        )
+        self.loop.start()
+
+    def play(self, card_index: int) -> dict:
+        raise RequestError('Game 2 has no cards to play')
+
+    def turn(self, direction: str) -> dict:
+        """Queues a turn like Game2.set_movement_direction"""
+        if not self.engine.alive:
+            raise RequestError('Game is over')
+        last_direction = self.input_queue[-1] if self.input_queue else self.direction
+        if (
+            direction == last_direction
+            or direction == OPPOSITE_DIRECTIONS[last_direction]
+        ):
+            return self.get_state()
+        if len(self.input_queue) >= self.max_queued_inputs:
+            METRICS.increment('server.dropped_inputs')
+            return self.get_state()
+        self.input_queue.append(direction)
+        return self.get_state()
+
+    def update_frame(self) -> None:
+        if self.input_queue:
+            self.direction = self.input_queue.popleft()
+        self.tick += 1
+        head, tail, ate = self.engine.move(self.direction)
+        METRICS.increment('server.ticks')
+        if head == NO_CELL:
+            self.loop.stop()
+            METRICS.increment('server.game_overs')
+            self.connection.send({'event': 'game_over', **self.get_state()})
+            return
+        if ate:
+            self.score += 1
+            self.engine.spawn_food()
+        if self.game_speed > self.max_game_speed:
+            self.game_speed *= self.game_speed_multiplier
+        if self.watch:
+            self.connection.send_event(
+                {
+                    'event': 'tick',
+                    'session': self.session_id,
+                    'tick': self.tick,
+                    'head': head,
+                    'tail': tail,
+                    'food': self.engine.food,
+                    'score': self.score,
+                }
+            )
+
+    def get_state(self) -> dict:
+        engine = self.engine
+        return {
+            'game': 'game2',
+            'session': self.session_id,
+            'tick': self.tick,
+            'direction': self.direction,
+            'body': list(engine.body),
+            'food': engine.food,
+            'score': self.score,
+            'game_over': not engine.alive,
+        }
+
+    def close(self) -> None:
+        self.loop.stop()
+
+
+class GameServer:
+    def __init__(self, host='127.0.0.1', port=8765) -> None:
+        """
+        # Game server
+        Hosts any number of Game 1 and Game 2 sessions in one asyncio event loop,
+        see the module docstring for the protocol
+        """
+        self.host = host
+        self.port = port
+        self.sessions: dict = {}
+        self.next_session_id = 1
+        self.server = None
+        self.timer = None
+
+    async def start(self) -> None:
+        self.timer = LoopTimer(asyncio.get_running_loop())
+        self.server = await asyncio.start_server(
+            self.handle_client, self.host, self.port
+        )
+        self.port = self.server.sockets[0].getsockname()[1]
+        info(f'Game server listening on {self.host}:{self.port}')
+
+    async def serve_forever(self) -> None:
+        await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def handle_client(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        connection = Connection(writer)
+        METRICS.increment('server.connections')
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                connection.send(self.handle_line(line, connection))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError) as e:
+            debug(f'Client disconnected: {e}')
+        finally:
+            connection.closed = True
+            for session_id in list(connection.sessions):
+                self.close_session(session_id)
+            writer.close()
+            METRICS.increment('server.connections', -1)
+
+    def handle_line(self, line: bytes, connection: Connection) -> dict:
+        request_id = None
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise RequestError('Request has to be a JSON object')
+            request_id = request.get('id')
+            reply = self.handle(request, connection)
+            reply['ok'] = True
+        except (RequestError, ValueError, TypeError, KeyError) as e:
+            METRICS.increment('server.errors')
+            reply = {'ok': False, 'error': f'{type(e).__name__}: {e}'}
+        if request_id is not None:
+            reply['id'] = request_id
+        return reply
+
+    def handle(self, request: dict, connection: Connection) -> dict:
+        op = request.get('op')
+        METRICS.increment(f'server.requests.{op}')
+        if op == 'new':
+            return self.new_session(request, connection).get_state()
+        if op == 'stats':
+            return self.get_stats(request.get('reset', False))
+        session = self.get_session(request, connection)
+        if op == 'play':
+            return session.play(int(request['card']))
+        if op == 'turn':
+            if 'key' in request:
+                direction = KEYS.get(str(request['key']).lower())
+            else:
+                direction = request.get('direction')
+            if direction not in OPPOSITE_DIRECTIONS:
+                raise RequestError(f'Unknown turn: {request}')
+            return session.turn(direction)
+        if op == 'state':
+            return session.get_state()
+        if op == 'close':
+            self.close_session(session.session_id)
+            return {'session': session.session_id}
+        raise RequestError(f'Unknown op: {op}')
+
+    def new_session(self, request: dict, connection: Connection):
+        session_id = self.next_session_id
+        self.next_session_id += 1
+        seed = request.get('seed')
+        game = request.get('game')
+        if game == 'game1':
+            session = Game1Session(
+                session_id,
+                seed,
+                int(request.get('starting_score', 100)),
+                int(request.get('target_score', 0)),
+                int(request.get('max_highscore', 100)),
+            )
+        elif game == 'game2':
+            board_width, board_height = map(int, request.get('board', (10, 10)))
+            if board_width < 3 or board_height < 3:
+                raise RequestError('Board has to be at least 3x3')
+            session = Game2Session(
+                session_id,
+                connection,
+                self.timer,
+                seed,
+                board_width,
+                board_height,
+                bool(request.get('watch', False)),
+            )
+        else:
+            raise RequestError(f'Unknown game: {game}')
+        self.sessions[session_id] = (session, connection)
+        connection.sessions.add(session_id)
+        return session
+
+    def get_session(self, request: dict, connection: Connection):
+        entry = self.sessions.get(request.get('session'))
+        # Sessions of other clients look the same as missing ones
+        if entry is None or entry[1] is not connection:
+            raise RequestError(f'No session {request.get("session")}')
+        return entry[0]
+
+    def close_session(self, session_id: int) -> None:
+        session, connection = self.sessions.pop(session_id)
+        connection.sessions.discard(session_id)
+        session.close()
+
+    def get_stats(self, reset=False) -> dict:
+        games = [type(session).__name__ for session, _ in self.sessions.values()]
+        stats = {
+            'sessions': len(self.sessions),
+            'game1_sessions': games.count('Game1Session'),
+            'game2_sessions': games.count('Game2Session'),
+            'cpu_time': time.process_time(),
+            'time': time.monotonic(),
+            'metrics': METRICS.snapshot(),
+        }
+        if reset:
+            METRICS.histogram('server.tick_lateness', LATENESS_HISTORY).clear()
+        return stats
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765, help='0 picks a free port')
+    args = parser.parse_args()
+    logging.basicConfig(
+        format='%(asctime)s %(levelname)s: %(message)s', level=logging.INFO
+    )
+
+    server = GameServer(args.host, args.port)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
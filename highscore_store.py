@@ -0,0 +1,105 @@
+import json
+import os
+import sqlite3
+import time
+from logging import error, info
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    game TEXT NOT NULL,
+    score INTEGER NOT NULL,
+    finished_at REAL NOT NULL,
+    duration REAL NOT NULL,
+    moves INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_game_score ON runs (game, score DESC, finished_at);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+class HighscoreStore:
+    def __init__(self, path: str, json_path=None) -> None:
+        """
+        # Highscore store
+        Keeps every finished run in a local SQLite database in WAL mode, so several
+        App instances can add runs at the same time without overwriting each other.
+        Highscores and leaderboards are read from the (game, score) index.
+        ### Parameters:
+        - path: path of the database file
+        - json_path: old highscores.json, its highscores are moved to the database once
+        """
+        self.path = path
+        self.connection = sqlite3.connect(path, timeout=5.0)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.executescript(SCHEMA)
+        if json_path is not None:
+            self.migrate_json(json_path)
+
+    def migrate_json(self, json_path: str) -> None:
+        with self.connection:
+            # Claims the migration first, the write lock makes other instances wait
+            # until this transaction ends and then see the row
+            claimed = self.connection.execute(
+                "INSERT OR IGNORE INTO meta (key, value) VALUES ('json_migrated', ?)",
+                (json_path,),
+            ).rowcount
+            if not claimed:
+                return
+            highscores = {}
+            if os.path.exists(json_path):
+                try:
+                    with open(json_path, 'r') as f:
+                        highscores = json.load(f)
+                except Exception as e:
+                    error(e)
+                    # Tried again on the next start
+                    self.connection.rollback()
+                    return
+                finished_at = os.path.getmtime(json_path)
+                for game, score in highscores.items():
+                    if score:
+                        self.connection.execute(
+                            'INSERT INTO runs (game, score, finished_at, duration, moves)'
+                            ' VALUES (?, ?, ?, 0, 0)',
+                            (game, int(score), finished_at),
+                        )
+        info(f'Migrated highscores from {json_path}: {highscores}')
+
+    def add_run(self, game: str, score: int, duration: float, moves: int) -> None:
+        with self.connection:
+            self.connection.execute(
+                'INSERT INTO runs (game, score, finished_at, duration, moves)'
+                ' VALUES (?, ?, ?, ?, ?)',
+                (game, score, time.time(), duration, moves),
+            )
+
+    def get_highscore(self, game: str) -> int:
+        row = self.connection.execute(
+            'SELECT MAX(score) FROM runs WHERE game = ?', (game,)
+        ).fetchone()
+        return row[0] or 0
+
+    def get_top(self, game: str, count=10) -> list:
+        """Returns the count best runs of game as dicts, best first"""
+        rows = self.connection.execute(
+            'SELECT score, finished_at, duration, moves FROM runs'
+            ' WHERE game = ? ORDER BY score DESC, finished_at LIMIT ?',
+            (game, count),
+        ).fetchall()
+        return [
+            {
+                'score': score,
+                'finished_at': finished_at,
+                'duration': duration,
+                'moves': moves,
+            }
+            for score, finished_at, duration, moves in rows
+        ]
+
+    def close(self) -> None:
+        self.connection.close()
@@ -0,0 +1,134 @@
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from logging import info
+
+
+def percentile(values, fraction: float) -> float:
+    """Returns the value below which fraction of the values are, 0.0 when empty"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(fraction * len(ordered)))
+    return ordered[index]
+
+
+class Histogram:
+    def __init__(self, history=1024) -> None:
+        """Keeps the last history samples for percentiles and the count and sum of all samples"""
+        self.samples: deque = deque(maxlen=history)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value: float) -> None:
+        self.samples.append(value)
+        self.count += 1
+        self.total += value
+
+    def clear(self) -> None:
+        self.samples.clear()
+        self.count = 0
+        self.total = 0.0
+
+    def summary(self) -> dict:
+        samples = list(self.samples)
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else 0.0,
+            'p50': percentile(samples, 0.5),
+            'p99': percentile(samples, 0.99),
+            'max': max(samples, default=0.0),
+        }
+
+
+class Metrics:
+    def __init__(self) -> None:
+        """
+        # Metrics
+        Counters and histograms of the running app. Written from the mainloop,
+        snapshot() can be read from any thread
+        """
+        self.counters: dict = {}
+        self.histograms: dict = {}
+        self.started = time.monotonic()
+
+    def increment(self, name: str, amount=1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def get_counter(self, name: str) -> int:
+        return self.counters.get(name, 0)
+
+    def histogram(self, name: str, history=1024) -> Histogram:
+        """Returns the histogram with name, creates it the first time"""
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram(history)
+        return histogram
+
+    def observe(self, name: str, value: float) -> None:
+        self.histogram(name).observe(value)
+
+    @contextmanager
+    def timer(self, name: str):
+        """Observes the seconds spent inside the with block"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.histogram(name).observe(time.perf_counter() - started)
+
+    def snapshot(self) -> dict:
+        return {
+            'uptime': time.monotonic() - self.started,
+            'threads': threading.active_count(),
+            'counters': dict(self.counters),
+            'histograms': {
+                name: histogram.summary()
+                for name, histogram in list(self.histograms.items())
+            },
+        }
+
+
+# Metrics of the app, games and engines add to these
+METRICS = Metrics()
+
+
+class MetricsServer:
+    def __init__(self, metrics: Metrics, port: int, host='127.0.0.1') -> None:
+        """
+        # Metrics server
+        Serves metrics.snapshot() as JSON on GET requests from a daemon thread.
+        Listens only on the local host by default
+        """
+        # Imported only when metrics are served, http.server is slow to import
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        self.metrics = metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(handler) -> None:
+                body = json.dumps(metrics.snapshot()).encode()
+                handler.send_response(200)
+                handler.send_header('Content-Type', 'application/json')
+                handler.send_header('Content-Length', str(len(body)))
+                handler.end_headers()
+                handler.wfile.write(body)
+
+            def log_message(handler, format, *args) -> None:
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(
+            target=self.server.serve_forever, name='metrics-server', daemon=True
+        )
+
+    def start(self) -> None:
+        self.thread.start()
+        info(f'Serving metrics on http://127.0.0.1:{self.port}/')
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
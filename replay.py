@@ -0,0 +1,257 @@
+import mmap
+import os
+import struct
+from bisect import bisect_right
+from logging import error
+
+from card_engine import Game1Engine
+from card_source import CardSource
+from worm_engine import ACTIONS, WormEngine
+
+MAGIC = b'GARP'
+VERSION = 1
+
+GAME1 = 1
+GAME2 = 2
+
+# Record kinds
+DIRECTION = 1
+CARD = 2
+
+# magic, version, game, seed and four game parameters:
+# - Game 1: starting_score, target_score, max_highscore, 0
+# - Game 2: board_width, board_height, start row, start column
+HEADER = struct.Struct('<4sBBQ4i')
+# tick, kind and value. Game 1 uses the move number as the tick
+RECORD = struct.Struct('<IBB')
+
+# Records kept in memory before they are written to the file
+FLUSH_INTERVAL = 4096
+
+# Replays kept per game, see prune_replays()
+MAX_REPLAYS = 20
+
+
+class ReplayWriter:
+    def __init__(self, path: str, game: int, seed: int, params: tuple) -> None:
+        """
+        # Replay writer
+        Writes a session as a header and fixed-width records. See HEADER and RECORD.
+        Records are appended to the file every FLUSH_INTERVAL records and on close(),
+        the file is only open while they are written
+        ### Parameters:
+        - game: GAME1 or GAME2
+        - seed: seed of the CardSource (Game 1) or the food of the WormEngine (Game 2)
+        - params: game parameters, see HEADER
+        """
+        self.path = path
+        self.buffer = bytearray()
+        self.records = 0
+        self.closed = False
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        params = tuple(params) + (0,) * (4 - len(params))
+        with open(path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION, game, seed, *params))
+
+    def record(self, tick: int, kind: int, value: int) -> None:
+        self.buffer += RECORD.pack(tick, kind, value)
+        self.records += 1
+        if self.records % FLUSH_INTERVAL == 0:
+            self.flush()
+
+    def record_direction(self, tick: int, direction: str) -> None:
+        self.record(tick, DIRECTION, ACTIONS.index(direction))
+
+    def record_card(self, move: int, card_index: int) -> None:
+        self.record(move, CARD, card_index)
+
+    def flush(self) -> None:
+        if not self.buffer:
+            return
+        with open(self.path, 'ab') as f:
+            f.write(self.buffer)
+        self.buffer.clear()
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        self.flush()
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class ReplayReader:
+    def __init__(self, path: str) -> None:
+        """
+        # Replay reader
+        Reads a replay written by ReplayWriter through a memory map,
+        records are unpacked only when they are used
+        """
+        self.path = path
+        self.map = None
+        # The map keeps its own handle of the file
+        with open(path, 'rb') as f:
+            self.size = os.fstat(f.fileno()).st_size
+            if self.size < HEADER.size:
+                raise ValueError(f"Not a replay file: '{path}'")
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.game, self.seed, *params = HEADER.unpack_from(self.map)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"Not a replay file: '{path}'")
+        self.params = tuple(params)
+
+    def __len__(self) -> int:
+        return (self.size - HEADER.size) // RECORD.size
+
+    def __getitem__(self, index: int) -> tuple:
+        """Returns (tick, kind, value) of record index"""
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return RECORD.unpack_from(self.map, HEADER.size + index * RECORD.size)
+
+    def __iter__(self):
+        return RECORD.iter_unpack(
+            self.map[HEADER.size : HEADER.size + len(self) * RECORD.size]
+        )
+
+    def close(self) -> None:
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class Replay:
+    def __init__(self, reader: ReplayReader, keyframe_interval=500) -> None:
+        """
+        # Replay
+        Rebuilds a session headless from a ReplayReader.
+        The whole replay is played once when it is opened and the engine state is stored
+        every keyframe_interval records, so seek() only plays the records after a keyframe
+        """
+        self.reader = reader
+        self.keyframe_interval = keyframe_interval
+        self.engine = self.create_engine()
+        self.position = 0
+        self.keyframes: list = []
+        self.keyframe_positions: list = []
+        self.index_keyframes()
+
+    @classmethod
+    def open(cls, path: str, keyframe_interval=500) -> 'Replay':
+        return cls(ReplayReader(path), keyframe_interval)
+
+    def create_engine(self):
+        reader = self.reader
+        if reader.game == GAME1:
+            starting_score, target_score, max_highscore, _ = reader.params
+            engine = Game1Engine(
+                starting_score,
+                target_score,
+                max_highscore,
+                source=CardSource(reader.seed),
+            )
+            engine.new_game(reader.seed)
+        elif reader.game == GAME2:
+            board_width, board_height, row, column = reader.params
+            engine = WormEngine(board_width, board_height, (row, column))
+            engine.new_game(reader.seed)
+            engine.spawn_food()
+        else:
+            raise ValueError(f'Unknown game in replay: {reader.game}')
+        return engine
+
+    def __len__(self) -> int:
+        return len(self.reader)
+
+    def index_keyframes(self) -> None:
+        start = self.engine.snapshot()
+        for position in range(len(self)):
+            if position % self.keyframe_interval == 0:
+                self.keyframe_positions.append(position)
+                self.keyframes.append(self.engine.snapshot())
+            self.step()
+        self.end = self.engine.snapshot()
+        self.engine.restore(start)
+        self.position = 0
+
+    def apply(self, kind: int, value: int) -> None:
+        if kind == DIRECTION:
+            if self.engine.move(ACTIONS[value])[2]:
+                self.engine.spawn_food()
+        elif kind == CARD:
+            self.engine.play(value)
+
+    def step(self) -> tuple | None:
+        """Applies the next record and returns it, None at the end of the replay"""
+        if self.position >= len(self):
+            return None
+        record = self.reader[self.position]
+        self.apply(record[1], record[2])
+        self.position += 1
+        return record
+
+    def run(self) -> None:
+        """Plays the rest of the replay at full speed"""
+        reader = self.reader
+        apply = self.apply
+        for position in range(self.position, len(self)):
+            _, kind, value = reader[position]
+            apply(kind, value)
+        self.position = len(self)
+
+    def seek(self, position: int) -> None:
+        """Jumps to the state after position records, for Game 2 one record is one tick"""
+        position = max(0, min(position, len(self)))
+        if position == len(self):
+            self.engine.restore(self.end)
+            self.position = position
+            return
+        keyframe = bisect_right(self.keyframe_positions, position) - 1
+        if (
+            self.position > position
+            or self.position < self.keyframe_positions[keyframe]
+        ):
+            self.engine.restore(self.keyframes[keyframe])
+            self.position = self.keyframe_positions[keyframe]
+        while self.position < position:
+            self.step()
+
+    def close(self) -> None:
+        self.reader.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def prune_replays(folder: str, prefix: str, keep=MAX_REPLAYS) -> None:
+    """Deletes the oldest replays in folder whose name starts with prefix, keeps keep"""
+    try:
+        names = os.listdir(folder)
+    except FileNotFoundError:
+        return
+    paths = [
+        os.path.join(folder, name)
+        for name in names
+        if name.startswith(prefix) and name.endswith('.replay')
+    ]
+    paths.sort(key=os.path.getmtime)
+    for path in paths[: max(len(paths) - keep, 0)]:
+        try:
+            os.remove(path)
+        except OSError as e:
+            error(e)
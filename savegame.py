@@ -0,0 +1,180 @@
+import os
+import struct
+
+from card_source import OPERATIONS
+from worm_engine import ACTIONS, NO_CELL
+
+MAGIC = b'GASV'
+VERSION = 2
+
+GAME1 = 1
+GAME2 = 2
+
+# magic, version and game
+HEADER = struct.Struct('<4sBB')
+# current_score, current_highscore, moves, seed, four card operations and four card values.
+# The seed deals the cards after the save, see CardSource.reseed()
+GAME1_STATE = struct.Struct('<diIQ4B4i')
+# board_width, board_height, direction, alive, food, game_speed, passed_time, score, tick,
+# pending_growth, seed and length. Followed by length body cells from the head to the tail.
+# The seed places the food after the save
+GAME2_STATE = struct.Struct('<HHB?iddIIIQI')
+CELL = struct.Struct('<i')
+
+
+def pack_game1(engine, seed: int) -> bytes:
+    """Packs the score, highscore and cards of a Game1Engine"""
+    cards = engine.cards
+    return HEADER.pack(MAGIC, VERSION, GAME1) + GAME1_STATE.pack(
+        engine.current_score,
+        engine.current_highscore,
+        engine.moves,
+        seed,
+        *(OPERATIONS.index(card.card_type) for card in cards),
+        # Rounding cards have a text as their value
+        *(card.value if isinstance(card.value, int) else 0 for card in cards),
+    )
+
+
+def pack_game2(
+    engine,
+    direction: str,
+    game_speed: float,
+    passed_time: float,
+    score: int,
+    tick: int,
+    seed: int,
+) -> bytes:
+    """Packs the worm, food and speed of a Game 2 session"""
+    body = engine.body
+    return (
+        HEADER.pack(MAGIC, VERSION, GAME2)
+        + GAME2_STATE.pack(
+            engine.board_width,
+            engine.board_height,
+            ACTIONS.index(direction),
+            engine.alive,
+            engine.food,
+            game_speed,
+            passed_time,
+            score,
+            tick,
+            engine.pending_growth,
+            seed,
+            len(body),
+        )
+        + struct.pack(f'<{len(body)}i', *body)
+    )
+
+
+def get_game(data: bytes) -> int:
+    """Returns GAME1 or GAME2, raises ValueError when data is not a save"""
+    if len(data) < HEADER.size:
+        raise ValueError('Not a save: too short')
+    magic, version, game = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError('Not a save')
+    if version != VERSION:
+        raise ValueError(f'Unsupported save version: {version}')
+    return game
+
+
+def unpack_game1(data: bytes) -> tuple:
+    """
+    Returns (current_score, current_highscore, moves, seed, cards),
+    cards are ((card_type, value), ...)
+    """
+    if get_game(data) != GAME1:
+        raise ValueError('Not a Game 1 save')
+    if len(data) < HEADER.size + GAME1_STATE.size:
+        raise ValueError('Save is truncated')
+    values = GAME1_STATE.unpack_from(data, HEADER.size)
+    if any(operation >= len(OPERATIONS) for operation in values[4:8]):
+        raise ValueError('Save has an unknown card operation')
+    current_score, current_highscore, moves, seed = values[:4]
+    cards = tuple(
+        (OPERATIONS[operation], value)
+        for operation, value in zip(values[4:8], values[8:])
+    )
+    return current_score, current_highscore, moves, seed, cards
+
+
+def unpack_game2(data: bytes) -> tuple:
+    """
+    Returns (board_width, board_height, direction, alive, food, game_speed, passed_time,
+    score, tick, pending_growth, seed, body), body is a tuple of cells.
+    Raises ValueError when the worm or the food is not on the board or the worm
+    overlaps itself
+    """
+    if get_game(data) != GAME2:
+        raise ValueError('Not a Game 2 save')
+    if len(data) < HEADER.size + GAME2_STATE.size:
+        raise ValueError('Save is truncated')
+    values = GAME2_STATE.unpack_from(data, HEADER.size)
+    board_width, board_height, direction, _, food = values[:5]
+    length = values[-1]
+    start = HEADER.size + GAME2_STATE.size
+    if len(data) < start + length * CELL.size:
+        raise ValueError('Save is truncated')
+    body = struct.unpack_from(f'<{length}i', data, start)
+    if direction >= len(ACTIONS):
+        raise ValueError('Save has an unknown direction')
+    size = board_width * board_height
+    if not body or not all(0 <= cell < size for cell in body):
+        raise ValueError('Save has worm cells outside the board')
+    cells = set(body)
+    if len(cells) != len(body):
+        raise ValueError('Save has a worm that overlaps itself')
+    if food != NO_CELL and not 0 <= food < size:
+        raise ValueError('Save has food outside the board')
+    if food in cells:
+        raise ValueError('Save has food on the worm')
+    return (board_width, board_height, ACTIONS[direction], *values[3:-1], body)
+
+
+def restore_game1(engine, state: tuple) -> None:
+    """Sets a Game1Engine to an unpack_game1() state"""
+    current_score, engine.current_highscore, engine.moves, seed, cards = state
+    # Saved as a float, whole scores are shown without the decimal
+    engine.current_score = (
+        int(current_score) if current_score.is_integer() else current_score
+    )
+    for card, (card_type, value) in zip(engine.cards, cards):
+        card.set_card(card_type, value)
+    engine.source.reseed(seed)
+
+
+def restore_game2(engine, state: tuple) -> None:
+    """Sets the worm and food of a WormEngine to an unpack_game2() state"""
+    (
+        board_width,
+        board_height,
+        _,
+        alive,
+        food,
+        _,
+        _,
+        _,
+        _,
+        pending_growth,
+        seed,
+        body,
+    ) = state
+    if (board_width, board_height) != (engine.board_width, engine.board_height):
+        raise ValueError(f'Save is for a {board_width}x{board_height} board')
+    engine.restore((body, food, pending_growth, alive, engine.rng.getstate()))
+    engine.rng.seed(seed)
+
+
+def write_save(path: str, data: bytes) -> None:
+    """Writes data next to path first, so a failed write does not break the old save"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    temporary_path = path + '.tmp'
+    with open(temporary_path, 'wb') as f:
+        f.write(data)
+    os.replace(temporary_path, path)
+
+
+def read_save(path: str) -> bytes:
+    with open(path, 'rb') as f:
+        return f.read()
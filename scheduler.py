@@ -0,0 +1,78 @@
+import math
+import time
+
+from metrics import Histogram
+
+
+class TickLoop:
+    def __init__(
+        self, widget, callback, interval, max_catch_up=5, history=1024, lateness=None
+    ):
+        """
+        # Tick loop
+        Fixed timestep game loop that runs on the Tk mainloop with widget.after().
+        Ticks are scheduled from a monotonic clock, every tick is interval after the
+        previous scheduled tick, so late callbacks do not make the loop drift.
+        ### Parameters:
+        - widget: any Tk widget, used for after() and after_cancel()
+        - callback: called once per tick without arguments
+        - interval: seconds between ticks, or a function that returns them.
+          Read again after every tick so the speed can change while running
+        - max_catch_up: most ticks run at once after the loop has fallen behind.
+          The rest of the backlog is dropped
+        - history: how many lateness samples are kept
+        - lateness: Histogram for the lateness samples, e.g. one from METRICS
+        """
+        self.widget = widget
+        self.callback = callback
+        self.interval = interval if callable(interval) else lambda: interval
+        self.max_catch_up = max_catch_up
+        self.running = False
+        self.next_tick = 0.0
+        self.after_id = None
+        self.ticks = 0
+        self.dropped_ticks = 0
+        # Seconds between the scheduled and the actual start of each tick
+        self.lateness = lateness if lateness is not None else Histogram(history)
+
+    def start(self) -> None:
+        self.stop()
+        self.running = True
+        self.next_tick = time.monotonic() + self.interval()
+        self.schedule()
+
+    def stop(self) -> None:
+        self.running = False
+        if self.after_id is not None:
+            self.widget.after_cancel(self.after_id)
+            self.after_id = None
+
+    def schedule(self) -> None:
+        # Rounded up, waking up early would only reschedule
+        delay = max(0.0, self.next_tick - time.monotonic())
+        self.after_id = self.widget.after(math.ceil(delay * 1000), self.run)
+
+    def run(self) -> None:
+        self.after_id = None
+        steps = 0
+        now = time.monotonic()
+        while self.running and now >= self.next_tick and steps < self.max_catch_up:
+            self.lateness.observe(now - self.next_tick)
+            self.callback()
+            self.ticks += 1
+            steps += 1
+            self.next_tick += self.interval()
+            now = time.monotonic()
+
+        if not self.running:
+            return
+        if now >= self.next_tick:
+            behind = now - self.next_tick
+            self.dropped_ticks += int(behind / self.interval()) + 1
+            self.next_tick = now + self.interval()
+        self.schedule()
+
+    def get_lateness(self) -> dict:
+        """Returns the p50, p99 and max tick lateness in seconds"""
+        summary = self.lateness.summary()
+        return {'p50': summary['p50'], 'p99': summary['p99'], 'max': summary['max']}
@@ -0,0 +1,402 @@
+"""
+Spectator feed of Game 2.
+Broadcasts every tick of a worm game as a small binary delta over a local socket,
+with a keyframe of the whole worm every keyframe_interval ticks so spectators can
+join at any time. Watch a running game with:
+    python spectator.py --connect 127.0.0.1:8766
+Frames start with a kind byte and the tick:
+- DELTA: head cell entered (NO_CELL when the worm died), tail cell freed (NO_CELL when
+  the worm grew), food cell and score change of the tick
+- KEYFRAME: board size, food, score and the body cells from the head to the tail
+"""
+
+import argparse
+import selectors
+import socket
+import struct
+import threading
+from collections import deque
+from logging import debug, info
+
+from worm_engine import NO_CELL
+
+# Frame kinds
+DELTA = 1
+KEYFRAME = 2
+
+# kind, tick, head, tail, food, score change
+DELTA_FRAME = struct.Struct('<BIiiib')
+# kind, tick, board_width, board_height, food, score, length. Followed by length cells
+KEYFRAME_HEADER = struct.Struct('<BIHHiII')
+CELL = struct.Struct('<i')
+
+# Bytes the kernel keeps for a spectator, the rest waits in SpectatorClient.frames
+SEND_BUFFER = 1 << 14
+
+
+def pack_delta(tick: int, head: int, tail: int, food: int, score_change: int) -> bytes:
+    return DELTA_FRAME.pack(DELTA, tick, head, tail, food, score_change)
+
+
+def pack_keyframe(tick: int, engine, score: int) -> bytes:
+    body = engine.body
+    return KEYFRAME_HEADER.pack(
+        KEYFRAME,
+        tick,
+        engine.board_width,
+        engine.board_height,
+        engine.food,
+        score,
+        len(body),
+    ) + struct.pack(f'<{len(body)}i', *body)
+
+
+class SpectatorClient:
+    __slots__ = ('events', 'frames', 'offset', 'size', 'sock', 'waiting_keyframe')
+
+    def __init__(self, sock: socket.socket) -> None:
+        """Frames waiting to be sent to one spectator, offset bytes of the first are sent"""
+        self.sock = sock
+        self.frames: deque = deque()
+        self.size = 0
+        self.offset = 0
+        self.waiting_keyframe = False
+        # Events the selector waits for
+        self.events = selectors.EVENT_READ
+
+    def add(self, frame: bytes) -> None:
+        self.frames.append(frame)
+        self.size += len(frame)
+
+    def drop(self) -> None:
+        """Drops the unsent frames, a frame that is partly sent is kept whole"""
+        kept = self.frames[0] if self.offset else None
+        self.frames.clear()
+        self.size = 0
+        if kept is not None:
+            self.add(kept)
+        self.waiting_keyframe = True
+
+    def send(self) -> None:
+        data = b''.join(self.frames)[self.offset :]
+        sent = self.sock.send(data)
+        self.offset += sent
+        while self.frames and self.offset >= len(self.frames[0]):
+            frame = self.frames.popleft()
+            self.offset -= len(frame)
+            self.size -= len(frame)
+
+
+class SpectatorFeed:
+    def __init__(
+        self, port: int, host='127.0.0.1', keyframe_interval=100, max_buffer=1 << 16
+    ) -> None:
+        """
+        # Spectator feed
+        Game2.update_frame only packs the frame of the tick and appends it to a queue,
+        a daemon thread copies it to the buffers of the spectators and sends them.
+        A new spectator gets the last keyframe and the deltas after it.
+        A spectator whose unsent frames would grow over max_buffer bytes loses them and
+        gets the stream again from the next keyframe.
+        ### Parameters:
+        - keyframe_interval: ticks between keyframes
+        - max_buffer: bytes of unsent frames kept per spectator
+        ### Attributes:
+        - spectators: connected spectators
+        - dropped: times frames were dropped for a slow spectator
+        """
+        self.keyframe_interval = keyframe_interval
+        self.max_buffer = max_buffer
+        self.keyframe_tick = None
+        # Frames of update_frame that the thread has not handled yet
+        self.queue: deque = deque()
+        # Last keyframe and the deltas after it, for new spectators
+        self.history: list = []
+        self.clients: dict = {}
+        self.spectators = 0
+        self.dropped = 0
+        self.running = False
+
+        self.server = socket.create_server((host, port))
+        self.server.setblocking(False)
+        self.port = self.server.getsockname()[1]
+        self.wake_reader, self.wake_writer = socket.socketpair()
+        self.wake_reader.setblocking(False)
+        self.wake_writer.setblocking(False)
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.server, selectors.EVENT_READ)
+        self.selector.register(self.wake_reader, selectors.EVENT_READ)
+        self.thread = threading.Thread(
+            target=self.run, name='spectator-feed', daemon=True
+        )
+
+    def start(self) -> None:
+        self.running = True
+        self.thread.start()
+        info(f'Spectator feed on 127.0.0.1:{self.port}')
+
+    def stop(self) -> None:
+        self.running = False
+        self.wake()
+        self.thread.join()
+        for client in list(self.clients.values()):
+            self.disconnect(client)
+        self.selector.close()
+        self.server.close()
+        self.wake_reader.close()
+        self.wake_writer.close()
+
+    # Called from the mainloop
+
+    def publish_tick(
+        self, tick: int, engine, head: int, tail: int, score: int, score_change: int
+    ) -> None:
+        """
+        Publishes the move of a tick, every keyframe_interval ticks as a keyframe.
+        The first tick of a new game is a keyframe, the ticks start again from 1.
+        The tick the worm dies is always a delta, keyframes have no game over
+        """
+        keyframe_tick = self.keyframe_tick
+        if head != NO_CELL and (
+            keyframe_tick is None
+            or tick <= keyframe_tick
+            or tick - keyframe_tick >= self.keyframe_interval
+        ):
+            self.publish_keyframe(tick, engine, score)
+        else:
+            self.publish(pack_delta(tick, head, tail, engine.food, score_change))
+
+    def publish_keyframe(self, tick: int, engine, score: int) -> None:
+        self.keyframe_tick = tick
+        self.publish(pack_keyframe(tick, engine, score))
+
+    def publish(self, frame: bytes) -> None:
+        self.queue.append(frame)
+        # The thread empties the queue before it waits again, so only the first
+        # frame after that has to wake it up
+        if len(self.queue) == 1:
+            self.wake()
+
+    def wake(self) -> None:
+        try:
+            self.wake_writer.send(b'\0')
+        except BlockingIOError:
+            # The thread has not read the earlier wake ups yet
+            pass
+
+    # Runs on the feed thread
+
+    def run(self) -> None:
+        while self.running:
+            for key, events in self.selector.select():
+                if key.fileobj is self.server:
+                    self.accept()
+                elif key.fileobj is self.wake_reader:
+                    try:
+                        while self.wake_reader.recv(4096):
+                            pass
+                    except BlockingIOError:
+                        pass
+                else:
+                    self.handle(key.data, events)
+            self.deliver()
+
+    def accept(self) -> None:
+        try:
+            sock, address = self.server.accept()
+        except BlockingIOError:
+            return
+        debug(f'Spectator connected: {address}')
+        sock.setblocking(False)
+        # A small kernel buffer, so a slow spectator runs into max_buffer soon
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SEND_BUFFER)
+        client = SpectatorClient(sock)
+        for frame in self.history:
+            client.add(frame)
+        self.clients[sock] = client
+        self.spectators = len(self.clients)
+        self.selector.register(sock, client.events, client)
+        self.update_events(client)
+
+    def handle(self, client: SpectatorClient, events: int) -> None:
+        try:
+            if events & selectors.EVENT_READ and not client.sock.recv(4096):
+                self.disconnect(client)
+                return
+            if events & selectors.EVENT_WRITE:
+                client.send()
+        except BlockingIOError:
+            pass
+        except OSError as e:
+            debug(f'Spectator disconnected: {e}')
+            self.disconnect(client)
+            return
+        self.update_events(client)
+
+    def deliver(self) -> None:
+        """Moves the frames of the queue to the history and to the spectators"""
+        queue = self.queue
+        while queue:
+            frame = queue.popleft()
+            keyframe = frame[0] == KEYFRAME
+            if keyframe:
+                self.history = [frame]
+            else:
+                self.history.append(frame)
+            for client in self.clients.values():
+                if client.waiting_keyframe:
+                    if not keyframe:
+                        continue
+                    client.waiting_keyframe = False
+                if client.size + len(frame) > self.max_buffer and client.size:
+                    self.dropped += 1
+                    client.drop()
+                    if not keyframe:
+                        continue
+                    client.waiting_keyframe = False
+                client.add(frame)
+        for client in self.clients.values():
+            self.update_events(client)
+
+    def update_events(self, client: SpectatorClient) -> None:
+        """Waits for the socket to be writable only while there are frames to send"""
+        events = selectors.EVENT_READ
+        if client.frames:
+            events |= selectors.EVENT_WRITE
+        if events != client.events:
+            client.events = events
+            self.selector.modify(client.sock, events, client)
+
+    def disconnect(self, client: SpectatorClient) -> None:
+        self.clients.pop(client.sock, None)
+        self.spectators = len(self.clients)
+        try:
+            self.selector.unregister(client.sock)
+        except (KeyError, ValueError):
+            pass
+        client.sock.close()
+
+
+class SpectatorView:
+    def __init__(self) -> None:
+        """Game state of a spectator, built from the frames of a SpectatorFeed"""
+        self.buffer = bytearray()
+        self.synced = False
+        self.tick = 0
+        self.board_width = 0
+        self.board_height = 0
+        self.body: deque = deque()
+        self.food = NO_CELL
+        self.score = 0
+        self.alive = True
+
+    def feed(self, data: bytes) -> int:
+        """Applies the whole frames of data, keeps the rest. Returns the frames applied"""
+        buffer = self.buffer
+        buffer += data
+        position = 0
+        frames = 0
+        while position < len(buffer):
+            kind = buffer[position]
+            if kind == DELTA:
+                if len(buffer) - position < DELTA_FRAME.size:
+                    break
+                _, tick, head, tail, food, score_change = DELTA_FRAME.unpack_from(
+                    buffer, position
+                )
+                position += DELTA_FRAME.size
+                self.apply_delta(tick, head, tail, food, score_change)
+            elif kind == KEYFRAME:
+                if len(buffer) - position < KEYFRAME_HEADER.size:
+                    break
+                header = KEYFRAME_HEADER.unpack_from(buffer, position)
+                length = header[-1]
+                end = position + KEYFRAME_HEADER.size + length * CELL.size
+                if len(buffer) < end:
+                    break
+                body = struct.unpack_from(
+                    f'<{length}i', buffer, position + KEYFRAME_HEADER.size
+                )
+                position = end
+                self.apply_keyframe(*header[1:-1], body)
+            else:
+                raise ValueError(f'Unknown frame kind {kind}')
+            frames += 1
+        del buffer[:position]
+        return frames
+
+    def apply_keyframe(
+        self,
+        tick: int,
+        board_width: int,
+        board_height: int,
+        food: int,
+        score: int,
+        body,
+    ) -> None:
+        self.tick = tick
+        self.board_width = board_width
+        self.board_height = board_height
+        self.food = food
+        self.score = score
+        self.body = deque(body)
+        self.alive = True
+        self.synced = True
+
+    def apply_delta(
+        self, tick: int, head: int, tail: int, food: int, score_change: int
+    ) -> None:
+        if not self.synced:
+            return
+        self.tick = tick
+        if head == NO_CELL:
+            self.alive = False
+            return
+        self.body.appendleft(head)
+        if tail != NO_CELL:
+            self.body.pop()
+        self.food = food
+        self.score += score_change
+
+    def render(self) -> str:
+        """Board as text, o is the worm, @ the head and * the food"""
+        cells = ['.'] * (self.board_width * self.board_height)
+        for cell in self.body:
+            cells[cell] = 'o'
+        if self.body:
+            cells[self.body[0]] = '@'
+        if self.food != NO_CELL:
+            cells[self.food] = '*'
+        return '\n'.join(
+            ''.join(cells[row * self.board_width : (row + 1) * self.board_width])
+            for row in range(self.board_height)
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--connect', default='127.0.0.1:8766', metavar='HOST:PORT')
+    parser.add_argument(
+        '--board', action='store_true', help='draw the board every tick'
+    )
+    args = parser.parse_args()
+    host, port = args.connect.rsplit(':', 1)
+
+    view = SpectatorView()
+    with socket.create_connection((host, int(port))) as sock:
+        while True:
+            data = sock.recv(65536)
+            if not data:
+                break
+            if not view.feed(data) or not view.synced:
+                continue
+            if args.board:
+                print(f'\x1b[H\x1b[2J{view.render()}')
+            state = 'alive' if view.alive else 'game over'
+            print(
+                f'tick {view.tick}  length {len(view.body)}  score {view.score}  {state}'
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from card_batch import BatchGame1Engine, greedy_policy, random_policy
+from card_engine import Game1Engine, apply_operator, divide_tenths
+from card_source import OPERATIONS
+
+
+def deal_like(engine: Game1Engine, batch: BatchGame1Engine, game: int) -> None:
+    """Gives the scalar engine the cards of one batch game"""
+    for card, operator, value in zip(
+        engine.cards, batch.operators[game], batch.values[game]
+    ):
+        card.set_card(OPERATIONS[operator], int(value))
+
+
+@pytest.mark.parametrize('seed', range(5))
+@pytest.mark.parametrize('policy', [random_policy, greedy_policy])
+def test_batch_matches_scalar_engine(seed, policy):
+    games = 200
+    batch = BatchGame1Engine(games, seed=seed)
+    engines = [Game1Engine() for _ in range(games)]
+    for game, engine in enumerate(engines):
+        deal_like(engine, batch, game)
+
+    for _ in range(300):
+        if batch.done.all():
+            break
+        card_indices = policy(batch)
+        playing = np.flatnonzero(~batch.done)
+        batch.step(card_indices)
+        for game in playing:
+            engine = engines[game]
+            done = engine.play(int(card_indices[game]))
+            deal_like(engine, batch, game)
+            assert batch.score[game] == engine.current_score
+            assert batch.done[game] == done
+            assert batch.moves[game] == engine.moves
+            assert batch.highscore[game] == engine.current_highscore
+
+
+@pytest.mark.parametrize(
+    'score, operator, value, expected',
+    [
+        # Python round(0.1 / 2, 1) and round(0.5 / 10, 1) are 0.1, the exact halves
+        (0.1, '/', 2, 0.1),
+        (0.5, '/', 10, 0.1),
+        (0.3, '/', 2, 0.2),
+        (-0.3, '/', 2, -0.2),
+        (0.3, '/', -2, -0.2),
+        (100, '/', 3, 33.3),
+        (0.1, '*', 3, 0.3),
+        (50, '/', 2, 50 // 2),
+        (12.3, 'round_up', 0, 13),
+        (-12.3, 'round_down', 0, -13),
+    ],
+)
+def test_apply_operator(score, operator, value, expected):
+    assert apply_operator(score, operator, value) == expected
+
+
+def test_divide_tenths_arrays_match_ints():
+    tenths = np.arange(-1000, 1001)
+    for value in (-25, -4, -1, 1, 2, 7, 10, 25):
+        expected = [divide_tenths(int(t), value) for t in tenths]
+        assert divide_tenths(tenths, np.full_like(tenths, value)).tolist() == expected
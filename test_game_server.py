@@ -0,0 +1,142 @@
+import asyncio
+import json
+
+import pytest
+
+from game_server import Game2Session, GameServer
+
+
+class Client:
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.events: list = []
+
+    @classmethod
+    async def connect(cls, server: GameServer) -> 'Client':
+        return cls(*await asyncio.open_connection(server.host, server.port))
+
+    async def send_line(self, line: bytes) -> dict:
+        """Sends a request line and returns its reply, events are kept in self.events"""
+        self.writer.write(line + b'\n')
+        await self.writer.drain()
+        while True:
+            message = await self.receive()
+            if 'event' not in message:
+                return message
+            self.events.append(message)
+
+    async def request(self, **request) -> dict:
+        return await self.send_line(json.dumps(request).encode())
+
+    async def receive(self) -> dict:
+        return json.loads(await asyncio.wait_for(self.reader.readline(), 5))
+
+    async def close(self) -> None:
+        self.writer.close()
+        await self.writer.wait_closed()
+
+
+def run(test) -> None:
+    """Runs test(server, client) against a server on a free port"""
+
+    async def main():
+        server = GameServer(port=0)
+        await server.start()
+        client = await Client.connect(server)
+        try:
+            await test(server, client)
+        finally:
+            await client.close()
+            server.server.close()
+            await server.server.wait_closed()
+
+    asyncio.run(main())
+
+
+def test_game1_session():
+    async def test(server, client):
+        state = await client.request(op='new', game='game1', seed=1, id=7)
+        assert state['ok'] and state['id'] == 7
+        assert (state['score'], state['moves'], len(state['cards'])) == (100, 0, 4)
+
+        state = await client.request(op='play', session=state['session'], card=2)
+        assert state['ok'] and state['moves'] == 1
+        assert await client.request(op='state', session=state['session']) == state
+
+        reply = await client.request(op='play', session=state['session'], card=4)
+        assert not reply['ok'] and 'No card 4' in reply['error']
+        reply = await client.request(op='turn', session=state['session'], key='w')
+        assert not reply['ok']
+
+        stats = await client.request(op='stats')
+        assert (stats['sessions'], stats['game1_sessions']) == (1, 1)
+        reply = await client.request(op='close', session=state['session'])
+        assert reply == {'session': state['session'], 'ok': True}
+        assert not (await client.request(op='state', session=state['session']))['ok']
+
+    run(test)
+
+
+def test_game2_session(monkeypatch):
+    monkeypatch.setattr(Game2Session, 'starting_game_speed', 0.01)
+
+    async def test(server, client):
+        state = await client.request(
+            op='new', game='game2', seed=1, board=[6, 5], watch=True
+        )
+        assert state['ok'] and state['body'] == [1] and state['direction'] == 'RIGHT'
+        session = state['session']
+        # Turning back is ignored, WASD keys and directions both work
+        await client.request(op='turn', session=session, direction='LEFT')
+        await client.request(op='turn', session=session, key='S')
+        while len(client.events) < 3:
+            client.events.append(await client.receive())
+        state = await client.request(op='state', session=session)
+        assert state['direction'] == 'DOWN'
+
+        # Events are sent in order before the reply
+        ticks = [event['tick'] for event in client.events]
+        assert ticks == list(range(1, state['tick'] + 1))
+        assert client.events[-1]['head'] == state['body'][0]
+
+        reply = await client.request(op='turn', session=session, direction='NORTH')
+        assert not reply['ok'] and 'Unknown turn' in reply['error']
+        reply = await client.request(op='new', game='game2', board=[2, 10])
+        assert not reply['ok']
+
+    run(test)
+
+
+@pytest.mark.parametrize(
+    'line',
+    [b'not json', b'[1, 2]', b'{"op": "fly"}', b'{"op": "new", "game": "game3"}'],
+)
+def test_bad_requests_get_errors(line):
+    async def test(server, client):
+        reply = await client.send_line(line)
+        assert not reply['ok'] and reply['error']
+        # The connection keeps working
+        assert (await client.request(op='stats'))['ok']
+
+    run(test)
+
+
+def test_sessions_belong_to_their_connection():
+    async def test(server, client):
+        session = (await client.request(op='new', game='game1', seed=1))['session']
+        other = await Client.connect(server)
+        reply = await other.request(op='play', session=session, card=0)
+        assert not reply['ok'] and f'No session {session}' in reply['error']
+        await other.request(op='new', game='game2', seed=1)
+        assert len(server.sessions) == 2
+
+        # Closing a connection closes its sessions
+        await other.close()
+        for _ in range(100):
+            if len(server.sessions) == 1:
+                break
+            await asyncio.sleep(0.01)
+        assert list(server.sessions) == [session]
+
+    run(test)
@@ -0,0 +1,66 @@
+import json
+import sqlite3
+import threading
+
+from highscore_store import HighscoreStore
+
+
+def write_json(path, highscores: dict) -> str:
+    path.write_text(json.dumps(highscores))
+    return str(path)
+
+
+def test_runs_and_leaderboard(tmp_path):
+    store = HighscoreStore(str(tmp_path / 'highscores.db'))
+    for score in (3, 9, 5):
+        store.add_run('game2', score, 1.5, 10)
+    store.add_run('game1', 40, 2.0, 4)
+    assert store.get_highscore('game2') == 9
+    assert store.get_highscore('other') == 0
+    assert [run['score'] for run in store.get_top('game2', 2)] == [9, 5]
+    store.close()
+
+
+def test_json_is_migrated_once(tmp_path):
+    json_path = write_json(tmp_path / 'highscores.json', {'game1': 20, 'game2': 0})
+    for _ in range(2):
+        store = HighscoreStore(str(tmp_path / 'highscores.db'), json_path)
+        assert [run['score'] for run in store.get_top('game1')] == [20]
+        assert store.get_top('game2') == []
+        store.close()
+
+
+def test_broken_json_is_migrated_later(tmp_path):
+    json_path = tmp_path / 'highscores.json'
+    json_path.write_text('{')
+    HighscoreStore(str(tmp_path / 'highscores.db'), str(json_path)).close()
+    write_json(json_path, {'game1': 20})
+    store = HighscoreStore(str(tmp_path / 'highscores.db'), str(json_path))
+    assert store.get_highscore('game1') == 20
+    store.close()
+
+
+def test_instances_starting_together_migrate_once(tmp_path):
+    json_path = write_json(tmp_path / 'highscores.json', {'game1': 20})
+    path = str(tmp_path / 'highscores.db')
+    # Creates the database, so the instances only race on the migration
+    HighscoreStore(path).close()
+    barrier = threading.Barrier(4)
+    errors = []
+
+    def start():
+        barrier.wait()
+        try:
+            HighscoreStore(path, json_path).close()
+        except sqlite3.Error as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=start) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    store = HighscoreStore(path)
+    assert len(store.get_top('game1')) == 1
+    store.close()
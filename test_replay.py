@@ -0,0 +1,167 @@
+import os
+import random
+
+import pytest
+
+from card_engine import Game1Engine
+from card_source import CardSource
+from replay import (
+    FLUSH_INTERVAL,
+    GAME1,
+    GAME2,
+    Replay,
+    ReplayReader,
+    ReplayWriter,
+    prune_replays,
+)
+from worm_autopilot import Autopilot
+from worm_engine import ACTIONS, OPPOSITE_DIRECTIONS, WormEngine
+
+
+def record_worm(path: str, seed: int, ticks: int) -> list:
+    """Plays and records a Game 2 session, returns the snapshot after every tick"""
+    engine = WormEngine(8, 8, (0, 1))
+    engine.new_game(seed)
+    engine.spawn_food()
+    writer = ReplayWriter(path, GAME2, seed, (8, 8, 0, 1))
+    rng = random.Random(seed)
+    direction = 'RIGHT'
+    snapshots = [engine.snapshot()]
+    for tick in range(ticks):
+        turn = rng.choice(ACTIONS)
+        if rng.random() < 0.3 and turn != OPPOSITE_DIRECTIONS[direction]:
+            direction = turn
+        writer.record_direction(tick, direction)
+        if engine.move(direction)[2]:
+            engine.spawn_food()
+        snapshots.append(engine.snapshot())
+        if not engine.alive:
+            break
+    writer.close()
+    return snapshots
+
+
+def test_records_round_trip(tmp_path):
+    path = str(tmp_path / 'game2.replay')
+    writer = ReplayWriter(path, GAME2, 7, (8, 8, 0, 1))
+    records = [(tick, 1, tick % 4) for tick in range(FLUSH_INTERVAL + 10)]
+    for tick, _, value in records:
+        writer.record_direction(tick, ACTIONS[value])
+    writer.close()
+
+    reader = ReplayReader(path)
+    assert (reader.game, reader.seed, reader.params) == (GAME2, 7, (8, 8, 0, 1))
+    assert len(reader) == len(records)
+    assert list(reader) == records
+    assert reader[len(records) - 1] == records[-1]
+    with pytest.raises(IndexError):
+        reader[len(records)]
+    reader.close()
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / 'other.replay'
+    for data in (b'', b'GARP', b'XXXX' + bytes(40)):
+        path.write_bytes(data)
+        with pytest.raises(ValueError):
+            ReplayReader(str(path))
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_worm_replay_matches_recorded_game(tmp_path, seed):
+    path = str(tmp_path / 'game2.replay')
+    snapshots = record_worm(path, seed, 400)
+    replay = Replay.open(path, keyframe_interval=16)
+    replay.run()
+    assert replay.engine.snapshot()[:4] == snapshots[-1][:4]
+    # Backwards, forwards and across keyframes
+    for position in (len(snapshots) - 1, 0, 40, 17, 16, 3, len(snapshots) // 2):
+        replay.seek(position)
+        assert replay.engine.snapshot()[:4] == snapshots[position][:4]
+    replay.close()
+
+
+def record_autopilot(path: str, engine: WormEngine, seed: int) -> list:
+    """Records an autopilot game on engine, returns the snapshot after every tick"""
+    engine.new_game(seed)
+    engine.spawn_food()
+    autopilot = Autopilot(engine, time_budget=None)
+    writer = ReplayWriter(path, GAME2, seed, (6, 6, 0, 1))
+    direction = 'RIGHT'
+    snapshots = [engine.snapshot()]
+    for tick in range(2000):
+        direction = autopilot.decide(direction)
+        writer.record_direction(tick, direction)
+        if engine.move(direction)[2]:
+            engine.spawn_food()
+        snapshots.append(engine.snapshot())
+        if not engine.alive:
+            break
+    writer.close()
+    return snapshots
+
+
+def test_worm_replay_past_half_the_board(tmp_path):
+    # The same engine plays every session, like Game2 does
+    engine = WormEngine(6, 6, (0, 1))
+    for seed in range(3):
+        path = str(tmp_path / f'game2-{seed}.replay')
+        snapshots = record_autopilot(path, engine, seed)
+        assert max(len(snapshot[0]) for snapshot in snapshots) > 18
+        replay = Replay.open(path, keyframe_interval=16)
+        replay.run()
+        assert replay.engine.snapshot()[:4] == snapshots[-1][:4]
+        for position in range(len(snapshots) - 1, -1, -7):
+            replay.seek(position)
+            assert replay.engine.snapshot()[:4] == snapshots[position][:4]
+        replay.close()
+
+
+def test_card_replay_matches_recorded_game(tmp_path):
+    path = str(tmp_path / 'game1.replay')
+    engine = Game1Engine(100, 0, 100, source=CardSource(3))
+    engine.new_game(3)
+    writer = ReplayWriter(path, GAME1, 3, (100, 0, 100))
+    rng = random.Random(3)
+    snapshots = [engine.snapshot()]
+    for move in range(30):
+        card_index = rng.randrange(4)
+        writer.record_card(move, card_index)
+        done = engine.play(card_index)
+        snapshots.append(engine.snapshot())
+        if done:
+            break
+    writer.close()
+
+    replay = Replay.open(path, keyframe_interval=8)
+    replay.run()
+    assert replay.engine.snapshot() == snapshots[-1]
+    for position in (0, 9, 5, len(snapshots) - 1):
+        replay.seek(position)
+        assert replay.engine.snapshot() == snapshots[position]
+    replay.close()
+
+
+def test_context_managers_close(tmp_path):
+    path = str(tmp_path / 'game2.replay')
+    with ReplayWriter(path, GAME2, 1, (8, 8, 0, 1)) as writer:
+        writer.record_direction(0, 'DOWN')
+    assert writer.closed
+    with Replay.open(path) as replay:
+        replay.run()
+        assert len(replay) == 1
+    assert replay.reader.map is None
+
+
+def test_prune_keeps_the_newest_replays(tmp_path):
+    for index in range(5):
+        for game in ('game1', 'game2'):
+            path = tmp_path / f'{game}-{index}.replay'
+            path.write_bytes(b'')
+            os.utime(path, (index, index))
+    prune_replays(str(tmp_path), 'game2-', 2)
+    assert sorted(os.listdir(tmp_path)) == sorted(
+        [f'game1-{index}.replay' for index in range(5)]
+        + ['game2-3.replay', 'game2-4.replay']
+    )
+    prune_replays(str(tmp_path / 'missing'), 'game2-', 2)
@@ -0,0 +1,126 @@
+import struct
+
+import pytest
+
+from card_engine import Game1Engine
+from card_source import CardSource
+from savegame import (
+    GAME2_STATE,
+    HEADER,
+    pack_game1,
+    pack_game2,
+    restore_game1,
+    restore_game2,
+    unpack_game1,
+    unpack_game2,
+)
+from worm_engine import WormEngine
+
+
+def play_worm(seed: int, ticks: int) -> WormEngine:
+    engine = WormEngine(10, 10, seed=seed)
+    engine.spawn_food()
+    directions = ('RIGHT', 'DOWN', 'LEFT', 'DOWN')
+    for tick in range(ticks):
+        _, _, ate = engine.move(directions[tick // 4 % 4])
+        if not engine.alive:
+            break
+        if ate:
+            engine.spawn_food()
+    return engine
+
+
+def test_game1_round_trip():
+    engine = Game1Engine(source=CardSource(1))
+    engine.new_game(1)
+    for card_index in (0, 3, 2, 1, 3):
+        engine.play(card_index)
+    data = pack_game1(engine, 42)
+
+    restored = Game1Engine(source=CardSource(2))
+    restore_game1(restored, unpack_game1(data))
+    assert restored.current_score == engine.current_score
+    assert restored.current_highscore == engine.current_highscore
+    assert restored.moves == engine.moves
+    assert restored.get_hand() == engine.get_hand()
+
+
+@pytest.mark.parametrize('ticks', [0, 7, 60])
+def test_game2_round_trip(ticks):
+    engine = play_worm(3, ticks)
+    data = pack_game2(engine, 'DOWN', 0.3, 12.5, 4, ticks, 99)
+
+    restored = WormEngine(10, 10, seed=5)
+    state = unpack_game2(data)
+    restore_game2(restored, state)
+    assert state[2:9] == ('DOWN', engine.alive, engine.food, 0.3, 12.5, 4, ticks)
+    assert list(restored.body) == list(engine.body)
+    assert restored.food == engine.food
+    assert restored.alive == engine.alive
+    assert restored.pending_growth == engine.pending_growth
+    assert list(restored.occupied) == list(engine.occupied)
+
+
+def test_game2_dead_worm_stays_dead():
+    engine = WormEngine(10, 10, seed=0)
+    engine.alive = False
+    restored = WormEngine(10, 10, seed=0)
+    restore_game2(restored, unpack_game2(pack_game2(engine, 'UP', 0.7, 0, 0, 0, 0)))
+    assert not restored.alive
+
+
+def corrupt_body(data: bytes, body: list) -> bytes:
+    """Replaces the body of a Game 2 save"""
+    start = HEADER.size
+    values = list(GAME2_STATE.unpack_from(data, start))
+    values[-1] = len(body)
+    return (
+        data[:start] + GAME2_STATE.pack(*values) + struct.pack(f'<{len(body)}i', *body)
+    )
+
+
+@pytest.mark.parametrize('body', [[], [100], [-1], [5, 4, 5], [0, 1, 2, 1]], ids=str)
+def test_game2_rejects_bad_worm(body):
+    data = pack_game2(play_worm(0, 3), 'RIGHT', 0.7, 0, 0, 3, 0)
+    with pytest.raises(ValueError):
+        unpack_game2(corrupt_body(data, body))
+
+
+def test_game2_rejects_food_on_the_worm():
+    engine = play_worm(0, 3)
+    engine.food = engine.body[-1]
+    with pytest.raises(ValueError):
+        unpack_game2(pack_game2(engine, 'RIGHT', 0.7, 0, 0, 3, 0))
+
+
+def test_game2_body_is_little_endian():
+    engine = play_worm(0, 30)
+    data = pack_game2(engine, 'RIGHT', 0.7, 0, 0, 30, 0)
+    body = data[HEADER.size + GAME2_STATE.size :]
+    assert body == b''.join(cell.to_bytes(4, 'little') for cell in engine.body)
+
+
+def test_rejects_truncated_saves():
+    data = pack_game2(play_worm(0, 30), 'RIGHT', 0.7, 0, 0, 30, 0)
+    for length in range(len(data)):
+        with pytest.raises(ValueError):
+            unpack_game2(data[:length])
+    engine = Game1Engine(source=CardSource(1))
+    data = pack_game1(engine, 0)
+    for length in range(len(data)):
+        with pytest.raises(ValueError):
+            unpack_game1(data[:length])
+
+
+def test_rejects_other_game():
+    with pytest.raises(ValueError):
+        unpack_game1(pack_game2(play_worm(0, 3), 'RIGHT', 0.7, 0, 0, 3, 0))
+    with pytest.raises(ValueError):
+        unpack_game2(pack_game1(Game1Engine(source=CardSource(1)), 0))
+
+
+def test_game2_rejects_other_board_size():
+    data = pack_game2(play_worm(0, 3), 'RIGHT', 0.7, 0, 0, 3, 0)
+    engine = WormEngine(12, 10, seed=0)
+    with pytest.raises(ValueError):
+        restore_game2(engine, unpack_game2(data))
@@ -0,0 +1,109 @@
+import random
+import socket
+
+import pytest
+
+from spectator import SpectatorFeed, SpectatorView, pack_delta, pack_keyframe
+from worm_engine import ACTIONS, NO_CELL, WormEngine
+
+
+def play(seed: int, ticks: int, keyframe_interval=10):
+    """Plays a worm game, yields (frame, body, food, score, alive) after every tick"""
+    engine = WormEngine(8, 6, seed=seed)
+    engine.spawn_food()
+    rng = random.Random(seed)
+    score = 0
+    keyframe_tick = 0
+    yield pack_keyframe(0, engine, score), list(engine.body), engine.food, score, True
+    for tick in range(1, ticks + 1):
+        head, tail, ate = engine.move(rng.choice(ACTIONS))
+        if ate:
+            score += 1
+            engine.spawn_food()
+        # Like SpectatorFeed.publish_tick
+        if head != NO_CELL and tick - keyframe_tick >= keyframe_interval:
+            keyframe_tick = tick
+            frame = pack_keyframe(tick, engine, score)
+        else:
+            frame = pack_delta(tick, head, tail, engine.food, int(ate))
+        yield frame, list(engine.body), engine.food, score, engine.alive
+        if head == NO_CELL:
+            return
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_view_follows_the_game(seed):
+    view = SpectatorView()
+    for frame, body, food, score, alive in play(seed, 300):
+        assert view.feed(frame) == 1
+        assert list(view.body) == body
+        assert (view.food, view.score, view.alive) == (food, score, alive)
+
+
+def test_view_keeps_partial_frames():
+    frames = list(play(1, 200))
+    data = b''.join(frame for frame, *_ in frames)
+    view = SpectatorView()
+    rng = random.Random(0)
+    applied = 0
+    position = 0
+    while position < len(data):
+        size = rng.randrange(1, 40)
+        applied += view.feed(data[position : position + size])
+        position += size
+    assert applied == len(frames)
+    _, body, food, score, _ = frames[-1]
+    assert (list(view.body), view.food, view.score) == (body, food, score)
+    assert not view.buffer
+
+
+def test_view_waits_for_a_keyframe():
+    frames = [frame for frame, *_ in play(2, 30)]
+    view = SpectatorView()
+    # Joined after the first keyframe, the deltas before the next one are skipped
+    for frame in frames[1:10]:
+        view.feed(frame)
+        assert not view.synced
+    view.feed(frames[10])
+    assert view.synced and view.tick == 10
+
+
+def test_rejects_unknown_frames():
+    with pytest.raises(ValueError):
+        SpectatorView().feed(b'\x07' + bytes(20))
+
+
+def test_feed_sends_history_to_new_spectators():
+    engine = WormEngine(8, 6, seed=3)
+    engine.spawn_food()
+    feed = SpectatorFeed(0, keyframe_interval=5)
+    feed.start()
+    try:
+        score = 0
+        for tick in range(1, 13):
+            head, tail, ate = engine.move('RIGHT' if tick % 7 else 'DOWN')
+            score += ate
+            if ate:
+                engine.spawn_food()
+            feed.publish_tick(tick, engine, head, tail, score, int(ate))
+        view = SpectatorView()
+        with socket.create_connection(('127.0.0.1', feed.port), timeout=5) as sock:
+            while view.tick < 12:
+                view.feed(sock.recv(65536))
+    finally:
+        feed.stop()
+    assert list(view.body) == list(engine.body)
+    assert (view.food, view.score) == (engine.food, score)
+
+
+def test_feed_sends_game_over_as_delta():
+    engine = WormEngine(8, 6, seed=3)
+    feed = SpectatorFeed(0, keyframe_interval=1)
+    feed.publish_tick(1, engine, engine.head(), NO_CELL, 0, 0)
+    feed.publish_tick(2, engine, NO_CELL, NO_CELL, 0, 0)
+    view = SpectatorView()
+    for frame in feed.queue:
+        view.feed(frame)
+    assert view.synced and not view.alive
+    feed.start()
+    feed.stop()
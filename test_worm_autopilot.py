@@ -0,0 +1,46 @@
+from worm_autopilot import Autopilot
+from worm_engine import OPPOSITE_DIRECTIONS, WormEngine
+
+
+def play(engine: WormEngine, autopilot: Autopilot, ticks: int) -> int:
+    """Plays until the worm dies or ticks have passed, returns the food eaten"""
+    direction = 'RIGHT'
+    eaten = 0
+    engine.spawn_food()
+    for _ in range(ticks):
+        new_direction = autopilot.decide(direction)
+        assert new_direction != OPPOSITE_DIRECTIONS[direction]
+        direction = new_direction
+        _, _, ate = engine.move(direction)
+        if not engine.alive:
+            break
+        if ate:
+            eaten += 1
+            engine.spawn_food()
+    return eaten
+
+
+def test_autopilot_eats_on_a_small_board():
+    engine = WormEngine(10, 10, seed=1)
+    autopilot = Autopilot(engine, time_budget=None)
+    assert play(engine, autopilot, 2000) >= 30
+    assert autopilot.timeouts == 0
+
+
+def test_decisions_stay_within_the_time_budget():
+    engine = WormEngine(100, 100, seed=1)
+    autopilot = Autopilot(engine, time_budget=0.002)
+    slowest = 0.0
+    direction = 'RIGHT'
+    engine.spawn_food()
+    for _ in range(3000):
+        direction = autopilot.decide(direction)
+        slowest = max(slowest, autopilot.last_decision_time)
+        _, _, ate = engine.move(direction)
+        if not engine.alive:
+            break
+        if ate:
+            engine.spawn_food()
+    assert autopilot.timeouts > 0
+    # Room for the scheduler of a busy machine, unbounded searches take tens of ms
+    assert slowest < 0.015
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from worm_engine import ACTIONS, WormEngine
+from worm_env import VecWormEnv
+
+
+def env_body(env: VecWormEnv, row: int) -> list:
+    """Body cells of one env from the head to the tail"""
+    indices = (env.head_index[row] - np.arange(env.length[row])) % env.cells
+    return env.body[row, indices].tolist()
+
+
+def new_engine(env: VecWormEnv, row: int) -> WormEngine:
+    engine = WormEngine(env.board_width, env.board_height)
+    engine.food = int(env.food[row])
+    return engine
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_env_matches_worm_engine(seed):
+    env = VecWormEnv(16, 6, 5, seed=seed)
+    env.reset()
+    engines = [new_engine(env, row) for row in range(env.envs)]
+    rng = np.random.default_rng(seed)
+    games = 0
+    for _ in range(500):
+        # Mostly straight ahead, so the worms live long enough to eat
+        turns = rng.integers(0, 4, env.envs)
+        actions = np.where(rng.random(env.envs) < 0.7, env.direction, turns)
+        directions = np.where(
+            (actions + 2) % 4 == env.direction, env.direction, actions
+        )
+        _, rewards, dones, info = env.step(actions)
+        for row, engine in enumerate(engines):
+            _, _, ate = engine.move(ACTIONS[directions[row]])
+            assert dones[row] == (not engine.alive)
+            assert (rewards[row] == env.eat_reward) == ate
+            assert info['length'][row] == engine.length()
+            if dones[row]:
+                games += 1
+                engines[row] = new_engine(env, row)
+                continue
+            assert env_body(env, row) == list(engine.body)
+            assert env.occupied[row].tolist() == list(engine.occupied)
+            assert env.pending_growth[row] == engine.pending_growth
+            # The env places its own food, the engine takes it over
+            engine.food = int(env.food[row])
+    assert games > 0
+
+
+def test_reset_mask_only_resets_masked_envs():
+    env = VecWormEnv(4, 6, 6, seed=0)
+    env.reset()
+    for _ in range(3):
+        env.step(np.full(env.envs, ACTIONS.index('DOWN')))
+    env.reset(np.array([True, False, True, False]))
+    assert env.ticks.tolist() == [0, 3, 0, 3]
+    assert env.head[0] == env.start
+    assert env.head[1] != env.start
@@ -0,0 +1,26 @@
+import numpy as np
+
+from replay import Replay
+from worm_tournament import play, record_games, run_tournament
+
+
+def test_results_do_not_depend_on_the_chunks():
+    layouts = [
+        run_tournament('autopilot', 12, 5, 8, 8, 400, chunk_size, workers=1)
+        for chunk_size in (12, 5, 1)
+    ]
+    for results in layouts[1:]:
+        assert np.array_equal(results, layouts[0])
+    # Games past half of the board use the index of free cells
+    assert layouts[0][:, 1].max() > 32
+
+
+def test_recorded_games_replay_the_results(tmp_path):
+    seeds = [3, 8]
+    paths = record_games(str(tmp_path), 'autopilot', seeds, 8, 8, 400)
+    for seed, path in zip(seeds, paths):
+        _, length, ticks = play(8, 8, 'autopilot', seed, 400)
+        replay = Replay.open(path)
+        replay.run()
+        assert (len(replay), replay.engine.length()) == (ticks, length)
+        replay.close()
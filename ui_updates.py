@@ -0,0 +1,110 @@
+import tkinter as tk
+import weakref
+from logging import error
+
+from metrics import METRICS
+
+
+class WidgetUpdates:
+    def __init__(self, metrics=METRICS) -> None:
+        """
+        # Widget updates
+        Collects widget option changes and applies them in one idle callback,
+        so a click or a tick configures every widget at most once.
+        Changes to the value a widget already shows are dropped, and when an option
+        is changed many times before the callback only the last value is applied.
+        ### Metrics:
+        - ui.requests: options passed to configure()
+        - ui.dropped: options dropped because the widget already showed the value
+        - tk.widget_updates: configure calls made to Tk
+        - ui.requests_per_flush, ui.tk_calls_per_flush: histograms per idle callback
+        """
+        self.metrics = metrics
+        # widget -> {option: value} waiting for the idle callback
+        self.pending: dict = {}
+        # widget -> {option: value} last applied or given to remember()
+        self.applied = weakref.WeakKeyDictionary()
+        # widget -> configure(widget, **options) used instead of widget.configure
+        self.configure_functions = weakref.WeakKeyDictionary()
+        self.after_id = None
+        # Root window of the idle callback, it lives as long as the app
+        self.root = None
+        self.requests = 0
+
+    def remember(self, widget, **options) -> None:
+        """Tells the options a widget was created with, so repeating them is dropped"""
+        self.applied.setdefault(widget, {}).update(options)
+
+    def set_configure(self, widget, configure) -> None:
+        """Applies the changes of widget with configure(widget, **options)"""
+        self.configure_functions[widget] = configure
+
+    def configure(self, widget, **options) -> None:
+        """Configures widget on the next idle callback"""
+        self.requests += len(options)
+        self.metrics.increment('ui.requests', len(options))
+        pending = self.pending.get(widget)
+        applied = self.applied.get(widget)
+        for option, value in options.items():
+            if pending is not None and option in pending:
+                pending[option] = value
+            elif applied is not None and applied.get(option, self) == value:
+                self.metrics.increment('ui.dropped')
+            else:
+                if pending is None:
+                    pending = self.pending[widget] = {}
+                pending[option] = value
+        if self.pending and self.after_id is None:
+            # Callbacks scheduled on a widget are deleted with the widget
+            self.root = widget.nametowidget('.')
+            self.after_id = self.root.after_idle(self.flush)
+
+    def get(self, widget, option: str):
+        """Returns the value widget shows after the next idle callback"""
+        pending = self.pending.get(widget)
+        if pending is not None and option in pending:
+            return pending[option]
+        return widget.cget(option)
+
+    def flush(self) -> None:
+        """Applies the pending changes now, also called by the idle callback"""
+        if self.after_id is not None:
+            try:
+                self.root.after_cancel(self.after_id)
+            except tk.TclError:
+                pass
+        self.after_id = None
+        self.root = None
+        pending = self.pending
+        self.pending = {}
+        calls = 0
+        for widget, options in pending.items():
+            applied = self.applied.setdefault(widget, {})
+            # Changed and changed back before the callback
+            changes = {
+                option: value
+                for option, value in options.items()
+                if applied.get(option, self) != value
+            }
+            if not changes:
+                self.metrics.increment('ui.dropped', len(options))
+                continue
+            configure = self.configure_functions.get(widget)
+            try:
+                if configure is None:
+                    widget.configure(**changes)
+                else:
+                    configure(widget, **changes)
+            except tk.TclError as e:
+                error(e)
+                continue
+            applied.update(changes)
+            calls += 1
+        self.metrics.increment('tk.widget_updates', calls)
+        self.metrics.observe('ui.requests_per_flush', self.requests)
+        self.metrics.observe('ui.tk_calls_per_flush', calls)
+        self.requests = 0
+
+
+# Widget updates of the app, the widgets of both games are configured through this
+UPDATES = WidgetUpdates()
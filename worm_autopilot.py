@@ -0,0 +1,349 @@
+import time
+from array import array
+from collections import deque
+from heapq import heappop, heappush
+
+from worm_engine import ACTIONS, DIRECTIONS, NO_CELL
+
+# How many cells are searched between clock checks, a check costs about as much as
+# searching one cell
+CLOCK_CHECK_INTERVAL = 32
+
+# Shares of the time budget that have passed when the food search and the tail search
+# stop, the rest is kept for counting the room of the directions
+FOOD_SEARCH_SHARE = 0.5
+TAIL_SEARCH_SHARE = 0.75
+
+
+def build_neighbors(board_width: int, board_height: int) -> array:
+    """Returns the 4 neighbors of every cell in ACTIONS order, borders wrap around"""
+    neighbors = array('i', [0]) * (4 * board_width * board_height)
+    diffs = [DIRECTIONS[action] for action in ACTIONS]
+    index = 0
+    for row in range(board_height):
+        for column in range(board_width):
+            for row_diff, column_diff in diffs:
+                neighbors[index] = ((row + row_diff) % board_height) * board_width + (
+                    column + column_diff
+                ) % board_width
+                index += 1
+    return neighbors
+
+
+class Autopilot:
+    def __init__(self, engine, time_budget=0.01) -> None:
+        """
+        # Autopilot
+        Steers the worm of a WormEngine to the food with A* search over the
+        wrap-around board, the heuristic is the wrapped Manhattan distance.
+        A path to the food is only taken when the tail can still be reached from
+        the food after the worm has followed it, otherwise the worm follows its tail
+        or moves to the neighbor with the most reachable cells.
+        The search reads the occupancy that the engine keeps up to date every move.
+        Search marks and the planned worm are stamped with a search number instead of
+        cleared, and a path is followed until the food moves, so most ticks do not
+        search at all.
+        The food is searched from the food to the head, so food in a closed pocket
+        is given up after searching the pocket instead of the rest of the board.
+        ### Parameters:
+        - time_budget: seconds a decision may search, every search checks the clock.
+          A path search that runs out of its share counts as not found, the
+          directions share the rest of the budget for counting their room
+        ### Attributes:
+        - last_decision_time: seconds spent in the last decide()
+        - decisions, searches: decide() calls and searches for a new path
+        - timeouts: decisions that ran out of time_budget
+        """
+        self.engine = engine
+        self.time_budget = time_budget
+        cells = engine.board_width * engine.board_height
+        self.neighbors = build_neighbors(engine.board_width, engine.board_height)
+        self.visited = array('i', [0]) * cells
+        self.costs = array('i', [0]) * cells
+        self.parents = array('i', [0]) * cells
+        self.stamp = 0
+        # Cells of the worm after following a planned path, see tail_reachable_after()
+        self.planned = array('i', [0]) * cells
+        self.planned_stamp = 0
+        # Cells the head enters next and the food they lead to
+        self.plan: deque = deque()
+        self.plan_food = NO_CELL
+        self.last_decision_time = 0.0
+        self.decisions = 0
+        self.searches = 0
+        self.timeouts = 0
+        # Deadline of the running search and of the whole decision
+        self.decision_started = 0.0
+        self.deadline = None
+        self.decision_deadline = None
+        self.timed_out = False
+
+    def reset(self) -> None:
+        self.plan.clear()
+        self.plan_food = NO_CELL
+
+    # Searching is fast enough to do on the tick, see MCTSPlanner.prepare()
+    def prepare(self, direction: str, time_budget: float) -> None:
+        pass
+
+    # Nothing runs in the background, see MCTSPlanner.close()
+    def close(self) -> None:
+        pass
+
+    def decide(self, current_direction: str) -> str:
+        """Returns the direction of the next move, never the opposite of current_direction"""
+        started = self.decision_started = time.perf_counter()
+        self.set_deadline(FOOD_SEARCH_SHARE)
+        if self.time_budget is not None:
+            self.decision_deadline = started + self.time_budget
+        self.timed_out = False
+        direction = self._decide(current_direction)
+        if self.timed_out:
+            self.timeouts += 1
+        self.last_decision_time = time.perf_counter() - started
+        self.decisions += 1
+        return direction
+
+    def set_deadline(self, share: float) -> None:
+        """Lets the next searches run until share of the time budget has passed"""
+        if self.time_budget is None:
+            self.deadline = None
+        else:
+            self.deadline = self.decision_started + self.time_budget * share
+
+    def _decide(self, current_direction: str) -> str:
+        engine = self.engine
+        head = engine.head()
+        tail = engine.tail()
+        occupied = engine.occupied
+        growing = engine.pending_growth > 0
+        # The tail leaves its cell on the same tick unless the worm is growing
+        open_cell = NO_CELL if growing else tail
+        # Turning back is not allowed, see Game2.check_valid_movement()
+        reverse = ACTIONS.index(current_direction) ^ 2
+        reverse_cell = self.neighbors[head * 4 + reverse]
+
+        if self.plan and self.plan_food == engine.food and engine.food != NO_CELL:
+            next_cell = self.plan[0]
+            if next_cell != reverse_cell and (
+                not occupied[next_cell] or next_cell == open_cell
+            ):
+                self.plan.popleft()
+                return self.get_direction(head, next_cell)
+        self.plan.clear()
+
+        if engine.food != NO_CELL:
+            self.searches += 1
+            path = self.find_path(
+                engine.food, head, occupied, open_cell, (reverse_cell, head)
+            )
+            if path:
+                # From the head to the food
+                path = path[-2::-1] + [engine.food]
+            if path and self.tail_reachable_after(path):
+                self.plan.extend(path)
+                self.plan_food = engine.food
+                return self.get_direction(head, self.plan.popleft())
+
+        if not growing and head != tail:
+            self.set_deadline(TAIL_SEARCH_SHARE)
+            path = self.find_path(head, tail, occupied, NO_CELL, (head, reverse_cell))
+            if path:
+                return self.get_direction(head, path[0])
+
+        return self.get_roomiest_direction(
+            head, occupied, open_cell, reverse, current_direction
+        )
+
+    def get_direction(self, head: int, cell: int) -> str:
+        base = head * 4
+        for action in range(4):
+            if self.neighbors[base + action] == cell:
+                return ACTIONS[action]
+        raise ValueError(f'Cell {cell} is not next to the head {head}')
+
+    def find_path(
+        self,
+        start: int,
+        goal: int,
+        occupied,
+        open_cell=NO_CELL,
+        blocked_move=None,
+        mark=1,
+    ) -> list | None:
+        """
+        Returns the cells of a shortest path from start to goal without start,
+        None when goal can't be reached or the deadline of the decision passed.
+        Cells where occupied is mark are occupied.
+        goal and open_cell can be entered even when they are occupied,
+        blocked_move is a (from, to) pair of cells that is never moved between
+        """
+        if start == goal:
+            return []
+        self.stamp += 1
+        stamp = self.stamp
+        visited = self.visited
+        costs = self.costs
+        parents = self.parents
+        neighbors = self.neighbors
+        width = self.engine.board_width
+        height = self.engine.board_height
+        goal_row, goal_column = divmod(goal, width)
+        blocked_from, blocked_to = blocked_move or (NO_CELL, NO_CELL)
+        deadline = self.deadline
+        nodes = 0
+
+        visited[start] = stamp
+        costs[start] = 0
+        heap = [(0, 0, start)]
+        while heap:
+            _, negative_cost, cell = heappop(heap)
+            cost = -negative_cost
+            nodes += 1
+            if cost > costs[cell]:
+                continue
+            if cell == goal:
+                return self.get_path(start, goal)
+            if (
+                deadline is not None
+                and nodes % CLOCK_CHECK_INTERVAL == 0
+                and time.perf_counter() > deadline
+            ):
+                self.timed_out = True
+                return None
+            next_cost = cost + 1
+            base = cell * 4
+            for index in range(base, base + 4):
+                next_cell = neighbors[index]
+                if (
+                    occupied[next_cell] == mark
+                    and next_cell != goal
+                    and next_cell != open_cell
+                ):
+                    continue
+                if cell == blocked_from and next_cell == blocked_to:
+                    continue
+                if visited[next_cell] == stamp and costs[next_cell] <= next_cost:
+                    continue
+                visited[next_cell] = stamp
+                costs[next_cell] = next_cost
+                parents[next_cell] = cell
+                row, column = divmod(next_cell, width)
+                row_distance = abs(row - goal_row)
+                column_distance = abs(column - goal_column)
+                estimate = (
+                    next_cost
+                    + min(row_distance, height - row_distance)
+                    + min(column_distance, width - column_distance)
+                )
+                # Ties go to the deeper cell, it is closer to the goal
+                heappush(heap, (estimate, -next_cost, next_cell))
+        return None
+
+    def get_path(self, start: int, goal: int) -> list:
+        path = [goal]
+        parents = self.parents
+        cell = parents[goal]
+        while cell != start:
+            path.append(cell)
+            cell = parents[cell]
+        path.reverse()
+        return path
+
+    def tail_reachable_after(self, path: list) -> bool:
+        """True when the tail can be reached from the end of path after the worm has followed it"""
+        engine = self.engine
+        body = engine.body
+        length = len(body)
+        moves = len(path)
+        grown = min(engine.pending_growth, moves)
+        new_length = length + grown
+        kept = max(0, length - (moves - grown))
+        new_body = path[::-1]
+        for index in range(min(kept, new_length - len(new_body))):
+            new_body.append(body[index])
+        del new_body[new_length:]
+        # A worm this short can't block its own way
+        if new_length < 4:
+            return True
+        self.planned_stamp += 1
+        mark = self.planned_stamp
+        planned = self.planned
+        for cell in new_body:
+            planned[cell] = mark
+        # Room for the whole worm is safe without searching the tail, the tail has
+        # left its cells before the worm runs out of them. Stops after new_length cells
+        count = self.count_reachable(
+            new_body[0], planned, limit=new_length + 1, mark=mark
+        )
+        if count > new_length:
+            return True
+        if self.timed_out:
+            return False
+        # The region is small, so the search of the tail is short.
+        # The worm grows after eating, so the tail can't be entered on the next move
+        path = self.find_path(new_body[0], new_body[-1], planned, mark=mark)
+        return path is not None and len(path) > 1
+
+    def count_reachable(
+        self, start: int, occupied, open_cell=NO_CELL, limit=None, mark=1
+    ) -> int:
+        """
+        Counts the free cells reachable from start, stops at limit or when the
+        deadline of the decision passed. Cells where occupied is mark are occupied
+        """
+        if limit is None:
+            limit = len(occupied)
+        self.stamp += 1
+        stamp = self.stamp
+        visited = self.visited
+        neighbors = self.neighbors
+        deadline = self.deadline
+        visited[start] = stamp
+        queue = deque((start,))
+        count = 0
+        while queue and count < limit:
+            cell = queue.popleft()
+            count += 1
+            if (
+                deadline is not None
+                and count % CLOCK_CHECK_INTERVAL == 0
+                and time.perf_counter() > deadline
+            ):
+                self.timed_out = True
+                break
+            base = cell * 4
+            for index in range(base, base + 4):
+                next_cell = neighbors[index]
+                if visited[next_cell] != stamp and (
+                    occupied[next_cell] != mark or next_cell == open_cell
+                ):
+                    visited[next_cell] = stamp
+                    queue.append(next_cell)
+        return count
+
+    def get_roomiest_direction(
+        self, head: int, occupied, open_cell: int, reverse: int, current_direction: str
+    ) -> str:
+        """Returns the safe direction with the most reachable cells, current_direction if none"""
+        best_direction = current_direction
+        best_count = -1
+        # Room for the whole worm is enough, the rest of the region is not counted
+        limit = 2 * self.engine.length() + 16
+        moves = []
+        for action in range(4):
+            cell = self.neighbors[head * 4 + action]
+            if action != reverse and (not occupied[cell] or cell == open_cell):
+                moves.append((action, cell))
+        for index, (action, cell) in enumerate(moves):
+            if self.decision_deadline is not None:
+                # The directions left share the rest of the budget equally
+                now = time.perf_counter()
+                self.deadline = now + (self.decision_deadline - now) / (
+                    len(moves) - index
+                )
+            count = self.count_reachable(cell, occupied, open_cell, limit)
+            if count > best_count:
+                best_direction = ACTIONS[action]
+                best_count = count
+        return best_direction
@@ -0,0 +1,280 @@
+import random
+from array import array
+from collections import deque
+
+DIRECTIONS = {
+    'UP': (-1, 0),
+    'DOWN': (1, 0),
+    'LEFT': (0, -1),
+    'RIGHT': (0, 1),
+}
+
+OPPOSITE_DIRECTIONS = {
+    'UP': 'DOWN',
+    'DOWN': 'UP',
+    'LEFT': 'RIGHT',
+    'RIGHT': 'LEFT',
+}
+
+# Direction codes used by worm_env and replays, the opposite of code n is (n + 2) % 4
+ACTIONS = ('UP', 'RIGHT', 'DOWN', 'LEFT')
+
+# Returned as the freed tail cell when the worm grew instead of moving its tail
+NO_CELL = -1
+
+# Random cells tried for the food before falling back to the index of free cells
+FOOD_SPAWN_ATTEMPTS = 64
+
+# Maps occupancy bytes to free bytes, see FreeCells.from_occupancy()
+FREE_BYTES = bytes([1]) + bytes(255)
+
+
+class FreeCells:
+    def __init__(self, size: int) -> None:
+        """
+        Set of free cells that supports add, remove and random choice in O(log size).
+        choice() takes the k-th free cell in cell order, so the food depends only on
+        which cells are free and the random number, not on the order of earlier moves.
+        Replays and restored snapshots rely on that.
+        tree is a Fenwick tree of the free cell counts, tree[i] counts the free cells
+        in (i - (i & -i), i]
+        """
+        self.free = bytearray(b'\x01') * size
+        self.build()
+
+    @classmethod
+    def from_occupancy(cls, occupied: bytearray) -> 'FreeCells':
+        free_cells = cls(0)
+        free_cells.free = occupied.translate(FREE_BYTES)
+        free_cells.build()
+        return free_cells
+
+    def build(self) -> None:
+        free = self.free
+        size = len(free)
+        self.count = free.count(1)
+        tree = array('i', [0]) * (size + 1)
+        for i in range(1, size + 1):
+            tree[i] += free[i - 1]
+            parent = i + (i & -i)
+            if parent <= size:
+                tree[parent] += tree[i]
+        self.tree = tree
+        # Highest power of two up to size, the first step of choice()
+        self.top = 1 << size.bit_length() >> 1
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __contains__(self, cell: int) -> bool:
+        return self.free[cell] == 1
+
+    def update(self, cell: int, change: int) -> None:
+        tree = self.tree
+        size = len(tree) - 1
+        i = cell + 1
+        while i <= size:
+            tree[i] += change
+            i += i & -i
+
+    def add(self, cell: int) -> None:
+        if self.free[cell]:
+            return
+        self.free[cell] = 1
+        self.count += 1
+        self.update(cell, 1)
+
+    def remove(self, cell: int) -> None:
+        if not self.free[cell]:
+            return
+        self.free[cell] = 0
+        self.count -= 1
+        self.update(cell, -1)
+
+    def choice(self, rng) -> int:
+        """Returns the k-th free cell for a random k"""
+        k = int(rng.random() * self.count)
+        tree = self.tree
+        size = len(tree) - 1
+        # Largest position whose first position cells hold at most k free cells
+        position = 0
+        step = self.top
+        while step:
+            next_position = position + step
+            if next_position <= size and tree[next_position] <= k:
+                position = next_position
+                k -= tree[next_position]
+            step >>= 1
+        return position
+
+
+class WormEngine:
+    def __init__(
+        self, board_width=10, board_height=10, start=(0, 1), seed=None
+    ) -> None:
+        """
+        # Worm rules
+        Display-free version of the worm. Cells are numbered row * board_width + column.
+        The body is a deque of cells with the head on the left and every cell on
+        the board has an occupancy byte, so moving, growing and checking
+        self-collision cost the same no matter how long the worm is.
+        ### Parameters:
+        - board_width, board_height: size of the board, the worm wraps around the borders
+        - start: (row, column) of the worm at the start
+        - seed: seed of the random generator that places the food
+        """
+        self.board_width = board_width
+        self.board_height = board_height
+        self.start = start
+        self.body: deque = deque()
+        # One byte per cell, zeroed up front: a 20000x20000 board takes 400 MB
+        self.occupied = bytearray(board_width * board_height)
+        # Built when the worm fills half of the board, see spawn_food()
+        self.free_cells = None
+        self.rng = random.Random(seed)
+        self.food = NO_CELL
+        self.pending_growth = 0
+        self.alive = True
+        self.reset()
+
+    def reset(self) -> None:
+        free_cells = self.free_cells
+        for cell in self.body:
+            self.occupied[cell] = 0
+            if free_cells is not None:
+                free_cells.add(cell)
+        self.body.clear()
+        start = self.cell(*self.start)
+        self.body.append(start)
+        self.occupied[start] = 1
+        if free_cells is not None:
+            free_cells.remove(start)
+        self.pending_growth = 0
+        self.alive = True
+
+    def new_game(self, seed=None) -> None:
+        """Resets the worm and reseeds the food, same seed and moves play the same game"""
+        self.reset()
+        self.food = NO_CELL
+        if seed is not None:
+            self.rng.seed(seed)
+
+    def cell(self, row: int, column: int) -> int:
+        return row * self.board_width + column
+
+    def position(self, cell: int) -> tuple:
+        """Returns (row, column) of a cell"""
+        return divmod(cell, self.board_width)
+
+    def head(self) -> int:
+        return self.body[0]
+
+    def tail(self) -> int:
+        return self.body[-1]
+
+    def length(self) -> int:
+        return len(self.body)
+
+    def is_free(self, cell: int) -> bool:
+        return not self.occupied[cell]
+
+    def next_cell(self, direction: str) -> int:
+        """Cell the head moves to in direction, wraps around the borders"""
+        row, column = divmod(self.body[0], self.board_width)
+        row_diff, column_diff = DIRECTIONS[direction]
+        row = (row + row_diff) % self.board_height
+        column = (column + column_diff) % self.board_width
+        return row * self.board_width + column
+
+    def grow(self, amount=1) -> None:
+        """The tail stays in place for the next amount moves"""
+        self.pending_growth += amount
+
+    def move(self, direction: str) -> tuple:
+        """
+        Moves the head one cell to direction.
+        Returns (head, tail, ate):
+        - head: cell the head entered
+        - tail: cell the tail left, NO_CELL when the worm grew
+        - ate: True when the head entered the food cell, the worm grows on the next move
+        The worm does not move when it would collide with itself, alive is set to False
+        and (NO_CELL, NO_CELL, False) is returned
+        """
+        head = self.next_cell(direction)
+        body = self.body
+        occupied = self.occupied
+        free_cells = self.free_cells
+        growing = self.pending_growth > 0
+        # Moving into the cell the tail leaves on the same tick is allowed
+        if occupied[head] and (growing or head != body[-1]):
+            self.alive = False
+            return NO_CELL, NO_CELL, False
+
+        if growing:
+            self.pending_growth -= 1
+            tail = NO_CELL
+        else:
+            tail = body.pop()
+            occupied[tail] = 0
+            if free_cells is not None:
+                free_cells.add(tail)
+        body.appendleft(head)
+        occupied[head] = 1
+        if free_cells is not None:
+            free_cells.remove(head)
+
+        ate = head == self.food
+        if ate:
+            self.food = NO_CELL
+            self.pending_growth += 1
+        return head, tail, ate
+
+    def snapshot(self) -> tuple:
+        """Returns the state of the game, restore() brings it back"""
+        return (
+            tuple(self.body),
+            self.food,
+            self.pending_growth,
+            self.alive,
+            self.rng.getstate(),
+        )
+
+    def restore(self, snapshot: tuple) -> None:
+        """Brings back a snapshot(), costs the length of the old and the new worm"""
+        body, self.food, self.pending_growth, self.alive, rng_state = snapshot
+        free_cells = self.free_cells
+        for cell in self.body:
+            self.occupied[cell] = 0
+            if free_cells is not None:
+                free_cells.add(cell)
+        self.body = deque(body)
+        for cell in body:
+            self.occupied[cell] = 1
+            if free_cells is not None:
+                free_cells.remove(cell)
+        self.rng.setstate(rng_state)
+
+    def spawn_food(self) -> int:
+        """
+        Places the food to a random free cell and returns the cell,
+        NO_CELL when the worm fills the whole board.
+        While the worm fills less than half of the board random cells are tried,
+        after that the index of free cells is built once and kept up to date
+        """
+        size = len(self.occupied)
+        # Depends only on the length so replays draw the same random numbers
+        if len(self.body) * 2 < size:
+            rand = self.rng.random
+            for _ in range(FOOD_SPAWN_ATTEMPTS):
+                cell = int(rand() * size)
+                if not self.occupied[cell]:
+                    self.food = cell
+                    return cell
+        if self.free_cells is None:
+            self.free_cells = FreeCells.from_occupancy(self.occupied)
+
+        if not self.free_cells:
+            self.food = NO_CELL
+        else:
+            self.food = self.free_cells.choice(self.rng)
+        return self.food
@@ -0,0 +1,191 @@
+import numpy as np
+
+from worm_engine import ACTIONS, DIRECTIONS
+
+_ROW_DIFF = np.array([DIRECTIONS[action][0] for action in ACTIONS], np.int32)
+_COLUMN_DIFF = np.array([DIRECTIONS[action][1] for action in ACTIONS], np.int32)
+
+# Values of the cells in grid observations
+GRID_EMPTY = 0
+GRID_BODY = 1
+GRID_HEAD = 2
+GRID_FOOD = 3
+
+# Random cells tried per env before searching the free cells of the env
+FOOD_SPAWN_ATTEMPTS = 8
+
+
+class VecWormEnv:
+    def __init__(
+        self,
+        envs: int,
+        board_width=10,
+        board_height=10,
+        start=(0, 1),
+        seed=None,
+        observation='features',
+        eat_reward=1.0,
+        death_reward=-1.0,
+    ) -> None:
+        """
+        # Vectorized worm environment
+        Runs envs independent worm games with the Game2 rules: borders wrap around,
+        turning to the opposite direction is ignored and the game ends when the
+        head hits the body. Growth works like in WormEngine, the tail stays in
+        place on the move after eating.
+        Finished envs are reset automatically, like gym vector environments.
+        ### State arrays:
+        - head: (envs,) head cell, cells are row * board_width + column
+        - direction: (envs,) current action, see ACTIONS
+        - body: (envs, cells) ring buffer of the body cells
+        - head_index, tail_index: (envs,) position of the head and the tail in body
+        - length: (envs,) length of the worm
+        - pending_growth: (envs,) moves left where the tail stays in place
+        - occupied: (envs, cells) 1 where the body is
+        - food: (envs,) food cell, -1 when the board is full
+        - score, ticks: (envs,) eaten food and moves of the current game
+        ### Parameters:
+        - observation: 'features' returns (envs, 6) int32 rows of
+          head row, head column, food row, food column, direction and length.
+          'grid' returns (envs, board_height, board_width) int8 boards, see GRID_*
+        - eat_reward, death_reward: reward of eating food and of colliding
+        """
+        self.envs = envs
+        self.board_width = board_width
+        self.board_height = board_height
+        self.cells = board_width * board_height
+        self.start = start[0] * board_width + start[1]
+        self.observation = observation
+        self.eat_reward = eat_reward
+        self.death_reward = death_reward
+        self.rng = np.random.default_rng(seed)
+        self._rows = np.arange(envs)
+        self._row_offsets = self._rows * self.cells
+
+        self.head = np.empty(envs, np.int32)
+        self.direction = np.empty(envs, np.int8)
+        self.body = np.zeros((envs, self.cells), np.int32)
+        self.head_index = np.empty(envs, np.int32)
+        self.tail_index = np.empty(envs, np.int32)
+        self.length = np.empty(envs, np.int32)
+        self.pending_growth = np.empty(envs, np.int32)
+        self.occupied = np.zeros((envs, self.cells), np.uint8)
+        self.food = np.empty(envs, np.int32)
+        self.score = np.empty(envs, np.int32)
+        self.ticks = np.empty(envs, np.int32)
+
+    def reset(self, mask=None) -> np.ndarray:
+        """Resets all envs, or only the envs where mask is True. Returns observations"""
+        rows = self._rows if mask is None else np.flatnonzero(mask)
+        self._reset_rows(rows)
+        return self.get_observations()
+
+    def _reset_rows(self, rows: np.ndarray) -> None:
+        if len(rows) == 0:
+            return
+        self.occupied[rows] = 0
+        self.occupied[rows, self.start] = 1
+        self.body[rows, 0] = self.start
+        self.head[rows] = self.start
+        self.head_index[rows] = 0
+        self.tail_index[rows] = 0
+        self.length[rows] = 1
+        self.pending_growth[rows] = 0
+        self.direction[rows] = ACTIONS.index('RIGHT')
+        self.score[rows] = 0
+        self.ticks[rows] = 0
+        self._spawn_food(rows)
+
+    def _spawn_food(self, rows: np.ndarray) -> None:
+        occupied = self.occupied.reshape(-1)
+        remaining = rows
+        for _ in range(FOOD_SPAWN_ATTEMPTS):
+            if len(remaining) == 0:
+                return
+            cells = self.rng.integers(0, self.cells, len(remaining), np.int32)
+            free = occupied[remaining * self.cells + cells] == 0
+            self.food[remaining[free]] = cells[free]
+            remaining = remaining[~free]
+        for row in remaining:
+            free_cells = np.flatnonzero(self.occupied[row] == 0)
+            if len(free_cells) == 0:
+                self.food[row] = -1
+            else:
+                self.food[row] = free_cells[self.rng.integers(len(free_cells))]
+
+    def step(self, actions) -> tuple:
+        """
+        Moves every worm once. actions[i] is the action of env i, see ACTIONS.
+        Returns (observations, rewards, dones, info):
+        - rewards: (envs,) float32
+        - dones: (envs,) bool, True where the game ended. These envs have been reset
+          and their observation is the first one of the next game
+        - info: {'score': (envs,), 'length': (envs,), 'ticks': (envs,)} of the games
+          before the reset
+        """
+        actions = np.asarray(actions, np.int8)
+        # Turning back is ignored like in Game2.check_valid_movement()
+        reverse = (actions + 2) % 4 == self.direction
+        direction = np.where(reverse, self.direction, actions)
+        self.direction[:] = direction
+
+        row, column = np.divmod(self.head, self.board_width)
+        row = (row + _ROW_DIFF[direction]) % self.board_height
+        column = (column + _COLUMN_DIFF[direction]) % self.board_width
+        head = row * self.board_width + column
+
+        occupied = self.occupied.reshape(-1)
+        offsets = self._row_offsets
+        tail = self.body[self._rows, self.tail_index]
+        growing = self.pending_growth > 0
+        # Moving into the cell the tail leaves on the same tick is allowed
+        dones = (occupied[offsets + head] == 1) & (growing | (head != tail))
+        alive = ~dones
+
+        moving_tail = alive & ~growing
+        occupied[offsets[moving_tail] + tail[moving_tail]] = 0
+        self.tail_index[moving_tail] = (self.tail_index[moving_tail] + 1) % self.cells
+        growing_alive = alive & growing
+        self.pending_growth[growing_alive] -= 1
+        self.length[growing_alive] += 1
+
+        self.head_index[alive] = (self.head_index[alive] + 1) % self.cells
+        self.body[self._rows[alive], self.head_index[alive]] = head[alive]
+        occupied[offsets[alive] + head[alive]] = 1
+        self.head[alive] = head[alive]
+        self.ticks += 1
+
+        ate = alive & (head == self.food)
+        self.pending_growth[ate] += 1
+        self.score[ate] += 1
+        rewards = np.zeros(self.envs, np.float32)
+        rewards[ate] = self.eat_reward
+        rewards[dones] = self.death_reward
+        if ate.any():
+            self._spawn_food(np.flatnonzero(ate))
+
+        info = {
+            'score': self.score.copy(),
+            'length': self.length.copy(),
+            'ticks': self.ticks.copy(),
+        }
+        if dones.any():
+            self._reset_rows(np.flatnonzero(dones))
+        return self.get_observations(), rewards, dones, info
+
+    def get_observations(self) -> np.ndarray:
+        if self.observation == 'grid':
+            return self.get_grid()
+        head_row, head_column = np.divmod(self.head, self.board_width)
+        food_row, food_column = np.divmod(self.food, self.board_width)
+        return np.stack(
+            [head_row, head_column, food_row, food_column, self.direction, self.length],
+            axis=1,
+        ).astype(np.int32)
+
+    def get_grid(self) -> np.ndarray:
+        grid = self.occupied.astype(np.int8)
+        grid[self._rows, self.head] = GRID_HEAD
+        has_food = self.food >= 0
+        grid[self._rows[has_food], self.food[has_food]] = GRID_FOOD
+        return grid.reshape(self.envs, self.board_height, self.board_width)
@@ -0,0 +1,339 @@
+import math
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from worm_engine import ACTIONS, NO_CELL, WormEngine
+
+# Engines of the worker processes by (board_width, board_height, start), built once
+_ENGINES: dict = {}
+
+
+class Node:
+    __slots__ = ('children', 'direction', 'value', 'visits')
+
+    def __init__(self, direction: str) -> None:
+        self.direction = direction
+        self.children: dict = {}
+        self.visits = 0
+        self.value = 0.0
+
+
+def get_engine(board_width: int, board_height: int, start: tuple) -> WormEngine:
+    key = (board_width, board_height, start)
+    engine = _ENGINES.get(key)
+    if engine is None:
+        engine = _ENGINES[key] = WormEngine(board_width, board_height, start)
+    return engine
+
+
+def get_actions(direction: str) -> list:
+    """Directions the worm can turn to, turning back is not allowed"""
+    reverse = ACTIONS.index(direction) ^ 2
+    return [action for index, action in enumerate(ACTIONS) if index != reverse]
+
+
+def get_distance(engine: WormEngine, cell: int, other: int) -> int:
+    """Manhattan distance of two cells on the wrap-around board"""
+    row, column = divmod(cell, engine.board_width)
+    other_row, other_column = divmod(other, engine.board_width)
+    rows = abs(row - other_row)
+    columns = abs(column - other_column)
+    return min(rows, engine.board_height - rows) + min(
+        columns, engine.board_width - columns
+    )
+
+
+class TreeSearch:
+    def __init__(
+        self,
+        engine: WormEngine,
+        rng: random.Random,
+        exploration=1.4,
+        rollout_depth=30,
+        discount=0.95,
+        greedy=0.7,
+    ) -> None:
+        """
+        # Tree search
+        Monte Carlo tree search of one process. Every iteration restores the root state
+        of the engine and replays the moves of the tree, so the rules are the rules of
+        WormEngine.move(): the borders wrap around and colliding ends the game.
+        ### Parameters:
+        - exploration: UCT exploration constant
+        - rollout_depth: moves played after the tree before the rollout is scored
+        - discount: value of food eaten one move later
+        - greedy: chance that a rollout move goes toward the food instead of a random safe move
+        """
+        self.engine = engine
+        self.rng = rng
+        self.exploration = exploration
+        self.rollout_depth = rollout_depth
+        self.discount = discount
+        self.greedy = greedy
+        self.rollouts = 0
+
+    def run(self, root_state: tuple, direction: str, deadline: float) -> Node:
+        """Searches until the monotonic deadline, runs at least one rollout per action"""
+        engine = self.engine
+        root = Node(direction)
+        while True:
+            engine.restore(root_state)
+            self.iterate(root)
+            self.rollouts += 1
+            if time.monotonic() >= deadline and len(root.children) == len(
+                get_actions(direction)
+            ):
+                return root
+
+    def iterate(self, root: Node) -> None:
+        engine = self.engine
+        node = root
+        path = [root]
+        value = 0.0
+        weight = 1.0
+        dead = False
+        # Selection and expansion
+        while True:
+            actions = get_actions(node.direction)
+            untried = [action for action in actions if action not in node.children]
+            if untried:
+                action = self.rng.choice(untried)
+                child = node.children[action] = Node(action)
+            else:
+                child = self.select(node)
+            head, _, ate = engine.move(child.direction)
+            path.append(child)
+            if head == NO_CELL:
+                dead = True
+                break
+            if ate:
+                value += weight
+                engine.spawn_food()
+            weight *= self.discount
+            node = child
+            if untried:
+                break
+        if not dead:
+            value += self.rollout(node.direction, weight)
+        else:
+            value -= weight
+        for visited in path:
+            visited.visits += 1
+            visited.value += value
+
+    def select(self, node: Node) -> Node:
+        log_visits = math.log(node.visits)
+        best = None
+        best_score = -math.inf
+        for child in node.children.values():
+            score = child.value / child.visits + self.exploration * math.sqrt(
+                log_visits / child.visits
+            )
+            if score > best_score:
+                best = child
+                best_score = score
+        return best
+
+    def rollout(self, direction: str, weight: float) -> float:
+        engine = self.engine
+        rng = self.rng
+        value = 0.0
+        for _ in range(self.rollout_depth):
+            tail = engine.tail()
+            growing = engine.pending_growth > 0
+            safe = []
+            for action in get_actions(direction):
+                cell = engine.next_cell(action)
+                if not engine.occupied[cell] or (cell == tail and not growing):
+                    safe.append((action, cell))
+            if not safe:
+                return value - weight
+            if engine.food != NO_CELL and rng.random() < self.greedy:
+                food = engine.food
+                direction, _ = min(
+                    safe, key=lambda move: get_distance(engine, move[1], food)
+                )
+            else:
+                direction, _ = rng.choice(safe)
+            _, _, ate = engine.move(direction)
+            if ate:
+                value += weight
+                engine.spawn_food()
+            weight *= self.discount
+        # Closer to the food is a little better when no food was eaten
+        if engine.food != NO_CELL:
+            distance = get_distance(engine, engine.head(), engine.food)
+            value += (
+                weight
+                * 0.5
+                * (1 - distance / (engine.board_width + engine.board_height))
+            )
+        return value
+
+
+def search(task: tuple) -> tuple:
+    """
+    Runs in a worker process. task is (board_width, board_height, start, snapshot,
+    direction, deadline, seed, options). Returns ({direction: (visits, value)}, rollouts)
+    """
+    board_width, board_height, start, snapshot, direction, deadline, seed, options = (
+        task
+    )
+    engine = get_engine(board_width, board_height, start)
+    engine.restore(snapshot)
+    # Every process places the next food from its own seed, the real food is unknown
+    engine.rng.seed(seed)
+    root_state = engine.snapshot()
+    tree = TreeSearch(engine, random.Random(seed), **options)
+    root = tree.run(root_state, direction, deadline)
+    children = {
+        action: (child.visits, child.value) for action, child in root.children.items()
+    }
+    return children, tree.rollouts
+
+
+class MCTSPlanner:
+    def __init__(
+        self,
+        engine: WormEngine,
+        workers=None,
+        deadline_fraction=0.5,
+        exploration=1.4,
+        rollout_depth=30,
+        discount=0.95,
+        greedy=0.7,
+    ) -> None:
+        """
+        # MCTS planner
+        Lookahead planner of the worm game with root parallel Monte Carlo tree search.
+        Every worker process searches its own tree from the current state and
+        the visit counts of the first moves are added together.
+        prepare() starts the search of the next move right after a tick, so it runs
+        while the mainloop waits for the next tick, decide() collects it without
+        waiting. A search that is not done by then is left running for nothing and
+        the worm keeps going, or turns to a free cell (fallback).
+        The worker processes are started by the first search and stopped by close()
+        ### Parameters:
+        - engine: WormEngine of the game, only read
+        - workers: processes, default all cores
+        - deadline_fraction: share of the tick interval the search may take
+        - exploration, rollout_depth, discount, greedy: see TreeSearch
+        ### Attributes:
+        - last_rollouts: rollouts of all workers for the last move
+        - rollouts_per_second: last_rollouts divided by the time the search took
+        - last_decision_time: seconds decide() took
+        - fallbacks: decisions made without a finished search
+        """
+        self.engine = engine
+        self.workers = workers or os.cpu_count() or 1
+        self.deadline_fraction = deadline_fraction
+        self.options = {
+            'exploration': exploration,
+            'rollout_depth': rollout_depth,
+            'discount': discount,
+            'greedy': greedy,
+        }
+        self.executor = ProcessPoolExecutor(self.workers)
+        self.rng = random.Random()
+        self.futures: list = []
+        self.prepared_for = None
+        self.search_started = 0.0
+        self.last_rollouts = 0
+        self.rollouts_per_second = 0.0
+        self.last_decision_time = 0.0
+        self.fallbacks = 0
+
+    def get_state_key(self, direction: str) -> tuple:
+        engine = self.engine
+        return (
+            engine.head(),
+            engine.length(),
+            engine.food,
+            engine.pending_growth,
+            direction,
+        )
+
+    def prepare(self, direction: str, time_budget: float) -> None:
+        """Starts searching the move after the current state for time_budget seconds"""
+        self.cancel()
+        engine = self.engine
+        snapshot = engine.snapshot()
+        self.search_started = time.monotonic()
+        deadline = self.search_started + time_budget * self.deadline_fraction
+        self.futures = [
+            self.executor.submit(
+                search,
+                (
+                    engine.board_width,
+                    engine.board_height,
+                    engine.start,
+                    snapshot,
+                    direction,
+                    deadline,
+                    self.rng.randrange(2**32),
+                    self.options,
+                ),
+            )
+            for _ in range(self.workers)
+        ]
+        self.prepared_for = self.get_state_key(direction)
+
+    def decide(self, current_direction: str) -> str:
+        """
+        Returns the most visited first move of the search prepare() started for this
+        state when it is done, get_fallback() when there is none or it still runs
+        """
+        started = time.perf_counter()
+        if (
+            not self.futures
+            or self.prepared_for != self.get_state_key(current_direction)
+            or not all(future.done() for future in self.futures)
+        ):
+            self.fallbacks += 1
+            direction = self.get_fallback(current_direction)
+            self.last_decision_time = time.perf_counter() - started
+            return direction
+        visits = dict.fromkeys(get_actions(current_direction), 0)
+        rollouts = 0
+        for future in self.futures:
+            children, worker_rollouts = future.result()
+            rollouts += worker_rollouts
+            for action, (action_visits, _) in children.items():
+                visits[action] += action_visits
+        self.last_rollouts = rollouts
+        self.rollouts_per_second = rollouts / max(
+            time.monotonic() - self.search_started, 1e-9
+        )
+        self.futures = []
+        self.prepared_for = None
+        self.last_decision_time = time.perf_counter() - started
+        return max(visits, key=visits.get)
+
+    def get_fallback(self, current_direction: str) -> str:
+        """current_direction when the next cell is free, otherwise a turn to a free cell"""
+        engine = self.engine
+        tail = engine.tail()
+        growing = engine.pending_growth > 0
+        actions = get_actions(current_direction)
+        # Keeps going first
+        actions.sort(key=lambda action: action != current_direction)
+        for action in actions:
+            cell = engine.next_cell(action)
+            if not engine.occupied[cell] or (cell == tail and not growing):
+                return action
+        return current_direction
+
+    def cancel(self) -> None:
+        for future in self.futures:
+            future.cancel()
+        self.futures = []
+        self.prepared_for = None
+
+    def reset(self) -> None:
+        self.cancel()
+
+    def close(self) -> None:
+        self.cancel()
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,294 @@
+"""
+Seeded tournament of worm game policies.
+Plays the same seeds with every policy on all cores and reports the score, length and
+survival ticks of the games, and the seeds of the worst games:
+    python worm_tournament.py --games 2000 --policy autopilot greedy random --record worst
+"""
+
+import argparse
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from replay import GAME2, ReplayWriter
+from worm_autopilot import Autopilot
+from worm_engine import ACTIONS, NO_CELL, WormEngine
+
+# Columns of the results array
+SCORE, LENGTH, TICKS = range(3)
+COLUMNS = ('score', 'length', 'ticks')
+
+# (row, column) of the worm at the start, like Game2
+START = (0, 1)
+
+
+def get_safe_moves(engine: WormEngine, direction: str) -> list:
+    """Returns (direction, cell) of the moves that don't collide, turning back is not allowed"""
+    reverse = ACTIONS.index(direction) ^ 2
+    tail = engine.tail()
+    growing = engine.pending_growth > 0
+    moves = []
+    for index, action in enumerate(ACTIONS):
+        if index == reverse:
+            continue
+        cell = engine.next_cell(action)
+        if not engine.occupied[cell] or (cell == tail and not growing):
+            moves.append((action, cell))
+    return moves
+
+
+def random_policy(engine: WormEngine, seed: int):
+    """Random move that does not collide"""
+    rng = random.Random(seed)
+
+    def decide(direction: str) -> str:
+        moves = get_safe_moves(engine, direction)
+        return rng.choice(moves)[0] if moves else direction
+
+    return decide
+
+
+def greedy_policy(engine: WormEngine, seed: int):
+    """Move that does not collide and gets closest to the food"""
+    width = engine.board_width
+    height = engine.board_height
+
+    def distance(cell: int) -> int:
+        row, column = divmod(cell, width)
+        food_row, food_column = divmod(engine.food, width)
+        rows = abs(row - food_row)
+        columns = abs(column - food_column)
+        return min(rows, height - rows) + min(columns, width - columns)
+
+    def decide(direction: str) -> str:
+        moves = get_safe_moves(engine, direction)
+        if not moves:
+            return direction
+        if engine.food == NO_CELL:
+            return moves[0][0]
+        return min(moves, key=lambda move: distance(move[1]))[0]
+
+    return decide
+
+
+def autopilot_policy(engine: WormEngine, seed: int):
+    """Autopilot of Game2, without a time budget so the games do not depend on the machine"""
+    autopilot = Autopilot(engine, time_budget=None)
+    return autopilot.decide
+
+
+# Policies by name, policy(engine, seed) returns decide(direction) -> direction
+POLICIES = {
+    'random': random_policy,
+    'greedy': greedy_policy,
+    'autopilot': autopilot_policy,
+}
+
+
+def play(
+    board_width: int,
+    board_height: int,
+    policy,
+    seed: int,
+    max_ticks: int,
+    recorder=None,
+) -> tuple:
+    """
+    Plays one game with the rules and the order of Game2.update_frame on a new engine,
+    so a seed plays the same game in any chunk and order.
+    Returns (score, length, ticks), recorder gets the direction of every tick
+    """
+    engine = WormEngine(board_width, board_height, START)
+    engine.new_game(seed)
+    engine.spawn_food()
+    decide = POLICIES[policy](engine, seed)
+    direction = 'RIGHT'
+    score = 0
+    tick = 0
+    while engine.alive and tick < max_ticks:
+        direction = decide(direction)
+        if recorder is not None:
+            recorder.record_direction(tick, direction)
+        tick += 1
+        _, _, ate = engine.move(direction)
+        if ate:
+            score += 1
+            engine.spawn_food()
+    return score, engine.length(), tick
+
+
+def play_chunk(task: tuple) -> int:
+    """
+    Runs in a worker process and writes the results of its games straight to the
+    shared results array. task is (memory name, games, first, last, policy, seed,
+    board_width, board_height, max_ticks)
+    """
+    name, games, first, last, policy, seed, board_width, board_height, max_ticks = task
+    memory = shared_memory.SharedMemory(name=name)
+    try:
+        results = np.ndarray((games, len(COLUMNS)), np.int64, buffer=memory.buf)
+        for game in range(first, last):
+            results[game] = play(
+                board_width, board_height, policy, seed + game, max_ticks
+            )
+        del results
+    finally:
+        memory.close()
+    return last - first
+
+
+def run_tournament(
+    policy: str,
+    games: int,
+    seed=0,
+    board_width=10,
+    board_height=10,
+    max_ticks=5000,
+    chunk_size=50,
+    workers=None,
+) -> np.ndarray:
+    """Plays games seeds seed..seed + games - 1, returns a (games, 3) array, see COLUMNS"""
+    memory = shared_memory.SharedMemory(create=True, size=games * len(COLUMNS) * 8)
+    try:
+        tasks = [
+            (
+                memory.name,
+                games,
+                first,
+                min(first + chunk_size, games),
+                policy,
+                seed,
+                board_width,
+                board_height,
+                max_ticks,
+            )
+            for first in range(0, games, chunk_size)
+        ]
+        with ProcessPoolExecutor(workers) as executor:
+            for _ in executor.map(play_chunk, tasks):
+                pass
+        return np.ndarray((games, len(COLUMNS)), np.int64, buffer=memory.buf).copy()
+    finally:
+        memory.close()
+        memory.unlink()
+
+
+def summarize(results: np.ndarray, seed: int, max_ticks: int, worst=5) -> dict:
+    summary = {
+        column: {
+            'mean': float(results[:, index].mean()),
+            'min': int(results[:, index].min()),
+            'p10': float(np.percentile(results[:, index], 10)),
+            'p50': float(np.percentile(results[:, index], 50)),
+            'p90': float(np.percentile(results[:, index], 90)),
+            'max': int(results[:, index].max()),
+        }
+        for index, column in enumerate(COLUMNS)
+    }
+    summary['survived'] = float((results[:, TICKS] >= max_ticks).mean())
+    # Lowest score first, shorter games first on equal scores
+    order = np.lexsort((results[:, TICKS], results[:, SCORE]))[:worst]
+    summary['worst'] = [
+        {'seed': seed + int(game), **dict(zip(COLUMNS, map(int, results[game])))}
+        for game in order
+    ]
+    return summary
+
+
+def record_games(
+    folder: str,
+    policy: str,
+    seeds: list,
+    board_width: int,
+    board_height: int,
+    max_ticks: int,
+) -> list:
+    """Plays seeds again and writes them as Game 2 replays, returns the paths"""
+    paths = []
+    for seed in seeds:
+        path = os.path.join(folder, f'game2-{policy}-{seed}.replay')
+        recorder = ReplayWriter(path, GAME2, seed, (board_width, board_height, *START))
+        play(board_width, board_height, policy, seed, max_ticks, recorder)
+        recorder.close()
+        paths.append(path)
+    return paths
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--games', type=int, default=1000)
+    parser.add_argument('--policy', nargs='+', choices=POLICIES, default=list(POLICIES))
+    parser.add_argument(
+        '--board', nargs=2, type=int, default=[10, 10], metavar=('WIDTH', 'HEIGHT')
+    )
+    parser.add_argument(
+        '--max-ticks', type=int, default=5000, help='games are stopped after this'
+    )
+    parser.add_argument('--seed', type=int, default=0, help='first seed')
+    parser.add_argument('--chunk-size', type=int, default=50, help='games per task')
+    parser.add_argument(
+        '--workers', type=int, default=None, help='processes, default all cores'
+    )
+    parser.add_argument(
+        '--worst', type=int, default=5, help='how many worst seeds are listed'
+    )
+    parser.add_argument(
+        '--record', metavar='FOLDER', help='write the worst games as replays'
+    )
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    args = parser.parse_args()
+    board_width, board_height = args.board
+
+    summaries = {}
+    for policy in args.policy:
+        started = time.perf_counter()
+        results = run_tournament(
+            policy,
+            args.games,
+            args.seed,
+            board_width,
+            board_height,
+            args.max_ticks,
+            args.chunk_size,
+            args.workers,
+        )
+        summary = summarize(results, args.seed, args.max_ticks, args.worst)
+        summary['seconds'] = time.perf_counter() - started
+        if args.record:
+            seeds = [game['seed'] for game in summary['worst']]
+            summary['replays'] = record_games(
+                args.record, policy, seeds, board_width, board_height, args.max_ticks
+            )
+        summaries[policy] = summary
+
+    if args.json:
+        print(json.dumps(summaries, indent=2))
+        return
+    print(f'{args.games} games per policy on a {board_width}x{board_height} board')
+    for policy, summary in summaries.items():
+        print(
+            f'\n{policy} ({summary["seconds"]:.1f}s, survived {summary["survived"]:.1%})'
+        )
+        for column in COLUMNS:
+            stats = summary[column]
+            print(
+                f'  {column:<7} mean {stats["mean"]:8.1f}  min {stats["min"]:6d}'
+                f'  p10 {stats["p10"]:7.0f}  p50 {stats["p50"]:7.0f}'
+                f'  p90 {stats["p90"]:7.0f}  max {stats["max"]:6d}'
+            )
+        worst = ', '.join(
+            f'{game["seed"]} ({game["score"]} food, {game["ticks"]} ticks)'
+            for game in summary['worst']
+        )
+        print(f'  worst seeds: {worst}')
+        for path in summary.get('replays', []):
+            print(f'  replay: {path}')
+
+
+if __name__ == '__main__':
+    main()